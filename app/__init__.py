@@ -13,12 +13,21 @@ def create_app(config_class=Config):
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
     os.makedirs(os.path.join(os.path.dirname(app.instance_path), "instance"), exist_ok=True)
 
+    from app.database import configure_engine, engine_options
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(app.config), **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}),
+    }
     db.init_app(app)
 
+    from app.email_service import configure_servers
+    configure_servers(app.config)
+
     from app.routes import main
     app.register_blueprint(main)
 
     with app.app_context():
-        db.create_all()
+        configure_engine(db.engine, app.config)
+        from app.migrations import upgrade_schema
+        upgrade_schema(db)
 
     return app
@@ -0,0 +1,561 @@
+"""
+aiomail.py
+asyncio mail transport on plain asyncio streams: an SMTP client (SSL or
+STARTTLS, AUTH PLAIN/LOGIN, PIPELINING when the server advertises it) and
+an IMAP client (LOGIN, SELECT/EXAMINE, UID SEARCH/FETCH, IDLE). Sessions
+cost a socket and a few coroutines rather than a thread each, so one event
+loop can hold thousands of them.
+
+Failures raise the smtplib / imaplib exception types, so callers handle
+both transports alike. Blocking code runs coroutines through run_sync(),
+on a shared event loop living in a daemon thread.
+"""
+import asyncio
+import base64
+import imaplib
+import logging
+import os
+import re
+import smtplib
+import socket
+import ssl
+import threading
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# StreamReader buffer limit: a UID SEARCH over a large mailbox is one long line
+STREAM_LIMIT = 16 * 1024 * 1024
+
+_LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+_UID_RE = re.compile(rb"UID (\d+)")
+_CODE_RE = re.compile(rb"\[(UIDVALIDITY|UIDNEXT) (\d+)\]", re.IGNORECASE)
+_DOT_RE = re.compile(rb"(?m)^\.")
+
+
+# ── Shared event loop ─────────────────────────────────────────────────────────
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _reset_loop():
+    # The loop thread does not survive fork(); the child starts its own
+    global _loop
+    _loop = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_loop)
+
+
+def mail_loop() -> asyncio.AbstractEventLoop:
+    """The process-wide mail event loop, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="mail-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run_sync(coro):
+    """Run a coroutine on the mail loop and block until it finishes; its exception is re-raised here."""
+    loop = mail_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync() called from the mail loop itself; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+async def _within(awaitable, seconds: float):
+    """await with a time limit (asyncio.TimeoutError when it runs out)."""
+    if hasattr(asyncio, "timeout"):
+        # Python 3.11+: a deadline on the current task; wait_for would wrap every read in a new task
+        async with asyncio.timeout(seconds):
+            return await awaitable
+    return await asyncio.wait_for(awaitable, seconds)
+
+
+async def _open(host: str, port: int, context: Optional[ssl.SSLContext], timeout: float):
+    return await _within(
+        asyncio.open_connection(host, port, ssl=context, server_hostname=host if context else None,
+                                limit=STREAM_LIMIT),
+        timeout,
+    )
+
+
+class _UpgradedWriter(asyncio.StreamWriter):
+    """
+    StreamWriter on the TLS transport of a connection upgraded by
+    loop.start_tls (Python < 3.11). Keeps the plain-text writer alive:
+    StreamWriter.__del__ would otherwise close the socket under TLS.
+    """
+
+    def __init__(self, transport, protocol, reader, loop, plain: asyncio.StreamWriter):
+        super().__init__(transport, protocol, reader, loop)
+        self.plain = plain
+
+
+async def _start_tls(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     context: ssl.SSLContext, server_hostname: str, timeout: float) -> asyncio.StreamWriter:
+    """Upgrade an open stream to TLS (STARTTLS). Returns the writer to use from now on."""
+    if hasattr(writer, "start_tls"):  # Python 3.11+
+        await _within(writer.start_tls(context, server_hostname=server_hostname), timeout)
+        return writer
+    # Before 3.11, with public API only: loop.start_tls wraps the transport and keeps
+    # feeding the same protocol, so `reader` carries on as is; writes go through a new
+    # StreamWriter on the TLS transport
+    loop = asyncio.get_running_loop()
+    protocol = writer.transport.get_protocol()
+    transport = await _within(
+        loop.start_tls(writer.transport, protocol, context, server_hostname=server_hostname), timeout)
+    return _UpgradedWriter(transport, protocol, reader, loop, plain=writer)
+
+
+def _close_writer(writer: Optional[asyncio.StreamWriter]):
+    if writer is not None:
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+
+@lru_cache(maxsize=1)
+def _local_hostname() -> str:
+    # getfqdn() can block on DNS; resolve it once per process, as the EHLO name
+    return socket.getfqdn()
+
+
+# ── SMTP ──────────────────────────────────────────────────────────────────────
+
+class AsyncSMTP:
+    """
+    One SMTP connection. `security` is "ssl" (implicit TLS), "starttls" or
+    "none". After connect() the greeting, EHLO and TLS negotiation are done
+    and `extensions` holds what the server advertised (lower-case name →
+    parameters).
+    """
+
+    def __init__(self, host: str, port: int, security: str = "starttls", timeout: float = 30,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.extensions: dict[str, str] = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def __aenter__(self):
+        if self._writer is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.quit()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    def _context(self) -> ssl.SSLContext:
+        if self.ssl_context is None:
+            self.ssl_context = ssl.create_default_context()
+        return self.ssl_context
+
+    async def _deadline(self, exchange):
+        """
+        Run one whole exchange (handshake, command, message) within `timeout`:
+        one deadline per exchange rather than one per read. A connection that
+        timed out or failed mid-exchange is closed.
+        """
+        try:
+            return await _within(exchange, self.timeout)
+        except smtplib.SMTPException:
+            # A refusal (also an OSError) leaves the connection usable
+            raise
+        except asyncio.TimeoutError:
+            self.close()
+            raise TimeoutError(f"No answer from {self.host}:{self.port} within {self.timeout:g}s") from None
+        except (asyncio.CancelledError, OSError):
+            self.close()
+            raise
+
+    async def connect(self):
+        context = self._context() if self.security == "ssl" else None
+        try:
+            self._reader, self._writer = await _open(self.host, self.port, context, self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Could not connect to {self.host}:{self.port} within {self.timeout:g}s") from None
+        try:
+            await self._deadline(self._handshake())
+        except BaseException:
+            self.close()
+            raise
+
+    async def _handshake(self):
+        code, message = await self._reply()
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, message)
+        await self._ehlo()
+        if self.security == "starttls":
+            if "starttls" not in self.extensions:
+                raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+            code, message = await self._command("STARTTLS")
+            if code != 220:
+                raise smtplib.SMTPResponseException(code, message)
+            self._writer = await _start_tls(self._reader, self._writer, self._context(), self.host, self.timeout)
+            await self._ehlo()
+
+    async def _reply(self) -> tuple[int, bytes]:
+        """Read one (possibly multi-line) reply: (code, text lines joined by LF)."""
+        lines = []
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            lines.append(line[4:].strip())
+            if line[3:4] != b"-":
+                try:
+                    return int(line[:3]), b"\n".join(lines)
+                except ValueError:
+                    return -1, b"\n".join(lines)
+
+    async def _write(self, data: bytes):
+        if self._writer is None:
+            raise smtplib.SMTPServerDisconnected("please run connect() first")
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def _command(self, line: str) -> tuple[int, bytes]:
+        await self._write(line.encode("ascii") + b"\r\n")
+        return await self._reply()
+
+    async def command(self, line: str) -> tuple[int, bytes]:
+        """Send one command line; returns (reply code, reply text)."""
+        return await self._deadline(self._command(line))
+
+    async def _ehlo(self):
+        code, message = await self._command(f"EHLO {_local_hostname()}")
+        self.extensions = {}
+        if code != 250:
+            code, message = await self._command(f"HELO {_local_hostname()}")
+            if code != 250:
+                raise smtplib.SMTPHeloError(code, message)
+            return
+        for line in message.decode("latin-1").split("\n")[1:]:
+            name, _, params = line.strip().partition(" ")
+            if name:
+                self.extensions[name.lower()] = params.strip()
+
+    async def login(self, user: str, password: str):
+        if "auth" not in self.extensions:
+            raise smtplib.SMTPNotSupportedError("SMTP AUTH extension not supported by server.")
+        await self._deadline(self._login(user, password))
+
+    async def _login(self, user: str, password: str):
+        mechanisms = self.extensions["auth"].upper().split()
+        if "PLAIN" in mechanisms or not mechanisms:
+            token = base64.b64encode(f"\0{user}\0{password}".encode()).decode("ascii")
+            code, message = await self._command(f"AUTH PLAIN {token}")
+        elif "LOGIN" in mechanisms:
+            code, message = await self._command("AUTH LOGIN")
+            for value in (user, password):
+                if code != 334:
+                    break
+                code, message = await self._command(base64.b64encode(value.encode()).decode("ascii"))
+        else:
+            raise smtplib.SMTPException("No suitable authentication method found.")
+        if 400 <= code < 500:
+            # 421/454 "too many login attempts" and the like: try again later, the credentials may be fine
+            raise smtplib.SMTPResponseException(code, message)
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, message)
+
+    async def sendmail(self, sender: str, recipient: str, message: bytes):
+        """
+        Send one message to one recipient. With PIPELINING, MAIL FROM, RCPT TO
+        and DATA go out in a single write and their replies are read together:
+        one round trip instead of three before the message body.
+        """
+        await self._deadline(self._sendmail(sender, recipient, message))
+
+    async def _sendmail(self, sender: str, recipient: str, message: bytes):
+        commands = [f"MAIL FROM:<{sender}>", f"RCPT TO:<{recipient}>", "DATA"]
+        replies = []
+        if "pipelining" in self.extensions:
+            await self._write("".join(f"{line}\r\n" for line in commands).encode("ascii"))
+            for _ in commands:
+                replies.append(await self._reply())
+        else:
+            for line, ok in zip(commands, ((250,), (250, 251), (354,))):
+                replies.append(await self._command(line))
+                if replies[-1][0] not in ok:
+                    break
+
+        (code, reply), rest = replies[0], replies[1:]
+        if code != 250:
+            await self._reset(rest)
+            raise smtplib.SMTPSenderRefused(code, reply, sender)
+        code, reply = rest[0]
+        if code not in (250, 251):
+            await self._reset(rest[1:])
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, reply)})
+        code, reply = rest[1]
+        if code != 354:
+            await self._reset([])
+            raise smtplib.SMTPDataError(code, reply)
+
+        data = _DOT_RE.sub(b"..", message)
+        if not data.endswith(b"\r\n"):
+            data += b"\r\n"
+        await self._write(data + b".\r\n")
+        code, reply = await self._reply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, reply)
+
+    async def _reset(self, pipelined: list):
+        # A pipelined DATA that was still accepted needs an (empty) message to end it
+        if pipelined and pipelined[-1][0] == 354:
+            await self._write(b".\r\n")
+            await self._reply()
+        try:
+            await self._command("RSET")
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    async def quit(self):
+        """Say QUIT and close; never raises."""
+        if self._writer is None:
+            return
+        try:
+            await self.command("QUIT")
+        except Exception:
+            pass
+        self.close()
+
+    def close(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        _close_writer(writer)
+
+
+# ── IMAP ──────────────────────────────────────────────────────────────────────
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class AsyncIMAP:
+    """
+    One IMAP4rev1 connection. Commands raise imaplib.IMAP4.error on a NO or
+    BAD answer and imaplib.IMAP4.abort when the connection is lost. After
+    select(), `uidvalidity`, `uidnext` and `exists` describe the mailbox.
+    """
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True, timeout: float = 60,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.uidvalidity: Optional[int] = None
+        self.uidnext: Optional[int] = None
+        self.exists: Optional[int] = None
+        self._capabilities: Optional[set[str]] = None
+        self._tag = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def __aenter__(self):
+        if self._writer is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.logout()
+
+    async def connect(self):
+        context = None
+        if self.use_ssl:
+            context = self.ssl_context = self.ssl_context or ssl.create_default_context()
+        try:
+            self._reader, self._writer = await _open(self.host, self.port, context, self.timeout)
+        except asyncio.TimeoutError:
+            raise imaplib.IMAP4.abort(f"could not connect to {self.host}:{self.port} within {self.timeout:g}s") from None
+        try:
+            greeting, _ = await self._read_response()
+        except BaseException:
+            self.close()
+            raise
+        if not greeting.startswith((b"* OK", b"* PREAUTH")):
+            self.close()
+            raise imaplib.IMAP4.error(f"Unexpected IMAP greeting: {greeting!r}")
+
+    async def _readline(self, timeout: Optional[float] = None) -> bytes:
+        """Next line. With an explicit `timeout` (IDLE), running out of time raises TimeoutError and keeps the connection."""
+        if self._reader is None:
+            raise imaplib.IMAP4.abort("not connected")
+        try:
+            line = await _within(self._reader.readline(), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            if timeout is not None:
+                raise
+            self.close()
+            raise imaplib.IMAP4.abort(f"no answer from server in {self.timeout:g}s")
+        except (OSError, ValueError, asyncio.IncompleteReadError) as exc:
+            self.close()
+            raise imaplib.IMAP4.abort(f"connection lost: {exc}") from exc
+        if not line:
+            self.close()
+            raise imaplib.IMAP4.abort("connection closed by server")
+        return line
+
+    async def _read_response(self, timeout: Optional[float] = None) -> tuple[bytes, list[bytes]]:
+        """One response line with its literals ({n} blocks) read out separately, in order."""
+        text, literals = b"", []
+        line = await self._readline(timeout)
+        while True:
+            match = _LITERAL_RE.search(line)
+            if not match:
+                return text + line.rstrip(b"\r\n"), literals
+            text += line[:match.start()]
+            try:
+                literals.append(await _within(self._reader.readexactly(int(match.group(1))), self.timeout))
+            except asyncio.IncompleteReadError as exc:
+                self.close()
+                raise imaplib.IMAP4.abort("connection closed inside a literal") from exc
+            line = await self._readline()
+
+    def _next_tag(self) -> bytes:
+        self._tag += 1
+        return b"A%04d" % self._tag
+
+    async def _send(self, tag: bytes, line: str):
+        if self._writer is None:
+            raise imaplib.IMAP4.abort("not connected")
+        self._writer.write(tag + b" " + line.encode("utf-8") + b"\r\n")
+        try:
+            await _within(self._writer.drain(), self.timeout)
+        except OSError as exc:
+            self.close()
+            raise imaplib.IMAP4.abort(f"connection lost: {exc}") from exc
+
+    async def _finish(self, tag: bytes, name: str, untagged: list) -> bytes:
+        """Collect untagged responses until the tagged one; raise unless it is OK."""
+        while True:
+            text, literals = await self._read_response()
+            if text.startswith(tag + b" "):
+                status, _, info = text[len(tag) + 1:].partition(b" ")
+                if status.upper() != b"OK":
+                    raise imaplib.IMAP4.error(f"{name} failed: {info.decode('utf-8', 'replace')}")
+                return info
+            if text.startswith(b"* BYE") and name != "LOGOUT":
+                self.close()
+                raise imaplib.IMAP4.abort(text.decode("utf-8", "replace"))
+            untagged.append((text, literals))
+
+    async def command(self, name: str, *args: str) -> list[tuple[bytes, list[bytes]]]:
+        """Run a command; returns its untagged responses as (line, literals)."""
+        tag = self._next_tag()
+        await self._send(tag, " ".join((name, *args)))
+        untagged = []
+        await self._finish(tag, name.split(" ")[0], untagged)
+        return untagged
+
+    async def capabilities(self) -> set[str]:
+        if self._capabilities is None:
+            found = set()
+            for text, _ in await self.command("CAPABILITY"):
+                if text.upper().startswith(b"* CAPABILITY"):
+                    found.update(text.decode("ascii", "replace").upper().split()[2:])
+            self._capabilities = found
+        return self._capabilities
+
+    async def login(self, user: str, password: str):
+        await self.command("LOGIN", _quote(user), _quote(password))
+        self._capabilities = None  # servers may advertise more once authenticated
+
+    async def select(self, mailbox: str = "INBOX", readonly: bool = False):
+        self.uidvalidity = self.uidnext = self.exists = None
+        for text, _ in await self.command("EXAMINE" if readonly else "SELECT", _quote(mailbox)):
+            code = _CODE_RE.search(text)
+            if code:
+                setattr(self, code.group(1).decode().lower(), int(code.group(2)))
+            elif text.upper().endswith(b" EXISTS"):
+                self.exists = int(text.split()[1])
+
+    async def uid_search(self, criteria: str = "ALL") -> list[int]:
+        uids = []
+        for text, _ in await self.command("UID SEARCH", criteria):
+            if text.upper().startswith(b"* SEARCH"):
+                uids.extend(int(uid) for uid in text.split()[2:])
+        return uids
+
+    async def uid_fetch(self, uid_set: str, item: str) -> list[tuple[int, bytes]]:
+        """(uid, data) for every message of a UID set; `item` names one data item, e.g. BODY.PEEK[]."""
+        fetched = []
+        for text, literals in await self.command("UID FETCH", uid_set, f"(UID {item})"):
+            if b" FETCH " not in text.upper():
+                continue
+            match = _UID_RE.search(text)
+            if match:
+                fetched.append((int(match.group(1)), literals[0] if literals else b""))
+        return fetched
+
+    async def idle(self, timeout: float) -> list[bytes]:
+        """
+        IDLE (RFC 2177) until the server reports a change or `timeout`
+        seconds pass, then DONE. Returns the untagged lines received, such
+        as b"* 12 EXISTS"; empty on timeout.
+        """
+        if "IDLE" not in await self.capabilities():
+            raise imaplib.IMAP4.error("IDLE not supported by server")
+        tag = self._next_tag()
+        await self._send(tag, "IDLE")
+        untagged = []
+        while True:
+            text, _ = await self._read_response()
+            if text.startswith(b"+"):
+                break
+            if text.startswith(tag + b" "):
+                raise imaplib.IMAP4.error(f"IDLE failed: {text.decode('utf-8', 'replace')}")
+            untagged.append(text)
+        if not untagged:
+            try:
+                text, _ = await self._read_response(timeout)
+                untagged.append(text)
+            except asyncio.TimeoutError:
+                pass
+        self._writer.write(b"DONE\r\n")
+        events = []
+        await self._finish(tag, "IDLE", events)
+        untagged += [text for text, _ in events]
+        for text in untagged:
+            if text.upper().endswith(b" EXISTS"):
+                # New mail: UIDNEXT as of SELECT no longer tells what is in the mailbox
+                self.exists, self.uidnext = int(text.split()[1]), None
+        return untagged
+
+    async def logout(self):
+        """LOGOUT and close; never raises."""
+        if self._writer is None:
+            return
+        try:
+            await self.command("LOGOUT")
+        except Exception:
+            pass
+        self.close()
+
+    def close(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        _close_writer(writer)
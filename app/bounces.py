@@ -0,0 +1,132 @@
+"""
+bounces.py
+Parses delivery status notifications found in the inbox: RFC 3464
+multipart/report DSNs (what Gmail's mailer-daemon sends) and, as a
+fallback, plain mailer-daemon notices carrying X-Failed-Recipients.
+Each failed recipient becomes a Bounce classified as hard or soft.
+"""
+import email
+import re
+from email.message import Message
+from email.parser import HeaderParser
+from typing import Optional
+
+HARD = "hard"
+SOFT = "soft"
+
+# Permanent (5.x.x) statuses that say nothing about the address itself:
+# mailbox full, message too large, policy/spam rejections of the sender
+SOFT_PERMANENT_PREFIXES = ("5.2.2", "5.2.3", "5.3.4", "5.7.")
+
+_STATUS_RE = re.compile(r"\b([245]\.\d{1,3}\.\d{1,3})\b")
+_MESSAGE_ID_RE = re.compile(r"<[^>]+>")
+_DAEMON_SENDERS = ("mailer-daemon@", "postmaster@")
+
+
+class Bounce:
+    """One recipient of one DSN."""
+
+    __slots__ = ("recipient", "status", "action", "diagnostic", "original_message_id", "kind")
+
+    def __init__(self, recipient: str, status: str, action: str, diagnostic: str,
+                 original_message_id: Optional[str]):
+        self.recipient = recipient
+        self.status = status
+        self.action = action
+        self.diagnostic = diagnostic
+        self.original_message_id = original_message_id
+        self.kind = classify(status, action)
+
+    def describe(self) -> str:
+        """Short Spanish description stored in Contact.send_error."""
+        label = "Rebote permanente" if self.kind == HARD else "Rebote temporal"
+        detail = f": {self.diagnostic}" if self.diagnostic else ""
+        return f"{label} ({self.status or 'sin código'}){detail}"[:200]
+
+
+def classify(status: str, action: str) -> Optional[str]:
+    """HARD, SOFT, or None when the DSN reports no failure (delivered, relayed...)."""
+    action = (action or "").lower()
+    if action == "delayed":
+        return SOFT
+    if action and action != "failed":
+        return None
+    if status.startswith("5."):
+        return SOFT if status.startswith(SOFT_PERMANENT_PREFIXES) else HARD
+    if status.startswith("4."):
+        return SOFT
+    # "failed" without a usable status code
+    return HARD if action == "failed" else None
+
+
+def looks_like_dsn(headers: Message) -> bool:
+    """Cheap test on a message's headers, before fetching its body."""
+    if headers.get_content_type() == "multipart/report":
+        return (headers.get_param("report-type") or "").lower() == "delivery-status"
+    sender = (headers.get("From") or "").lower()
+    return any(daemon in sender for daemon in _DAEMON_SENDERS) or bool(headers.get("X-Failed-Recipients"))
+
+
+def _address(field: Optional[str]) -> str:
+    """'rfc822; user@example.com' → 'user@example.com'."""
+    value = (field or "").split(";", 1)[-1]
+    return value.strip().strip("<>").strip()
+
+
+def _original_message_id(msg: Message) -> Optional[str]:
+    """Message-ID of the bounced email, from the returned headers or the DSN's own references."""
+    for part in msg.walk():
+        ctype = part.get_content_type()
+        headers = None
+        if ctype == "message/rfc822":
+            payload = part.get_payload()
+            headers = payload[0] if isinstance(payload, list) and payload else None
+        elif ctype == "text/rfc822-headers":
+            headers = HeaderParser().parsestr(part.get_payload(decode=True).decode("utf-8", errors="ignore"))
+        if headers is not None and headers.get("Message-ID"):
+            return headers["Message-ID"].strip()
+    refs = _MESSAGE_ID_RE.findall(f"{msg.get('In-Reply-To', '')} {msg.get('References', '')}")
+    return refs[-1] if refs else None
+
+
+def _text_body(msg: Message) -> str:
+    for part in msg.walk():
+        if part.get_content_type() == "text/plain":
+            payload = part.get_payload(decode=True) or b""
+            return payload.decode(part.get_content_charset() or "utf-8", errors="ignore")
+    return ""
+
+
+def parse_dsn(raw: bytes) -> list[Bounce]:
+    """All failed or delayed recipients reported by one notification (empty if none)."""
+    msg = email.message_from_bytes(raw)
+    original_id = _original_message_id(msg)
+    bounces = []
+
+    for part in msg.walk():
+        if part.get_content_type() != "message/delivery-status":
+            continue
+        # First block holds per-message fields, the rest one block per recipient
+        for block in (part.get_payload() or [])[1:]:
+            recipient = _address(block.get("Final-Recipient") or block.get("Original-Recipient"))
+            if not recipient:
+                continue
+            diagnostic = " ".join((block.get("Diagnostic-Code") or "").split(";", 1)[-1].split())
+            status = (block.get("Status") or "").strip().split(" ")[0]
+            if not status:
+                match = _STATUS_RE.search(diagnostic)
+                status = match.group(1) if match else ""
+            bounce = Bounce(recipient, status, block.get("Action", "").strip(), diagnostic, original_id)
+            if bounce.kind:
+                bounces.append(bounce)
+
+    if not bounces and msg.get("X-Failed-Recipients"):
+        body = _text_body(msg)
+        match = _STATUS_RE.search(body)
+        status = match.group(1) if match else ""
+        line = next((ln.strip() for ln in body.splitlines() if status and status in ln), "")
+        for recipient in msg["X-Failed-Recipients"].split(","):
+            bounce = Bounce(recipient.strip(), status, "failed", line[:150], original_id)
+            if recipient.strip() and bounce.kind:
+                bounces.append(bounce)
+    return bounces
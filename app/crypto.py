@@ -1,25 +1,139 @@
 """
 crypto.py
 Encrypts/decrypts sensitive data (Gmail App Password) stored in the DB.
-Uses cryptography.Fernet with a key derived from SECRET_KEY.
+Uses cryptography.Fernet with a key derived from SECRET_KEY. Keys derived
+from SECRET_KEY_FALLBACKS still decrypt, so SECRET_KEY can be rotated:
+old ciphertexts are re-encrypted lazily, the next time they are used.
+
+Decrypted sender account passwords are kept in a small in-memory vault for
+CREDENTIAL_CACHE_SECONDS, so the send loop and every reply check don't
+decrypt the same secret over and over.
 """
 import base64
 import hashlib
-from cryptography.fernet import Fernet
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from flask import current_app
 
 
-def _get_fernet() -> Fernet:
-    secret = current_app.config["SECRET_KEY"].encode()
-    key = base64.urlsafe_b64encode(hashlib.sha256(secret).digest())
+def _derive(secret: str) -> Fernet:
+    key = base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())
     return Fernet(key)
 
 
+@lru_cache(maxsize=8)
+def _fernets(secrets: tuple) -> tuple[Fernet, MultiFernet]:
+    """Fernet for the current key and a MultiFernet over all keys, built once per key set."""
+    fernets = [_derive(secret) for secret in secrets]
+    return fernets[0], MultiFernet(fernets)
+
+
+def _keys() -> tuple[Fernet, MultiFernet]:
+    config = current_app.config
+    return _fernets((config["SECRET_KEY"], *(config.get("SECRET_KEY_FALLBACKS") or ())))
+
+
+def _get_fernet() -> MultiFernet:
+    return _keys()[1]
+
+
 def encrypt(plain_text: str) -> str:
     """Encrypt a string and return the ciphertext as a string."""
-    return _get_fernet().encrypt(plain_text.encode()).decode()
+    return _keys()[0].encrypt(plain_text.encode()).decode()
 
 
 def decrypt(cipher_text: str) -> str:
     """Decrypt a ciphertext string and return the original plain text."""
     return _get_fernet().decrypt(cipher_text.encode()).decode()
+
+
+def decrypt_and_rotate(cipher_text: str) -> tuple[str, Optional[str]]:
+    """
+    Decrypt a ciphertext. If it was made with a fallback key, also return it
+    re-encrypted under SECRET_KEY (otherwise None) for the caller to store.
+    """
+    current, every_key = _keys()
+    token = cipher_text.encode()
+    try:
+        return current.decrypt(token).decode(), None
+    except InvalidToken:
+        plain = every_key.decrypt(token)
+        return plain.decode(), current.encrypt(plain).decode()
+
+
+class CredentialVault:
+    """
+    Decrypted secrets keyed by sender account id, each kept for a TTL after it was
+    decrypted. An entry is bound to the ciphertext it came from, so a changed
+    password is never served stale. Evicted entries have their bytes
+    overwritten; str copies already handed to callers cannot be wiped.
+    """
+
+    def __init__(self):
+        self._entries: dict[int, tuple[str, bytearray, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: int, cipher_text: str) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            for expired in [k for k, (_, _, expires) in self._entries.items() if expires <= now]:
+                self._drop(expired)
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != cipher_text:
+                return None
+            return entry[1].decode()
+
+    def put(self, key: int, cipher_text: str, plain_text: str, ttl: float):
+        with self._lock:
+            self._drop(key)
+            if ttl > 0:
+                self._entries[key] = (cipher_text, bytearray(plain_text.encode()), time.monotonic() + ttl)
+
+    def forget(self, key: int):
+        with self._lock:
+            self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def _drop(self, key: int):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            secret = entry[1]
+            secret[:] = bytes(len(secret))
+
+
+vault = CredentialVault()
+
+
+def account_password(account) -> str:
+    """
+    Decrypted app password of a sender account, served from the vault when
+    possible. A password still encrypted under a fallback key is
+    re-encrypted on the account row; the caller's next commit saves it.
+    Raises InvalidToken if no configured key can decrypt it.
+    """
+    cipher_text = account.password_enc
+    cached = vault.get(account.id, cipher_text)
+    if cached is not None:
+        return cached
+    plain_text, rotated = decrypt_and_rotate(cipher_text)
+    if rotated:
+        account.password_enc = cipher_text = rotated
+    vault.put(account.id, cipher_text, plain_text, ttl=current_app.config.get("CREDENTIAL_CACHE_SECONDS", 900))
+    return plain_text
+
+
+def forget_campaign_passwords(campaign):
+    """Drop (and overwrite) the cached passwords of a campaign's senders, e.g. when it is archived."""
+    for account in campaign.senders:
+        vault.forget(account.id)
@@ -0,0 +1,66 @@
+"""
+database.py
+Engine configuration for the app database.
+
+SQLite (the default) runs in WAL mode so the dashboard and scheduler keep
+reading while the send loop writes, with synchronous=NORMAL (safe in WAL:
+a crash never corrupts the file, a power cut can at most lose the last
+commits) and a busy timeout instead of immediate "database is locked"
+errors. Any other DATABASE_URL (e.g. PostgreSQL) gets a pre-pinged,
+recycled connection pool and goes through the same code paths.
+"""
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.metrics import DB_COMMIT_SECONDS
+
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    pool = {
+        "pool_size": config.get("DB_POOL_SIZE", 10),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 20),
+    }
+    if url.get_backend_name() == "sqlite":
+        options = {
+            "connect_args": {
+                # Connections are shared by the pool across worker threads
+                "check_same_thread": False,
+                "timeout": config.get("DB_BUSY_TIMEOUT", 30),
+            },
+        }
+        if url.database and url.database != ":memory:":
+            options.update(pool)
+        return options
+    return {**pool, "pool_pre_ping": True, "pool_recycle": 1800}
+
+
+def configure_engine(engine, config):
+    """Apply per-connection settings; call before the first connection is made."""
+    if engine.dialect.name != "sqlite":
+        return
+    busy_timeout_ms = int(config.get("DB_BUSY_TIMEOUT", 30) * 1000)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.close()
+
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
@@ -1,34 +1,399 @@
 """
 email_service.py
 Handles sending emails via SMTP and checking for replies via IMAP.
+The network I/O runs on the asyncio transport in aiomail.py: the *_async
+functions and AsyncSMTPSession are for coroutines, while send_email,
+scan_inbox, check_replies and SMTPSession keep their blocking interface by
+running on the shared mail loop (aiomail.run_sync).
 """
+import base64
+import random
 import smtplib
 import imaplib
-import email as email_lib
 import re
+import sys
 import time
 import logging
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from datetime import date
+from email.header import Header
+from email.parser import HeaderParser
 from email.utils import make_msgid, formatdate
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from app.aiomail import AsyncIMAP, AsyncSMTP, run_sync
+from app.bounces import Bounce, looks_like_dsn, parse_dsn
+from app.metrics import (
+    EMAILS_TOTAL, IMAP_FETCH_SECONDS, IMAP_MESSAGES_TOTAL, IMAP_SCAN_SECONDS,
+    SMTP_CONNECT_SECONDS, SMTP_LOGIN_SECONDS, SMTP_SEND_SECONDS, timed,
+)
+from app.templating import compile_template
 
 logger = logging.getLogger(__name__)
 
-GMAIL_SMTP_HOST = "smtp.gmail.com"
-GMAIL_SMTP_PORT = 587
-GMAIL_IMAP_HOST = "imap.gmail.com"
-GMAIL_IMAP_PORT = 993
+# Mail servers: Gmail unless configure_servers() is given other SMTP_*/IMAP_* settings
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+SMTP_SECURITY = "starttls"  # starttls | ssl | none
+IMAP_HOST = "imap.gmail.com"
+IMAP_PORT = 993
+IMAP_SSL = True
+
+# Messages sent over one SMTP connection before it is closed and reopened
+SMTP_RECYCLE_AFTER = 100
+
+# Replies that mean the account is being rate limited rather than the message refused
+THROTTLE_CODES = (421, 454)
+
+# What a failed delivery calls for (classify_smtp_error)
+PERMANENT = "permanent"   # refused for good: do not retry
+TRANSIENT = "transient"   # try the message again later
+THROTTLE = "throttle"     # the account is being rate limited: slow down, send from another account
+
+
+def configure_servers(config):
+    """Apply the SMTP_* / IMAP_* settings of an app config (called by create_app)."""
+    global SMTP_HOST, SMTP_PORT, SMTP_SECURITY, IMAP_HOST, IMAP_PORT, IMAP_SSL
+    SMTP_HOST = config.get("SMTP_HOST", SMTP_HOST)
+    SMTP_PORT = int(config.get("SMTP_PORT", SMTP_PORT))
+    SMTP_SECURITY = config.get("SMTP_SECURITY", SMTP_SECURITY).lower()
+    if SMTP_SECURITY not in ("starttls", "ssl", "none"):
+        raise ValueError(f"SMTP_SECURITY must be starttls, ssl or none, not {SMTP_SECURITY!r}")
+    IMAP_HOST = config.get("IMAP_HOST", IMAP_HOST)
+    IMAP_PORT = int(config.get("IMAP_PORT", IMAP_PORT))
+    IMAP_SSL = bool(config.get("IMAP_SSL", IMAP_SSL))
+
+
+def _smtp_replies(exc: BaseException) -> list[tuple[int, bytes]]:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return list(exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return [(exc.smtp_code, exc.smtp_error)]
+    return []
+
+
+def is_throttling(exc: BaseException) -> bool:
+    """Whether an SMTP error is the server telling the account to slow down (421, 454)."""
+    replies = _smtp_replies(exc)
+    return bool(replies) and all(code in THROTTLE_CODES for code, _ in replies)
+
+
+def is_quota_exhausted(exc: BaseException) -> bool:
+    """Whether an SMTP error is Gmail's "daily user sending limit exceeded" (550 5.4.5)."""
+    replies = _smtp_replies(exc)
+    return bool(replies) and all(b"5.4.5" in (text if isinstance(text, bytes) else str(text).encode())
+                                 for _, text in replies)
+
+
+def classify_smtp_error(exc: BaseException) -> str:
+    """
+    THROTTLE for rate limiting and used-up quotas, TRANSIENT for 4xx replies,
+    dropped connections and timeouts, PERMANENT for 5xx replies and anything
+    else (e.g. a message that cannot be built).
+    """
+    if is_throttling(exc) or is_quota_exhausted(exc):
+        return THROTTLE
+    replies = _smtp_replies(exc)
+    if replies:
+        return TRANSIENT if all(400 <= code < 500 for code, _ in replies) else PERMANENT
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return TRANSIENT
+    if isinstance(exc, smtplib.SMTPException):
+        # An OSError subclass, but e.g. "AUTH not supported" will not change on a retry
+        return PERMANENT
+    if isinstance(exc, OSError):
+        # Connection refused/reset, TLS errors, timeouts
+        return TRANSIENT
+    return PERMANENT
+
 
-# Delay between emails to respect Gmail rate limits
-SEND_DELAY_SECONDS = 1.5
+async def smtp_connect(timeout: float) -> AsyncSMTP:
+    """Open an SMTP connection to the configured server, EHLO done and TLS negotiated."""
+    server = AsyncSMTP(SMTP_HOST, SMTP_PORT, security=SMTP_SECURITY, timeout=timeout)
+    with timed(SMTP_CONNECT_SECONDS):
+        await server.connect()
+    return server
+
+
+def imap_connect() -> AsyncIMAP:
+    """An IMAP client for the configured server; it connects on `async with`."""
+    return AsyncIMAP(IMAP_HOST, IMAP_PORT, use_ssl=IMAP_SSL)
 
 
 def render_template(template: str, variables: dict) -> str:
-    """Replace {{variable}} placeholders in template with actual values."""
-    for key, value in variables.items():
-        template = template.replace(f"{{{{{key}}}}}", str(value) if value is not None else "")
-    return template
+    """Replace {{variable}} placeholders in template with actual values (see templating.py)."""
+    return compile_template(template or "").render(variables)
+
+
+class AsyncSMTPSession:
+    """
+    One authenticated SMTP connection reused across many sends.
+
+    The connection is opened lazily on the first send, reopened transparently
+    if the server drops it, and recycled after `max_messages` sends so that
+    long campaigns never sit on a single stale connection.
+    `last_latency` holds the seconds spent in the last send, including any
+    (re)connect it triggered, so the handshake cost is visible per message.
+    A session belongs to the event loop it first sends on and handles one
+    message at a time; open more sessions for more concurrency.
+    """
+
+    def __init__(
+        self,
+        sender_email: str,
+        app_password: str,
+        max_messages: int = SMTP_RECYCLE_AFTER,
+        timeout: int = 30,
+    ):
+        self.sender_email = sender_email
+        # Strip spaces — Google shows App Password as "xxxx xxxx xxxx xxxx"
+        self._password = app_password.replace(" ", "")
+        self.max_messages = max(1, max_messages)
+        self.timeout = timeout
+        self._server: Optional[AsyncSMTP] = None
+        self._sent_on_connection = 0
+        self.connects = 0
+        self.messages_sent = 0
+        self.total_send_time = 0.0
+        self.last_latency: Optional[float] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def avg_latency(self) -> Optional[float]:
+        """Mean seconds per message over the life of the session."""
+        if not self.messages_sent:
+            return None
+        return self.total_send_time / self.messages_sent
+
+    async def _connect(self):
+        server = await smtp_connect(self.timeout)
+        try:
+            with timed(SMTP_LOGIN_SECONDS):
+                await server.login(self.sender_email, self._password)
+        except BaseException:
+            server.close()
+            raise
+        self._server = server
+        self._sent_on_connection = 0
+        self.connects += 1
+
+    async def close(self):
+        """Politely end the SMTP conversation; never raises."""
+        server, self._server = self._server, None
+        if server is not None:
+            await server.quit()
+
+    async def _send(self, recipient_email: str, message: bytes):
+        with timed(SMTP_SEND_SECONDS):
+            await self._server.sendmail(self.sender_email, recipient_email, message)
+
+    async def sendmail(self, recipient_email: str, message: bytes):
+        """Send an already-serialised message, reconnecting once if the link dropped."""
+        start = time.perf_counter()
+        if self._server is not None and self._sent_on_connection >= self.max_messages:
+            await self.close()
+        try:
+            if self._server is None:
+                await self._connect()
+            try:
+                await self._send(recipient_email, message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as exc:
+                logger.info("SMTP connection for %s lost (%s), reconnecting", self.sender_email, exc)
+                self._server = None
+                await self._connect()
+                await self._send(recipient_email, message)
+        finally:
+            self.last_latency = time.perf_counter() - start
+        self._sent_on_connection += 1
+        self.messages_sent += 1
+        self.total_send_time += self.last_latency
+
+
+class SMTPSession:
+    """
+    Blocking face of an AsyncSMTPSession (`aio`), for threads: each call
+    runs on the shared mail loop. Counters such as connects, messages_sent,
+    last_latency and avg_latency are read from the async session.
+    """
+
+    def __init__(
+        self,
+        sender_email: str,
+        app_password: str,
+        max_messages: int = SMTP_RECYCLE_AFTER,
+        timeout: int = 30,
+    ):
+        self.aio = AsyncSMTPSession(sender_email, app_password, max_messages=max_messages, timeout=timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.aio, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Politely end the SMTP conversation; never raises."""
+        run_sync(self.aio.close())
+
+    def sendmail(self, recipient_email: str, message: bytes):
+        """Send an already-serialised message, reconnecting once if the link dropped."""
+        run_sync(self.aio.sendmail(recipient_email, message))
+
+
+def _header_safe(value: str) -> str:
+    """Collapse CR/LF so user data can never inject extra headers."""
+    return " ".join(str(value or "").splitlines())
+
+
+class MessageBuilder:
+    """
+    Serialises multipart/alternative messages for one sender straight to
+    CRLF wire bytes, the form `sendmail` transmits (equivalent to
+    `as_bytes(policy=email.policy.SMTP)`).
+
+    Everything that is the same for every recipient — the From header, MIME
+    boundary and the part headers — is encoded once when the builder is
+    created. Per message only Message-ID, Date, To, Subject and the bodies are
+    encoded, and a body identical to the previous one (e.g. an HTML template
+    without placeholders) reuses its base64 encoding.
+    """
+
+    def __init__(self, sender_email: str):
+        self.sender_email = sender_email
+        self.domain = sender_email.split("@")[-1]
+        boundary = "=" * 15 + "%019d" % random.randrange(sys.maxsize) + "=="
+        self._head = (
+            f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+            "MIME-Version: 1.0\r\n"
+            f"From: {_header_safe(sender_email)}\r\n"
+        ).encode("ascii")
+        self._delimiter = f"\r\n--{boundary}\r\n".encode("ascii")
+        self._close = f"\r\n--{boundary}--\r\n".encode("ascii")
+        part_head = (
+            'Content-Type: text/{}; charset="utf-8"\r\n'
+            "MIME-Version: 1.0\r\n"
+            "Content-Transfer-Encoding: base64\r\n\r\n"
+        )
+        self._part_heads = {
+            "plain": part_head.format("plain").encode("ascii"),
+            "html": part_head.format("html").encode("ascii"),
+        }
+        self._last_body: dict[str, tuple[str, bytes]] = {}
+
+    def _encode_body(self, subtype: str, body: str) -> bytes:
+        cached = self._last_body.get(subtype)
+        if cached is not None and cached[0] == body:
+            return cached[1]
+        encoded = base64.encodebytes(body.encode("utf-8")).replace(b"\n", b"\r\n").rstrip(b"\r\n")
+        self._last_body[subtype] = (body, encoded)
+        return encoded
+
+    @staticmethod
+    def _subject(subject: str) -> bytes:
+        subject = _header_safe(subject)
+        charset = "us-ascii" if subject.isascii() else "utf-8"
+        return Header(subject, charset, header_name="Subject").encode(linesep="\r\n").encode("ascii")
+
+    def build(
+        self,
+        recipient_email: str,
+        subject: str,
+        body_html: str,
+        body_text: str,
+        reply_to_message_id: Optional[str] = None,
+    ) -> tuple[str, bytes]:
+        """Return (Message-ID, wire bytes) for one recipient."""
+        msg_id = make_msgid(domain=self.domain)
+        headers = (
+            f"Message-ID: {msg_id}\r\n"
+            f"To: {_header_safe(recipient_email)}\r\n"
+        )
+        if reply_to_message_id:
+            reply_to = _header_safe(reply_to_message_id)
+            headers += f"In-Reply-To: {reply_to}\r\nReferences: {reply_to}\r\n"
+        parts = [
+            self._head,
+            headers.encode("utf-8"),
+            b"Subject: ", self._subject(subject),
+            f"\r\nDate: {formatdate(localtime=True)}\r\n\r\n".encode("ascii"),
+        ]
+        for subtype, body in (("plain", body_text), ("html", body_html)):
+            if body:
+                parts += [self._delimiter, self._part_heads[subtype], self._encode_body(subtype, body)]
+        parts.append(self._close)
+        return msg_id, b"".join(parts)
+
+
+@lru_cache(maxsize=64)
+def message_builder(sender_email: str) -> MessageBuilder:
+    """Shared MessageBuilder per sender, so the static parts are prepared once."""
+    return MessageBuilder(sender_email)
+
+
+async def _transmit(
+    sender_email: str,
+    app_password: str,
+    recipient_email: str,
+    msg_id: str,
+    payload: bytes,
+    kind: str,
+    session: Optional[AsyncSMTPSession],
+) -> Optional[str]:
+    try:
+        if session is not None:
+            await session.sendmail(recipient_email, payload)
+        else:
+            async with AsyncSMTPSession(sender_email, app_password, max_messages=1) as one_off:
+                await one_off.sendmail(recipient_email, payload)
+        EMAILS_TOTAL.inc(kind=kind, result="sent")
+        return msg_id
+    except smtplib.SMTPAuthenticationError:
+        EMAILS_TOTAL.inc(kind=kind, result="error")
+        logger.error("Gmail authentication failed for %s. Check App Password.", sender_email)
+        raise
+    except smtplib.SMTPRecipientsRefused as exc:
+        if classify_smtp_error(exc) != PERMANENT:
+            # Not a verdict on the recipient (4xx, throttling): raise so the caller retries or fails over
+            EMAILS_TOTAL.inc(kind=kind, result="deferred")
+            logger.warning("Recipient %s deferred: %s", recipient_email, exc)
+            raise
+        EMAILS_TOTAL.inc(kind=kind, result="refused")
+        logger.warning("Recipient refused: %s", recipient_email)
+        return None
+    except Exception as exc:
+        if classify_smtp_error(exc) == PERMANENT:
+            EMAILS_TOTAL.inc(kind=kind, result="error")
+            logger.error("Failed to send email to %s: %s", recipient_email, exc)
+        else:
+            EMAILS_TOTAL.inc(kind=kind, result="deferred")
+            logger.warning("Sending to %s deferred: %s", recipient_email, exc)
+        raise
+
+
+async def send_email_async(
+    sender_email: str,
+    app_password: str,
+    recipient_email: str,
+    subject: str,
+    body_html: str,
+    body_text: str,
+    reply_to_message_id: Optional[str] = None,
+    session: Optional[AsyncSMTPSession] = None,
+) -> Optional[str]:
+    """send_email for coroutines, with an optional AsyncSMTPSession."""
+    msg_id, payload = message_builder(sender_email).build(
+        recipient_email, subject, body_html, body_text, reply_to_message_id,
+    )
+    kind = "followup" if reply_to_message_id else "initial"
+    return await _transmit(sender_email, app_password, recipient_email, msg_id, payload, kind, session)
 
 
 def send_email(
@@ -39,47 +404,32 @@ def send_email(
     body_html: str,
     body_text: str,
     reply_to_message_id: Optional[str] = None,
+    session: Optional[SMTPSession] = None,
 ) -> Optional[str]:
     """
     Send a single email via Gmail SMTP.
+    Pass an open `SMTPSession` to reuse its connection; otherwise a
+    one-off connection is opened and closed for this message.
+    Pacing is the caller's job (see send_engine.TokenBucket).
     Returns the Message-ID string on success, None on failure.
     """
-    msg = MIMEMultipart("alternative")
-    msg_id = make_msgid(domain=sender_email.split("@")[-1])
-    msg["Message-ID"] = msg_id
-    msg["From"] = sender_email
-    msg["To"] = recipient_email
-    msg["Subject"] = subject
-    msg["Date"] = formatdate(localtime=True)
+    # Built in the calling thread; only the network round trips go to the mail loop
+    msg_id, payload = message_builder(sender_email).build(
+        recipient_email, subject, body_html, body_text, reply_to_message_id,
+    )
+    kind = "followup" if reply_to_message_id else "initial"
+    return run_sync(_transmit(
+        sender_email, app_password, recipient_email, msg_id, payload, kind,
+        session.aio if session is not None else None,
+    ))
 
-    if reply_to_message_id:
-        msg["In-Reply-To"] = reply_to_message_id
-        msg["References"] = reply_to_message_id
-
-    if body_text:
-        msg.attach(MIMEText(body_text, "plain", "utf-8"))
-    if body_html:
-        msg.attach(MIMEText(body_html, "html", "utf-8"))
 
+async def _check_login(sender_email: str, app_password: str):
+    server = await smtp_connect(15)
     try:
-        with smtplib.SMTP(GMAIL_SMTP_HOST, GMAIL_SMTP_PORT, timeout=30) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            # Strip spaces — Google shows App Password as "xxxx xxxx xxxx xxxx"
-            server.login(sender_email, app_password.replace(" ", ""))
-            server.sendmail(sender_email, recipient_email, msg.as_string())
-        time.sleep(SEND_DELAY_SECONDS)
-        return msg_id
-    except smtplib.SMTPAuthenticationError:
-        logger.error("Gmail authentication failed for %s. Check App Password.", sender_email)
-        raise
-    except smtplib.SMTPRecipientsRefused:
-        logger.warning("Recipient refused: %s", recipient_email)
-        return None
-    except Exception as exc:
-        logger.error("Failed to send email to %s: %s", recipient_email, exc)
-        raise
+        await server.login(sender_email, app_password.replace(" ", ""))
+    finally:
+        await server.quit()
 
 
 def test_credentials(sender_email: str, app_password: str) -> tuple[bool, str]:
@@ -88,10 +438,7 @@ def test_credentials(sender_email: str, app_password: str) -> tuple[bool, str]:
     Returns (success: bool, message: str).
     """
     try:
-        with smtplib.SMTP(GMAIL_SMTP_HOST, GMAIL_SMTP_PORT, timeout=15) as server:
-            server.ehlo()
-            server.starttls()
-            server.login(sender_email, app_password.replace(" ", ""))
+        run_sync(_check_login(sender_email, app_password))
         return True, "Credenciales correctas ✓"
     except smtplib.SMTPAuthenticationError:
         return False, "Error de autenticación. Verifica que usas la App Password (16 caracteres) y no tu contraseña normal de Gmail."
@@ -99,54 +446,185 @@ def test_credentials(sender_email: str, app_password: str) -> tuple[bool, str]:
         return False, f"Error de conexión: {exc}"
 
 
-def check_replies(
+class MailboxCursor:
+    """
+    Where the previous IMAP scan stopped: the mailbox UIDVALIDITY and the
+    highest UID already examined. `scan_inbox` advances it in place after
+    a successful scan; callers persist it between runs.
+    """
+
+    def __init__(self, uidvalidity: Optional[int] = None, last_uid: int = 0):
+        self.uidvalidity = uidvalidity
+        self.last_uid = last_uid or 0
+
+
+# UIDs per UID FETCH command when scanning an explicit UID list
+IMAP_FETCH_BATCH = 500
+
+# Reply headers plus what looks_like_dsn() needs to spot bounce notifications
+_SCAN_HEADERS = "BODY.PEEK[HEADER.FIELDS (IN-REPLY-TO REFERENCES CONTENT-TYPE FROM X-FAILED-RECIPIENTS)]"
+_MESSAGE_ID_RE = re.compile(r"<[^>]+>")
+
+
+async def _uid_fetch(imap: AsyncIMAP, uid_set: str, item: str = _SCAN_HEADERS) -> list[tuple[int, bytes]]:
+    """(uid, data) for every message in a UID set, in one round trip."""
+    label = "body" if item == "BODY.PEEK[]" else "headers"
+    with timed(IMAP_FETCH_SECONDS, item=label):
+        fetched = await imap.uid_fetch(uid_set, item)
+    IMAP_MESSAGES_TOTAL.inc(len(fetched), item=label)
+    return fetched
+
+
+class InboxScan:
+    """What one IMAP pass found: Message-IDs referenced by replies, and bounces."""
+
+    def __init__(self):
+        self.references: set[str] = set()
+        self.bounces: list[Bounce] = []
+        self.examined = 0
+        self.mode = "failed"  # incremental | full, once the scan completed
+
+
+async def scan_mailbox(
+    imap: AsyncIMAP,
     sender_email: str,
-    app_password: str,
-    message_ids: list[str],
-) -> list[str]:
+    cursor: Optional[MailboxCursor] = None,
+    since: Optional[date] = None,
+) -> InboxScan:
     """
-    Check Gmail inbox via IMAP for replies to the given Message-IDs.
-    Searches in INBOX and [Gmail]/Sent Mail for emails with In-Reply-To or References
-    headers matching any of the provided message IDs.
-    Returns a list of original Message-IDs that have received a reply.
+    Scan the mailbox selected on `imap` for replies and delivery status
+    notifications.
+
+    With a `cursor` from a previous run (same UIDVALIDITY) only messages with
+    a higher UID are fetched, in a single `UID FETCH n:*`. Otherwise the
+    candidate UIDs come from `UID SEARCH SINCE <since>` (or ALL) and are
+    fetched in batches. Only a few headers are fetched per message; the full
+    body is fetched just for the messages that look like bounces. The cursor
+    is advanced only when the scan succeeds; errors are raised.
     """
-    if not message_ids:
-        return []
+    scan = InboxScan()
+    uidvalidity, uidnext = imap.uidvalidity, imap.uidnext
 
-    replied_to = set()
+    incremental = (
+        cursor is not None and cursor.last_uid
+        and uidvalidity is not None and cursor.uidvalidity == uidvalidity
+    )
+    if incremental:
+        # Skip the round trip entirely when nothing arrived since last time
+        has_new = uidnext is None or uidnext > cursor.last_uid + 1
+        batches = [f"{cursor.last_uid + 1}:*"] if has_new else []
+        floor = cursor.last_uid
+    else:
+        if cursor is not None and cursor.uidvalidity not in (None, uidvalidity):
+            logger.info("UIDVALIDITY changed for %s, rescanning INBOX", sender_email)
+        criteria = f"SINCE {since.strftime('%d-%b-%Y')}" if since else "ALL"
+        uids = await imap.uid_search(criteria)
+        batches = [
+            ",".join(map(str, uids[i:i + IMAP_FETCH_BATCH]))
+            for i in range(0, len(uids), IMAP_FETCH_BATCH)
+        ]
+        floor = 0
 
-    try:
-        with imaplib.IMAP4_SSL(GMAIL_IMAP_HOST, GMAIL_IMAP_PORT) as imap:
-            imap.login(sender_email, app_password)
-            imap.select("INBOX", readonly=True)
-
-            # Search all unseen messages and check their headers
-            _, data = imap.search(None, "ALL")
-            if not data or not data[0]:
-                return []
-
-            msg_nums = data[0].split()
-            # Fetch headers only (RFC822.HEADER) for efficiency
-            for num in msg_nums:
-                try:
-                    _, msg_data = imap.fetch(num, "(BODY.PEEK[HEADER.FIELDS (IN-REPLY-TO REFERENCES)])")
-                    if not msg_data or not msg_data[0]:
-                        continue
-                    raw_header = msg_data[0][1]
-                    if isinstance(raw_header, bytes):
-                        raw_header = raw_header.decode("utf-8", errors="ignore")
-
-                    # Extract referenced message IDs from headers
-                    refs = re.findall(r"<[^>]+>", raw_header)
-                    for ref in refs:
-                        if ref in message_ids:
-                            replied_to.add(ref)
-                except Exception:
-                    continue
+    highest = floor
+    dsn_uids = []
+    header_parser = HeaderParser()
+    for uid_set in batches:
+        for uid, raw_header in await _uid_fetch(imap, uid_set):
+            # "n:*" always returns the newest message, even if its UID < n
+            if uid <= floor:
+                continue
+            scan.examined += 1
+            highest = max(highest, uid)
+            if isinstance(raw_header, bytes):
+                raw_header = raw_header.decode("utf-8", errors="ignore")
+            headers = header_parser.parsestr(raw_header or "", headersonly=True)
+            if looks_like_dsn(headers):
+                # A DSN references the bounced message too; it is not a reply
+                dsn_uids.append(str(uid))
+                continue
+            refs = f"{headers.get('In-Reply-To', '')} {headers.get('References', '')}"
+            scan.references.update(_MESSAGE_ID_RE.findall(refs))
+
+    for i in range(0, len(dsn_uids), IMAP_FETCH_BATCH):
+        for _, raw in await _uid_fetch(imap, ",".join(dsn_uids[i:i + IMAP_FETCH_BATCH]), "BODY.PEEK[]"):
+            try:
+                scan.bounces.extend(parse_dsn(raw))
+            except Exception as exc:
+                logger.warning("Unparseable bounce notification for %s: %s", sender_email, exc)
+
+    scan.mode = "incremental" if incremental else "full"
+    logger.info("IMAP scan for %s: %d new messages examined (%s), %d bounce notifications",
+                sender_email, scan.examined, scan.mode, len(dsn_uids))
+    if cursor is not None:
+        cursor.uidvalidity = uidvalidity
+        # Everything below UIDNEXT at SELECT time has been examined or predates `since`
+        cursor.last_uid = max(highest, (uidnext or 1) - 1)
+    return scan
 
+
+async def scan_inbox_async(
+    sender_email: str,
+    app_password: str,
+    cursor: Optional[MailboxCursor] = None,
+    since: Optional[date] = None,
+) -> InboxScan:
+    """
+    Log in, scan INBOX (see scan_mailbox) and log out. Errors are logged
+    and give an empty scan, with the cursor left where it was.
+    """
+    scan = InboxScan()
+    started = time.perf_counter()
+    try:
+        async with imap_connect() as imap:
+            await imap.login(sender_email, app_password)
+            await imap.select("INBOX", readonly=True)
+            scan = await scan_mailbox(imap, sender_email, cursor=cursor, since=since)
     except imaplib.IMAP4.error as exc:
-        logger.error("IMAP error while checking replies: %s", exc)
+        logger.error("IMAP error while scanning %s: %s", sender_email, exc)
     except Exception as exc:
-        logger.error("Unexpected error in check_replies: %s", exc)
+        logger.error("Unexpected error in scan_inbox for %s: %s", sender_email, exc)
+
+    IMAP_SCAN_SECONDS.observe(time.perf_counter() - started, mode=scan.mode)
+    return scan
+
 
-    return list(replied_to)
+def scan_inbox(
+    sender_email: str,
+    app_password: str,
+    cursor: Optional[MailboxCursor] = None,
+    since: Optional[date] = None,
+) -> InboxScan:
+    """Blocking scan_inbox_async, run on the shared mail loop."""
+    return run_sync(scan_inbox_async(sender_email, app_password, cursor=cursor, since=since))
+
+
+async def check_replies_async(
+    sender_email: str,
+    app_password: str,
+    message_ids: Optional[Iterable[str]] = None,
+    cursor: Optional[MailboxCursor] = None,
+    since: Optional[date] = None,
+) -> list[str]:
+    """
+    Check Gmail inbox via IMAP for replies to the given Message-IDs, using
+    the In-Reply-To and References headers (see scan_inbox).
+    With `message_ids=None` every Message-ID referenced by the scanned mail
+    is returned, for the caller to match in bulk (see SentMessage), so the
+    cost grows with new mail rather than with everything ever sent.
+    """
+    wanted = None if message_ids is None else set(message_ids)
+    if wanted is not None and not wanted:
+        return []
+    refs = (await scan_inbox_async(sender_email, app_password, cursor=cursor, since=since)).references
+    return list(refs if wanted is None else refs & wanted)
+
+
+def check_replies(
+    sender_email: str,
+    app_password: str,
+    message_ids: Optional[Iterable[str]] = None,
+    cursor: Optional[MailboxCursor] = None,
+    since: Optional[date] = None,
+) -> list[str]:
+    """Blocking check_replies_async, run on the shared mail loop."""
+    return run_sync(check_replies_async(sender_email, app_password, message_ids, cursor=cursor, since=since))
@@ -0,0 +1,119 @@
+"""
+events.py
+In-process event bus feeding the dashboard's Server-Sent Events stream.
+
+Producers (send engine, scheduler jobs, campaign endpoints) publish small
+deltas; each connected dashboard gets its own bounded queue. A subscriber
+that falls too far behind is told to resync instead of blocking producers.
+"""
+import json
+import queue
+import threading
+from typing import Optional
+
+
+class Subscription:
+    """One listener's queue plus an overflow flag."""
+
+    def __init__(self, campaign_id: Optional[int], maxsize: int):
+        self.campaign_id = campaign_id
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def wants(self, campaign_id: Optional[int]) -> bool:
+        return self.campaign_id is None or campaign_id is None or campaign_id == self.campaign_id
+
+
+class EventBus:
+    """Thread-safe fan-out of (event, data) pairs to all current subscribers."""
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self._subs: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, campaign_id: Optional[int] = None) -> Subscription:
+        sub = Subscription(campaign_id, self.max_queue)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            self._subs.discard(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def publish(self, event: str, data: dict):
+        """Never blocks: a full subscriber queue marks that subscriber for resync."""
+        if not self._subs:
+            return
+        campaign_id = data.get("campaign_id")
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            if not sub.wants(campaign_id):
+                continue
+            try:
+                sub.queue.put_nowait((event, data))
+            except queue.Full:
+                sub.overflowed = True
+
+
+bus = EventBus()
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Serialise one event in text/event-stream framing."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def iter_sse(sub: Subscription, heartbeat: float = 15):
+    """
+    Yield a subscription's events as text/event-stream chunks until the
+    client goes away, with keep-alive comments while idle.
+    """
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            if sub.overflowed:
+                # Deltas were lost: drop the backlog and ask for a full reload
+                sub.overflowed = False
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                yield format_sse("resync", {"campaign_id": sub.campaign_id})
+            try:
+                event, data = sub.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                # Comment line keeps proxies and the browser from timing out
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event, data)
+    finally:
+        bus.unsubscribe(sub)
+
+
+def publish_contact_changes(campaign_id: int, changes: list[tuple]):
+    """
+    Publish `contact` events for (contact, previous_status) pairs plus one
+    aggregated `stats` delta for the whole batch.
+    """
+    if not changes or not bus.subscriber_count:
+        return
+    delta: dict[str, int] = {}
+    for contact, previous in changes:
+        if previous == contact.status:
+            continue
+        bus.publish("contact", {"campaign_id": campaign_id, "contact": contact.to_dict()})
+        if previous:
+            delta[previous] = delta.get(previous, 0) - 1
+        delta[contact.status] = delta.get(contact.status, 0) + 1
+    if delta:
+        bus.publish("stats", {"campaign_id": campaign_id, "delta": delta})
+
+
+def publish_campaign(campaign):
+    """Publish the campaign's current state (status, last_error, ...)."""
+    bus.publish("campaign", {"campaign_id": campaign.id, "campaign": campaign.to_dict()})
@@ -2,9 +2,17 @@
 excel_service.py
 Handles reading contacts from Excel and writing status updates back.
 """
+import codecs
+import csv
+import logging
 import os
+import re
 import shutil
-from datetime import datetime
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, time as time_of_day
 from typing import Optional
 
 import openpyxl
@@ -12,6 +20,10 @@ from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 from flask import current_app
 
+from app.metrics import EXCEL_UPDATES_TOTAL, EXCEL_WRITEBACK_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
 
 STATUS_COLUMN = "Estado"
 SENT_AT_COLUMN = "Fecha Envío"
@@ -30,11 +42,33 @@ STATUS_LABELS = {
 }
 
 
+# Why a row was not imported, with the wording used in the launch message
+REJECT_MISSING_EMAIL = "missing_email"
+REJECT_INVALID_EMAIL = "invalid_email"
+REJECT_DUPLICATE = "duplicate"
+REJECTION_LABELS = {
+    REJECT_MISSING_EMAIL: "sin email",
+    REJECT_INVALID_EMAIL: "con email no válido",
+    REJECT_DUPLICATE: "repetidas en el archivo",
+}
+
+# One @, no spaces, a dot in the domain; checked on the lowercased address
+EMAIL_PATTERN = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+_EMAIL_RE = re.compile(EMAIL_PATTERN)
+
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+CSV_EXTENSIONS = (".csv", ".tsv")
+
+
+def _is_csv(file_path: str) -> bool:
+    return file_path.lower().endswith(CSV_EXTENSIONS)
+
+
 def save_upload(file: FileStorage) -> str:
-    """Save uploaded Excel to the uploads folder. Returns the saved file path."""
+    """Save uploaded Excel/CSV to the uploads folder. Returns the saved file path."""
     filename = secure_filename(file.filename)
-    if not filename.endswith((".xlsx", ".xls")):
-        raise ValueError("El archivo debe ser .xlsx o .xls")
+    if not filename.lower().endswith(EXCEL_EXTENSIONS + CSV_EXTENSIONS):
+        raise ValueError("El archivo debe ser .xlsx, .xls, .csv o .tsv")
     upload_folder = current_app.config["UPLOAD_FOLDER"]
     os.makedirs(upload_folder, exist_ok=True)
     dest = os.path.join(upload_folder, filename)
@@ -42,54 +76,297 @@ def save_upload(file: FileStorage) -> str:
     return dest
 
 
+def _csv_dialect(f, file_path: str):
+    """TSV by extension; otherwise sniff ',' vs ';' (Spanish Excel exports use ';')."""
+    if file_path.lower().endswith(".tsv"):
+        return csv.excel_tab
+    sample = f.read(64 * 1024)
+    f.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        return csv.excel
+
+
+def _csv_encoding(file_path: str) -> str:
+    """
+    utf-8-sig for Excel's "CSV UTF-8" (with a BOM), utf-8 if the whole file
+    decodes as such, otherwise cp1252: what Excel uses for plain "CSV" on
+    Spanish (and other Western European) Windows.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with open(file_path, "rb") as f:
+        chunk = f.read(1024 * 1024)
+        if chunk.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        try:
+            while chunk:
+                decoder.decode(chunk)
+                chunk = f.read(1024 * 1024)
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return "cp1252"
+    return "utf-8"
+
+
+def _open_csv(file_path: str):
+    """Open a CSV/TSV for reading in its own encoding (see _csv_encoding), kept as `f.encoding`."""
+    return open(file_path, newline="", encoding=_csv_encoding(file_path))
+
+
+def iter_rows(file_path: str):
+    """
+    Yield the sheet as tuples of cell values, header row first, without
+    loading the whole file: openpyxl read-only mode for Excel, csv for CSV/TSV.
+    Empty CSV cells come back as None, like empty Excel cells.
+    """
+    if _is_csv(file_path):
+        with _open_csv(file_path) as f:
+            for row in csv.reader(f, _csv_dialect(f, file_path)):
+                yield tuple(v if v != "" else None for v in row)
+        return
+
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
 def read_columns(file_path: str) -> list[str]:
     """Return the list of column headers in the Excel file (excludes managed columns)."""
-    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-    ws = wb.active
     headers = []
-    for cell in next(ws.iter_rows(min_row=1, max_row=1)):
-        val = cell.value
+    for val in next(iter_rows(file_path), ()):
         if val and str(val).strip() and str(val).strip() not in MANAGED_COLUMNS:
             headers.append(str(val).strip())
-    wb.close()
     return headers
 
 
-def read_contacts(file_path: str, name_col: str, email_col: str) -> list[dict]:
+def _json_safe(value):
+    """Custom fields are stored as JSON: render dates the way the sheet shows them."""
+    if isinstance(value, datetime):
+        return value.strftime("%d/%m/%Y %H:%M") if (value.hour or value.minute) else value.strftime("%d/%m/%Y")
+    if isinstance(value, (date, time_of_day)):
+        return value.isoformat()
+    return value
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def iter_contacts(file_path: str, name_col: str, email_col: str, rejected: Optional[Counter] = None):
     """
-    Read all rows from the Excel.
-    Returns list of dicts with keys: 'name', 'email', 'custom_fields' (all other columns).
-    Skips rows without a valid email.
+    Stream contacts from the Excel/CSV one row at a time.
+    Yields dicts with keys: 'name', 'email', 'email_normalized',
+    'custom_fields' (all other columns). Skips rows without an email, with
+    an invalid one, or repeating an earlier row's address, counting them in
+    `rejected` by reason (REJECT_*). Blank rows are skipped silently.
     """
-    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-    ws = wb.active
-
-    rows = list(ws.iter_rows(values_only=True))
-    if not rows:
-        wb.close()
-        return []
+    rows = iter_rows(file_path)
+    header_row = next(rows, None)
+    if header_row is None:
+        return
 
-    headers = [str(h).strip() if h else "" for h in rows[0]]
-    contacts = []
+    headers = [str(h).strip() if h else "" for h in header_row]
+    # Resolve column positions once instead of building a dict per row
+    email_idx = headers.index(email_col) if email_col in headers else None
+    name_idx = headers.index(name_col) if name_col in headers else None
+    if email_idx is None:
+        return
+    custom_idx = [
+        (i, h) for i, h in enumerate(headers)
+        if h and h not in (name_col, email_col) and h not in MANAGED_COLUMNS
+    ]
+    if rejected is None:
+        rejected = Counter()
+    seen = set()
 
-    for row in rows[1:]:
-        row_dict = {headers[i]: row[i] for i in range(len(headers)) if headers[i]}
-        email = row_dict.get(email_col)
-        name = row_dict.get(name_col, "")
-        if not email or "@" not in str(email):
+    for row in rows:
+        email = row[email_idx] if email_idx < len(row) else None
+        email = str(email).strip() if email is not None else ""
+        if not email:
+            if not all(_is_blank(value) for value in row):
+                rejected[REJECT_MISSING_EMAIL] += 1
             continue
-        custom = {
-            k: v for k, v in row_dict.items()
-            if k not in (name_col, email_col) and k not in MANAGED_COLUMNS
-        }
-        contacts.append({
+        normalized = email.lower()
+        if not _EMAIL_RE.fullmatch(normalized):
+            rejected[REJECT_INVALID_EMAIL] += 1
+            continue
+        if normalized in seen:
+            rejected[REJECT_DUPLICATE] += 1
+            continue
+        seen.add(normalized)
+        name = row[name_idx] if name_idx is not None and name_idx < len(row) else ""
+        yield {
             "name": str(name).strip() if name else "",
-            "email": str(email).strip(),
-            "custom_fields": custom,
-        })
+            "email": email,
+            "email_normalized": normalized,
+            "custom_fields": {h: _json_safe(row[i]) if i < len(row) else None for i, h in custom_idx},
+        }
+
+
+# ── pandas import ─────────────────────────────────────────────────────────────
+# Same rules and output as iter_contacts, applied to whole columns at once.
+# Excel sheets are parsed by python-calamine when it is installed, which is
+# where most of the time goes. The sheet is loaded in full, trading memory
+# for speed; pandas is optional and the row-by-row reader is used without it.
+
+def _pandas():
+    try:
+        import pandas
+    except ImportError:
+        return None
+    return pandas
+
+
+def _calamine_installed() -> bool:
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _read_frame(pd, file_path: str):
+    """
+    The whole sheet as raw cell values (header row included), or None if
+    pandas cannot parse it. Nothing is inferred: "08001" stays a string.
+    """
+    if _is_csv(file_path):
+        with _open_csv(file_path) as f:
+            dialect = _csv_dialect(f, file_path)
+            try:
+                frame = pd.read_csv(f, header=None, dtype=str, keep_default_na=False, dialect=dialect)
+            except (pd.errors.ParserError, pd.errors.EmptyDataError) as exc:
+                # e.g. rows longer than the header, which the csv module tolerates
+                logger.warning("pandas could not parse %s (%s); reading it row by row", file_path, exc)
+                return None
+        return frame.where(frame != "", None)
+    if _calamine_installed():
+        # Parsed in Rust, several times faster than openpyxl; reads .xls too
+        frame = pd.read_excel(file_path, header=None, dtype=object, engine="calamine")
+    else:
+        # openpyxl's values-only rows are faster than pd.read_excel, which converts cell by cell
+        frame = pd.DataFrame(list(iter_rows(file_path)), dtype=object)
+    return frame.where(frame.notna(), None)
+
+
+def _coerce_column(pd, column) -> list:
+    """
+    JSON-safe values of one custom column, as _json_safe gives per cell.
+    Columns of plain strings and numbers are kept as they are; any other
+    (dates, times, mixed) is converted once per distinct value, which a
+    sheet repeats a lot, and spread back with one take.
+    """
+    if pd.api.types.infer_dtype(column, skipna=True) in (
+            "string", "integer", "floating", "mixed-integer-float", "boolean", "empty"):
+        return column.tolist()
+    codes, uniques = pd.factorize(column)
+    # Code -1 (an empty cell) picks the trailing None
+    converted = pd.array([_json_safe(value) for value in uniques] + [None], dtype=object)
+    return converted.take(codes).tolist()
 
-    wb.close()
-    return contacts
+
+def _iter_frame_chunks(pd, frame, name_col: str, email_col: str, chunk_size: int, rejected: Counter):
+    if frame.empty:
+        return
+    headers = [str(h).strip() if h else "" for h in frame.iloc[0]]
+    if email_col not in headers:
+        return
+    email_idx = headers.index(email_col)
+    name_idx = headers.index(name_col) if name_col in headers else None
+    # Last column wins for repeated headers, as in iter_contacts' dict
+    custom_idx = {
+        h: i for i, h in enumerate(headers)
+        if h and h not in (name_col, email_col) and h not in MANAGED_COLUMNS
+    }
+    rows = frame.iloc[1:]
+
+    email = rows[email_idx]
+    email = email.where(email.isna(), email.astype(str).str.strip()).fillna("")
+    normalized = email.str.lower()
+    missing = email == ""
+    if missing.any():
+        # A blank row is not a rejected contact
+        cells = rows[missing]
+        blank = cells.apply(lambda c: c.isna() | (c.astype(str).str.strip() == "")).all(axis=1)
+        missing_count = int((~blank).sum())
+        if missing_count:
+            rejected[REJECT_MISSING_EMAIL] += missing_count
+    invalid = ~missing & ~normalized.str.fullmatch(EMAIL_PATTERN)
+    valid = ~missing & ~invalid
+    # Invalid addresses become NaN so that they are not counted as repeats
+    duplicate = valid & normalized.where(valid).duplicated()
+    for reason, mask in ((REJECT_INVALID_EMAIL, invalid), (REJECT_DUPLICATE, duplicate)):
+        count = int(mask.sum())
+        if count:
+            rejected[reason] += count
+    keep = valid & ~duplicate
+
+    rows = rows[keep]
+    email, normalized = email[keep].tolist(), normalized[keep].tolist()
+    if name_idx is not None:
+        # Same as str(name).strip() if name else ""
+        name = rows[name_idx]
+        name = name.where(name.astype(bool), "").astype(str).str.strip().tolist()
+    else:
+        name = [""] * len(email)
+    # Plain lists zipped into dicts: DataFrame.to_dict boxes every cell and is several times slower
+    custom_names = list(custom_idx)
+    custom = [_coerce_column(pd, rows[i]) for i in custom_idx.values()]
+
+    for start in range(0, len(email), chunk_size):
+        stop = start + chunk_size
+        fields = [dict(zip(custom_names, values)) for values in zip(*(column[start:stop] for column in custom))] \
+            if custom else [{} for _ in email[start:stop]]
+        yield [
+            {"name": n, "email": e, "email_normalized": k, "custom_fields": f}
+            for n, e, k, f in zip(name[start:stop], email[start:stop], normalized[start:stop], fields)
+        ]
+
+
+def iter_contact_chunks(file_path: str, name_col: str, email_col: str, chunk_size: int = 1000,
+                        rejected: Optional[Counter] = None, engine: str = "python"):
+    """
+    Stream contacts in lists of at most `chunk_size`, ready for a bulk insert,
+    counting skipped rows in `rejected` (see iter_contacts). engine="python"
+    reads row by row without loading the whole file; "pandas" validates whole
+    columns with pandas when it is installed, holding the whole sheet in
+    memory; "auto" uses pandas for Excel files only.
+    """
+    if rejected is None:
+        rejected = Counter()
+    # CSV parses as fast row by row (the csv module is C too), so "auto" keeps streaming it
+    if engine == "pandas" or (engine == "auto" and not _is_csv(file_path)):
+        pd = _pandas()
+        if pd is None:
+            if engine == "pandas":
+                logger.warning("IMPORT_ENGINE=pandas but pandas is not installed; reading row by row")
+        else:
+            frame = _read_frame(pd, file_path)
+            if frame is not None:
+                yield from _iter_frame_chunks(pd, frame, name_col, email_col, max(1, chunk_size), rejected)
+                return
+
+    chunk = []
+    for contact in iter_contacts(file_path, name_col, email_col, rejected):
+        chunk.append(contact)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_contacts(file_path: str, name_col: str, email_col: str) -> list[dict]:
+    """
+    Read all rows from the Excel.
+    Returns list of dicts with keys: 'name', 'email', 'email_normalized',
+    'custom_fields' (all other columns). Skips rows without a valid email.
+    Use iter_contacts for large files.
+    """
+    return list(iter_contacts(file_path, name_col, email_col))
 
 
 def _ensure_managed_columns(ws, headers: list) -> dict:
@@ -117,6 +394,137 @@ def _find_email_col_index(ws, email_col: str) -> Optional[int]:
     return None
 
 
+def _replace(tmp_path: str, file_path: str):
+    """Rename a finished temp file over `file_path`, keeping the original's permissions (mkstemp makes 0600)."""
+    if os.path.exists(file_path):
+        shutil.copymode(file_path, tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+def _atomic_save(wb, file_path: str):
+    """Save to a temp file next to the target and rename it over the original."""
+    folder = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".~", suffix=os.path.splitext(file_path)[1], dir=folder)
+    os.close(fd)
+    try:
+        wb.save(tmp_path)
+        _replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+# One lock per workbook (absolute path): the send engine, reply checks, follow-ups and
+# excel_sync each have their own ExcelWriteBack, and two load-update-save cycles
+# overlapping on one file would lose the changes of whichever renamed first
+_file_locks: dict[str, threading.Lock] = {}
+_file_locks_lock = threading.Lock()
+
+
+def _file_lock(file_path: str) -> threading.Lock:
+    key = os.path.abspath(file_path)
+    with _file_locks_lock:
+        lock = _file_locks.get(key)
+        if lock is None:
+            lock = _file_locks[key] = threading.Lock()
+        return lock
+
+
+def _apply_updates(file_path: str, email_col: str, updates: dict[str, dict]):
+    """
+    Write many contact updates in a single load/save of the workbook.
+    `updates` maps lowercase email → {"status", "sent_at", "replied_at", "followup_sent_at"}.
+    Writes to the same file are serialised across all writers in the process.
+    """
+    with _file_lock(file_path), timed(EXCEL_WRITEBACK_SECONDS):
+        if _is_csv(file_path):
+            _apply_updates_csv(file_path, email_col, updates)
+        else:
+            _apply_updates_xlsx(file_path, email_col, updates)
+    EXCEL_UPDATES_TOTAL.inc(len(updates))
+
+
+def _apply_updates_xlsx(file_path: str, email_col: str, updates: dict[str, dict]):
+    wb = openpyxl.load_workbook(file_path)
+    try:
+        ws = wb.active
+
+        col_map = _ensure_managed_columns(ws, [])
+        email_col_idx = _find_email_col_index(ws, email_col)
+        if email_col_idx is None:
+            return
+
+        # One pass over the email column only to locate every row we need
+        rows = {}
+        for (cell,) in ws.iter_rows(min_row=2, min_col=email_col_idx, max_col=email_col_idx):
+            if cell.value:
+                key = str(cell.value).strip().lower()
+                if key in updates and key not in rows:
+                    rows[key] = cell.row
+
+        for key, row_num in rows.items():
+            for column, value in _managed_values(updates[key]).items():
+                ws.cell(row=row_num, column=col_map[column], value=value)
+
+        _atomic_save(wb, file_path)
+    finally:
+        wb.close()
+
+
+def _managed_values(update: dict) -> dict:
+    """Managed column → cell value for one queued contact update."""
+    status = update["status"]
+    values = {STATUS_COLUMN: STATUS_LABELS.get(status, status)}
+    for column, field in ((SENT_AT_COLUMN, "sent_at"), (REPLIED_AT_COLUMN, "replied_at"),
+                          (FOLLOWUP_COLUMN, "followup_sent_at")):
+        if update.get(field):
+            values[column] = update[field].strftime("%d/%m/%Y %H:%M")
+    return values
+
+
+def _apply_updates_csv(file_path: str, email_col: str, updates: dict[str, dict]):
+    """CSV/TSV counterpart of _apply_updates: stream rows into a temp file, then rename."""
+    folder = os.path.dirname(os.path.abspath(file_path))
+    with _open_csv(file_path) as src:
+        dialect = _csv_dialect(src, file_path)
+        reader = csv.reader(src, dialect)
+        header = next(reader, None)
+        if not header:
+            return
+        names = [h.strip() for h in header]
+        if email_col not in names:
+            return
+        for column in MANAGED_COLUMNS:
+            if column not in names:
+                header.append(column)
+                names.append(column)
+        email_idx = names.index(email_col)
+        col_idx = {column: names.index(column) for column in MANAGED_COLUMNS}
+
+        fd, tmp_path = tempfile.mkstemp(prefix=".~", suffix=os.path.splitext(file_path)[1], dir=folder)
+        try:
+            # Same encoding (and BOM or not) as the file had
+            with os.fdopen(fd, "w", newline="", encoding=src.encoding) as dst:
+                writer = csv.writer(dst, dialect)
+                writer.writerow(header)
+                for row in reader:
+                    row.extend([""] * (len(header) - len(row)))
+                    update = updates.get(row[email_idx].strip().lower())
+                    if update:
+                        for column, value in _managed_values(update).items():
+                            row[col_idx[column]] = value
+                    writer.writerow(row)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    try:
+        _replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
 def update_contact_status(
     file_path: str,
     email: str,
@@ -129,29 +537,91 @@ def update_contact_status(
     """
     Update status columns for a contact row identified by email.
     Adds managed columns if they don't exist yet. Saves the file in place.
+    Prefer ExcelWriteBack when updating more than one contact.
     """
-    wb = openpyxl.load_workbook(file_path)
-    ws = wb.active
+    _apply_updates(file_path, email_col, {
+        email.strip().lower(): {
+            "status": status,
+            "sent_at": sent_at,
+            "replied_at": replied_at,
+            "followup_sent_at": followup_sent_at,
+        },
+    })
 
-    col_map = _ensure_managed_columns(ws, [])
-    email_col_idx = _find_email_col_index(ws, email_col)
 
-    if email_col_idx is None:
-        wb.close()
-        return
+class ExcelWriteBack:
+    """
+    Collects contact status changes for one workbook and writes them in a
+    single load/save, either every `flush_every` changes, once the oldest
+    queued change is `flush_interval` seconds old, or on an explicit flush().
+    Use as a context manager to flush whatever is left on exit.
+    """
+
+    def __init__(self, file_path: str, email_col: str = "Email",
+                 flush_every: int = 50, flush_interval: float = 10.0):
+        self.file_path = file_path
+        self.email_col = email_col or "Email"
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self._pending: dict[str, dict] = {}
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def queue(
+        self,
+        email: str,
+        status: str,
+        sent_at: Optional[datetime] = None,
+        replied_at: Optional[datetime] = None,
+        followup_sent_at: Optional[datetime] = None,
+    ):
+        """Record a change; flushes (never raises) once a threshold is reached."""
+        with self._lock:
+            update = self._pending.setdefault(email.strip().lower(), {})
+            update["status"] = status
+            for field, value in (("sent_at", sent_at), ("replied_at", replied_at),
+                                 ("followup_sent_at", followup_sent_at)):
+                if value:
+                    update[field] = value
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (len(self._pending) >= self.flush_every
+                   or time.monotonic() - self._oldest >= self.flush_interval)
+        if due:
+            try:
+                self.flush()
+            except Exception as exc:
+                logger.warning("Excel write-back failed, %d changes kept for retry: %s", len(self._pending), exc)
+
+    def flush(self):
+        """Write all queued changes now. On failure they stay queued for the next flush."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            self._oldest = None
+            try:
+                _apply_updates(self.file_path, self.email_col, pending)
+            except Exception:
+                self._pending = pending
+                self._oldest = time.monotonic()
+                raise
+
 
-    for row in ws.iter_rows(min_row=2):
-        cell_email = row[email_col_idx - 1]
-        if cell_email.value and str(cell_email.value).strip().lower() == email.lower():
-            row_num = cell_email.row
-            ws.cell(row=row_num, column=col_map[STATUS_COLUMN], value=STATUS_LABELS.get(status, status))
-            if sent_at:
-                ws.cell(row=row_num, column=col_map[SENT_AT_COLUMN], value=sent_at.strftime("%d/%m/%Y %H:%M"))
-            if replied_at:
-                ws.cell(row=row_num, column=col_map[REPLIED_AT_COLUMN], value=replied_at.strftime("%d/%m/%Y %H:%M"))
-            if followup_sent_at:
-                ws.cell(row=row_num, column=col_map[FOLLOWUP_COLUMN], value=followup_sent_at.strftime("%d/%m/%Y %H:%M"))
-            break
-
-    wb.save(file_path)
-    wb.close()
+def campaign_writeback(campaign, config) -> ExcelWriteBack:
+    """ExcelWriteBack for a campaign's workbook using the app's flush settings."""
+    return ExcelWriteBack(
+        campaign.excel_path,
+        email_col=getattr(campaign, "email_col", None) or "Email",
+        flush_every=config.get("EXCEL_FLUSH_EVERY", 50),
+        flush_interval=config.get("EXCEL_FLUSH_SECONDS", 10),
+    )
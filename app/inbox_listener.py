@@ -0,0 +1,172 @@
+"""
+inbox_listener.py
+Push-based reply detection. For every sender with contacts awaiting a
+reply, a listener holds one IMAP connection parked in IDLE on INBOX. When
+the server reports new mail (EXISTS), only the messages above the mailbox
+cursor are fetched, on that same connection, and replies and bounces are
+recorded within seconds instead of at the next check_replies_job poll.
+
+Listeners are tasks on the mail loop (aiomail.py); their database work
+runs in worker threads. Senders whose server lacks IDLE, and senders whose
+listener is reconnecting, are still covered by check_replies_job.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from app.aiomail import mail_loop
+from app.metrics import IMAP_SCAN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Seconds before reconnecting after a failure, doubling up to the maximum
+RETRY_MIN_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+
+_listeners: dict[str, "InboxListener"] = {}
+_idle_unsupported: set[str] = set()
+_lock = threading.Lock()
+
+
+class _IdleUnsupported(Exception):
+    pass
+
+
+class InboxListener:
+    """
+    Listens for new mail in one sender's INBOX: catches up with anything
+    that arrived while it was not connected, then IDLEs, re-issuing IDLE
+    every IMAP_IDLE_SECONDS (RFC 2177 asks for less than 29 minutes).
+    run() returns once the sender has nothing left awaiting a reply.
+    """
+
+    def __init__(self, app, sender: str):
+        self.app = app
+        self.sender = sender  # normalised address, as in reply_check_groups()
+        self.idle_seconds = float(app.config.get("IMAP_IDLE_SECONDS", 600))
+        self.listening = False
+        self.future: Optional[Future] = None
+        self._delay = RETRY_MIN_SECONDS
+
+    # ── Database side (worker threads) ────────────────────────────────────────
+
+    def _prepare(self):
+        from app import db
+        from app.scheduler import InboxCheck, reply_check_groups
+
+        with self.app.app_context():
+            campaign_ids = reply_check_groups(self.sender).get(self.sender)
+            check = InboxCheck.prepare(self.sender, campaign_ids) if campaign_ids else None
+            if db.session.dirty:
+                # A password re-encrypted under the current SECRET_KEY
+                db.session.commit()
+            return check
+
+    def _apply(self, check, scan) -> bool:
+        """Record the scan; False once the sender has nothing left awaiting a reply."""
+        from app import db
+        from app.scheduler import awaiting_reply_senders
+
+        with self.app.app_context():
+            try:
+                check.apply(self.app, scan)
+            except Exception:
+                db.session.rollback()
+                raise
+            return self.sender in awaiting_reply_senders()
+
+    # ── Mail loop side ────────────────────────────────────────────────────────
+
+    async def _catch_up(self, imap, check=None) -> bool:
+        """Fetch and record what arrived above the cursor; False when there is nothing left to listen for."""
+        from app.email_service import scan_mailbox
+
+        if check is None:
+            check = await asyncio.to_thread(self._prepare)
+            if check is None:
+                return False
+        started = time.perf_counter()
+        scan = await scan_mailbox(imap, check.sender_email, cursor=check.cursor, since=check.since)
+        IMAP_SCAN_SECONDS.observe(time.perf_counter() - started, mode="push")
+        return await asyncio.to_thread(self._apply, check, scan)
+
+    async def _session(self) -> bool:
+        """One connection, held until it fails. False when there is nothing to listen for."""
+        from app.email_service import imap_connect
+
+        check = await asyncio.to_thread(self._prepare)
+        if check is None:
+            return False
+        imap = imap_connect()
+        try:
+            await imap.connect()
+            await imap.login(check.sender_email, check.password)
+            if "IDLE" not in await imap.capabilities():
+                raise _IdleUnsupported()
+            await imap.select("INBOX", readonly=True)
+            if not await self._catch_up(imap, check):
+                return False
+            self.listening = True
+            self._delay = RETRY_MIN_SECONDS
+            logger.info("Listening for replies to %s (IMAP IDLE)", self.sender)
+            while True:
+                events = await imap.idle(self.idle_seconds)
+                if any(event.upper().endswith(b" EXISTS") for event in events):
+                    if not await self._catch_up(imap):
+                        await imap.logout()
+                        return False
+        finally:
+            self.listening = False
+            imap.close()
+
+    async def run(self):
+        try:
+            while True:
+                try:
+                    if not await self._session():
+                        logger.info("Stopped listening for replies to %s: nothing awaiting a reply", self.sender)
+                        return
+                except _IdleUnsupported:
+                    with _lock:
+                        _idle_unsupported.add(self.sender)
+                    logger.info("IMAP server for %s does not support IDLE; its replies are polled", self.sender)
+                    return
+                except Exception as exc:
+                    logger.warning("IDLE listener for %s failed (%s); reconnecting in %ds",
+                                   self.sender, exc, self._delay)
+                await asyncio.sleep(self._delay)
+                self._delay = min(self._delay * 2, RETRY_MAX_SECONDS)
+        finally:
+            with _lock:
+                if _listeners.get(self.sender) is self:
+                    del _listeners[self.sender]
+
+
+def is_listening(sender: str) -> bool:
+    """Whether `sender` (normalised) has a listener connected and in IDLE right now."""
+    listener = _listeners.get(sender)
+    return listener is not None and listener.listening
+
+
+def listening_count() -> int:
+    return sum(1 for listener in list(_listeners.values()) if listener.listening)
+
+
+def sync_listeners(app, senders: set[str]):
+    """Start a listener for each of `senders` (normalised) lacking one, and stop the rest."""
+    loop = mail_loop()
+    with _lock:
+        for sender in [s for s in _listeners if s not in senders]:
+            _listeners.pop(sender).future.cancel()
+            logger.info("Stopped listening for replies to %s", sender)
+        for sender in senders - _listeners.keys() - _idle_unsupported:
+            listener = _listeners[sender] = InboxListener(app, sender)
+            listener.future = asyncio.run_coroutine_threadsafe(listener.run(), loop)
+
+
+def stop_listeners():
+    """Stop every listener (they close their connections without waiting for the server)."""
+    sync_listeners(None, set())
@@ -0,0 +1,353 @@
+"""
+jobs.py
+Durable job queue stored in the app database, replacing ad-hoc threads.
+
+Producers enqueue jobs in their own transaction. Worker threads, in the web
+process or in a separate `python run.py --worker`, claim a job under a lease,
+renew the lease while the handler runs, then ack it or nack it for a retry
+with backoff. A worker that dies stops renewing; once its lease expires the
+job is claimed again, so work survives restarts. Handlers must therefore be
+idempotent. The send engine is, because it only picks up contacts still in
+"pending"; a crash can at most resend the few messages that were in flight.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.metrics import JOB_SECONDS, JOBS_TOTAL, timed
+from app.models import Job, insert_ignore
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+HANDLERS: dict[str, Callable] = {}
+
+_running = threading.local()  # lease_lost: Event of the job this worker thread is running
+
+
+class RetryLater(Exception):
+    """Raised by a handler to requeue its job until `run_at` without counting a failed attempt."""
+
+    def __init__(self, run_at: datetime, reason: str = ""):
+        super().__init__(reason)
+        self.run_at = run_at
+
+
+def handler(kind: str):
+    """Register `func(app, payload)` as the handler for jobs of `kind`."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def lease_lost() -> Optional[threading.Event]:
+    """
+    In a handler: an event set once the job's lease is lost, after which
+    another worker may claim and run the same job. Long handlers stop when
+    it is set. None outside a job.
+    """
+    return getattr(_running, "lease_lost", None)
+
+
+# ── Queue operations ──────────────────────────────────────────────────────────
+
+def enqueue(kind: str, payload: Optional[dict] = None, dedupe_key: Optional[str] = None,
+            run_at: Optional[datetime] = None, max_attempts: int = 5) -> bool:
+    """
+    Add a job. With a `dedupe_key`, nothing is added while another job with
+    that key is queued or running. Returns True if a job was added.
+    Joins the caller's transaction; caller commits.
+    """
+    now = datetime.utcnow()
+    row = {
+        "kind": kind,
+        "payload": payload or {},
+        "dedupe_key": dedupe_key,
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": run_at or now,
+        "created_at": now,
+    }
+    statement = insert_ignore(Job.__table__, "dedupe_key") if dedupe_key else Job.__table__.insert()
+    added = db.session.connection().execute(statement, row).rowcount or 0
+    if added:
+        logger.info("Queued %s job %s", kind, dedupe_key or payload or "")
+    return bool(added)
+
+
+def _claimable(now: datetime, kinds: Optional[list[str]]):
+    jobs = Job.__table__
+    clause = or_(
+        and_(jobs.c.status == "queued", jobs.c.run_at <= now),
+        and_(jobs.c.status == "running", jobs.c.lease_expires_at < now),
+    )
+    if kinds:
+        clause = and_(clause, jobs.c.kind.in_(kinds))
+    return clause
+
+
+def claim(worker_id: str, lease_seconds: int, kinds: Optional[list[str]] = None) -> Optional[dict]:
+    """
+    Take the oldest due job (or one whose lease expired) and lease it to
+    `worker_id`. The conditional UPDATE makes the claim atomic even with
+    several worker processes on the same database.
+    """
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    claimable = _claimable(now, kinds)
+    with db.engine.begin() as conn:
+        candidates = conn.execute(
+            select(jobs.c.id).where(claimable).order_by(jobs.c.run_at, jobs.c.id).limit(5)
+        ).scalars().all()
+        for job_id in candidates:
+            claimed = conn.execute(
+                update(jobs).where(jobs.c.id == job_id, claimable).values(
+                    status="running",
+                    locked_by=worker_id,
+                    lease_expires_at=now + timedelta(seconds=lease_seconds),
+                    attempts=jobs.c.attempts + 1,
+                )
+            ).rowcount
+            if claimed:
+                return dict(conn.execute(select(jobs).where(jobs.c.id == job_id)).mappings().one())
+    return None
+
+
+def _finish(job: dict, worker_id: str, **values) -> bool:
+    """Update a job only if `worker_id` still holds its lease."""
+    jobs = Job.__table__
+    with db.engine.begin() as conn:
+        return bool(conn.execute(
+            update(jobs).where(jobs.c.id == job["id"], jobs.c.locked_by == worker_id,
+                               jobs.c.status == "running").values(**values)
+        ).rowcount)
+
+
+def renew(job: dict, worker_id: str, lease_seconds: int) -> bool:
+    """Extend the lease. False means it was lost (expired and claimed elsewhere)."""
+    return _finish(job, worker_id, lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds))
+
+
+def ack(job: dict, worker_id: str) -> bool:
+    return _finish(job, worker_id, status="done", dedupe_key=None, locked_by=None,
+                   lease_expires_at=None, last_error=None, finished_at=datetime.utcnow())
+
+
+def nack(job: dict, worker_id: str, error: str) -> bool:
+    """Requeue with exponential backoff, or mark failed after `max_attempts`. Returns True if requeued."""
+    now = datetime.utcnow()
+    if job["attempts"] >= job["max_attempts"]:
+        _finish(job, worker_id, status="failed", dedupe_key=None, locked_by=None,
+                lease_expires_at=None, last_error=error[:1000], finished_at=now)
+        return False
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1))
+    return _finish(job, worker_id, status="queued", locked_by=None, lease_expires_at=None,
+                   last_error=error[:1000], run_at=now + timedelta(seconds=delay))
+
+
+def release(job: dict, worker_id: str, run_at: datetime, reason: str = "") -> bool:
+    """Requeue for `run_at` without counting the attempt (see RetryLater)."""
+    jobs = Job.__table__
+    return _finish(job, worker_id, status="queued", locked_by=None, lease_expires_at=None,
+                   attempts=jobs.c.attempts - 1, last_error=reason or None, run_at=run_at)
+
+
+def queue_counts() -> dict:
+    """Number of jobs per status."""
+    return dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+
+
+# ── Workers ───────────────────────────────────────────────────────────────────
+
+class Worker(threading.Thread):
+    """Claims and runs jobs until `stop` is set."""
+
+    def __init__(self, app, index: int, stop: threading.Event, kinds: Optional[list[str]] = None):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        super().__init__(name=f"job-worker-{index}", daemon=True)
+        self.app = app
+        self.stop = stop
+        self.kinds = kinds
+        self.lease_seconds = int(app.config.get("JOB_LEASE_SECONDS", 60))
+        self.poll_seconds = float(app.config.get("JOB_POLL_SECONDS", 2.0))
+
+    def run(self):
+        while not self.stop.is_set():
+            try:
+                with self.app.app_context():
+                    job = claim(self.worker_id, self.lease_seconds, self.kinds)
+            except OperationalError as exc:
+                # Another process holds the SQLite write lock; try again on the next poll
+                logger.debug("Job claim skipped: %s", exc)
+                job = None
+            if job is None:
+                self.stop.wait(self.poll_seconds)
+                continue
+            self._process(job)
+
+    def _renew_loop(self, job: dict, done: threading.Event, lost: threading.Event):
+        # Local deadline of the lease, never later than the one in the database: once
+        # it passes without a renewal another worker may claim the job at any moment
+        deadline = time.monotonic() + self.lease_seconds
+        while not done.wait(min(self.lease_seconds / 3, max(0.0, deadline - time.monotonic()))):
+            if time.monotonic() >= deadline:
+                logger.warning("Lease on job %d (%s) expired before it could be renewed", job["id"], job["kind"])
+                lost.set()
+                return
+            renewed_until = time.monotonic() + self.lease_seconds
+            try:
+                with self.app.app_context():
+                    if not renew(job, self.worker_id, self.lease_seconds):
+                        logger.warning("Lost the lease on job %d (%s)", job["id"], job["kind"])
+                        lost.set()
+                        return
+                deadline = renewed_until
+            except OperationalError as exc:
+                logger.debug("Lease renewal for job %d deferred: %s", job["id"], exc)
+
+    def _process(self, job: dict):
+        func = HANDLERS.get(job["kind"])
+        if func is None or job["attempts"] > job["max_attempts"]:
+            error = f"Unknown job kind {job['kind']}" if func is None else "Lease expired too many times"
+            with self.app.app_context():
+                job["attempts"] = job["max_attempts"]
+                nack(job, self.worker_id, error)
+            logger.error("Job %d failed: %s", job["id"], error)
+            return
+
+        logger.info("Job %d (%s) started by %s, attempt %d", job["id"], job["kind"], self.worker_id, job["attempts"])
+        done = threading.Event()
+        _running.lease_lost = threading.Event()
+        renewer = threading.Thread(target=self._renew_loop, args=(job, done, _running.lease_lost), daemon=True)
+        renewer.start()
+        try:
+            with timed(JOB_SECONDS, kind=job["kind"]):
+                func(self.app, job["payload"] or {})
+        except RetryLater as retry:
+            done.set()
+            with self.app.app_context():
+                release(job, self.worker_id, retry.run_at, str(retry))
+            JOBS_TOTAL.inc(kind=job["kind"], outcome="postponed")
+            logger.info("Job %d (%s) postponed until %s: %s", job["id"], job["kind"], retry.run_at, retry)
+        except Exception as exc:
+            done.set()
+            logger.exception("Job %d (%s) failed", job["id"], job["kind"])
+            with self.app.app_context():
+                requeued = nack(job, self.worker_id, f"{type(exc).__name__}: {exc}")
+            JOBS_TOTAL.inc(kind=job["kind"], outcome="retry" if requeued else "failed")
+            if not requeued:
+                logger.error("Job %d (%s) gave up after %d attempts", job["id"], job["kind"], job["attempts"])
+        else:
+            done.set()
+            with self.app.app_context():
+                ack(job, self.worker_id)
+            JOBS_TOTAL.inc(kind=job["kind"], outcome="done")
+            logger.info("Job %d (%s) done", job["id"], job["kind"])
+        renewer.join()
+        _running.lease_lost = None
+
+
+def start_workers(app, count: Optional[int] = None) -> threading.Event:
+    """Resume interrupted campaigns and start `count` worker threads. Set the returned event to stop them."""
+    count = count if count is not None else int(app.config.get("JOB_WORKERS", 2))
+    stop = threading.Event()
+    with app.app_context():
+        resume_campaigns()
+    for index in range(count):
+        Worker(app, index, stop).start()
+    logger.info("Started %d job workers", count)
+    return stop
+
+
+def resume_campaigns() -> int:
+    """Queue a send job for every running campaign that still has contacts to send."""
+    from app.models import Campaign, Contact
+    from app.suppression import suppressed_clause
+
+    resumed = 0
+    pending = select(Contact.id).where(
+        Contact.campaign_id == Campaign.id, Contact.status == "pending", ~suppressed_clause()
+    ).exists()
+    for (campaign_id,) in db.session.query(Campaign.id).filter(Campaign.status == "running", pending):
+        resumed += enqueue_send(campaign_id)
+    db.session.commit()
+    if resumed:
+        logger.info("Resumed %d interrupted campaigns", resumed)
+    return resumed
+
+
+# ── Job kinds ─────────────────────────────────────────────────────────────────
+
+def enqueue_send(campaign_id: int, run_at: Optional[datetime] = None) -> bool:
+    return enqueue("send_campaign", {"campaign_id": campaign_id},
+                   dedupe_key=f"send_campaign:{campaign_id}", run_at=run_at)
+
+
+def enqueue_excel_sync(campaign_id: int) -> bool:
+    return enqueue("excel_sync", {"campaign_id": campaign_id}, dedupe_key=f"excel_sync:{campaign_id}")
+
+
+@handler("send_campaign")
+def _send_campaign(app, payload: dict):
+    from app.models import Campaign, Contact
+    from app.send_engine import SendEngine
+    from app.suppression import suppressed_clause
+
+    campaign_id = payload["campaign_id"]
+    engine = SendEngine(app, campaign_id, lease_lost=lease_lost())
+    engine.run()
+    if engine.retry_at:
+        # Every sender is benched (daily quota, throttling) or contacts were deferred by the
+        # server: come back when the first sender is free or the first retry is due
+        raise RetryLater(engine.retry_at, engine.retry_reason)
+    with app.app_context():
+        # A resume that landed while this run was stopping found the job still
+        # active and queued nothing: pick the remaining contacts up here instead
+        campaign = db.session.get(Campaign, campaign_id)
+        left = db.session.query(Contact.id).filter(
+            Contact.campaign_id == campaign_id, Contact.status == "pending", ~suppressed_clause(),
+            or_(Contact.next_attempt_at.is_(None), Contact.next_attempt_at <= datetime.utcnow()),
+        ).first()
+        if campaign and campaign.status == "running" and left:
+            raise RetryLater(datetime.utcnow(), "Campaña reanudada")
+
+
+@handler("followups")
+def _followups(app, payload: dict):
+    from app.scheduler import send_followups_job
+    send_followups_job(app, payload.get("campaign_id"))
+
+
+@handler("excel_sync")
+def _excel_sync(app, payload: dict):
+    """Rewrite a campaign's managed Excel columns from the database after a failed write-back."""
+    from app.excel_service import ExcelWriteBack
+    from app.models import Campaign, Contact
+
+    with app.app_context():
+        campaign = db.session.get(Campaign, payload["campaign_id"])
+        if not campaign or not campaign.excel_path:
+            return
+        # One save for the whole campaign
+        writeback = ExcelWriteBack(campaign.excel_path, campaign.email_col,
+                                   flush_every=2 ** 31, flush_interval=float("inf"))
+        contacts = Contact.query.filter(
+            Contact.campaign_id == campaign.id, Contact.status != "pending"
+        ).yield_per(1000)
+        for contact in contacts:
+            writeback.queue(contact.email, contact.status, sent_at=contact.email_sent_at,
+                            replied_at=contact.replied_at, followup_sent_at=contact.followup_sent_at)
+        writeback.flush()
+        logger.info("Excel resynced for campaign %d", campaign.id)
@@ -0,0 +1,271 @@
+"""
+metrics.py
+In-process counters, gauges and histograms, exposed in the Prometheus text
+format at /metrics, plus timed() spans that record how long a block took
+and log it at DEBUG. Every metric the app records is declared at the end
+of this module.
+
+Values are per process: with `run.py --web` and `--worker` in separate
+processes, the web process only reports its own requests.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; from a local SMTP round trip up to a full-inbox IMAP scan
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_registry: dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            if name in _registry:
+                raise ValueError(f"Metric {name} is already registered")
+            _registry[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{self._labels(key)} {_number(value)}"
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. With `collect`, values are read at scrape
+    time instead: a callable returning a number, or a {label tuple: number}
+    dict for labelled gauges.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 collect: Optional[Callable] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.collect is None:
+            yield from super()._samples()
+            return
+        try:
+            collected = self.collect()
+        except Exception as exc:
+            logger.warning("Could not collect gauge %s: %s", self.name, exc)
+            return
+        if not isinstance(collected, dict):
+            collected = {(): collected}
+        for key, value in collected.items():
+            yield f"{self.name}{self._labels(tuple(map(str, key)))} {_number(value)}"
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (usually seconds) over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*map(_number, self.buckets), "+Inf"), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{self._labels(key, (('le', bound),))} {cumulative}"
+            yield f"{self.name}_sum{self._labels(key)} {_number(total)}"
+            yield f"{self.name}_count{self._labels(key)} {count}"
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observe how long the block took (also when it raises) and log it as a span at DEBUG."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span %s %s %.1f ms", histogram.name,
+                         " ".join(f"{k}={v}" for k, v in labels.items()), elapsed * 1000)
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(app, port: int, host: str = "127.0.0.1"):
+    """Serve render() on `port` from a daemon thread, for processes without the web app (run.py --worker)."""
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    class _QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    def wsgi(environ, start_response):
+        with app.app_context():
+            body = render().encode()
+        start_response("200 OK", [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))])
+        return [body]
+
+    server = make_server(host, port, wsgi, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Metrics served on http://%s:%d/metrics", host, port)
+    return server
+
+
+def _queue_depth() -> dict:
+    from app.jobs import queue_counts
+    return {(status,): count for status, count in queue_counts().items()}
+
+
+def _send_rates() -> dict:
+    from app.send_engine import send_rates
+    return send_rates()
+
+
+def _idle_listeners() -> int:
+    from app.inbox_listener import listening_count
+    return listening_count()
+
+
+# ── Metrics recorded by the app ──────────────────────────────────────────────
+
+SMTP_CONNECT_SECONDS = Histogram(
+    "email_agent_smtp_connect_seconds", "SMTP connection set-up: TCP, greeting, EHLO and TLS")
+SMTP_LOGIN_SECONDS = Histogram(
+    "email_agent_smtp_login_seconds", "SMTP AUTH round trip")
+SMTP_SEND_SECONDS = Histogram(
+    "email_agent_smtp_send_seconds", "SMTP round trip per message, MAIL FROM to end of DATA")
+EMAILS_TOTAL = Counter(
+    "email_agent_emails_total", "Delivery attempts by kind (initial, followup) and result (sent, refused, deferred, error)",
+    ("kind", "result"))
+SEND_RATE = Gauge(
+    "email_agent_send_rate_per_second", "Current adaptive send rate by sender and purpose (send, followup)",
+    ("sender", "purpose"), collect=_send_rates)
+SENDER_FAILOVERS_TOTAL = Counter(
+    "email_agent_sender_failovers_total",
+    "Sender accounts taken out of rotation by reason (auth, quota, throttled)", ("reason",))
+RENDER_SECONDS = Histogram(
+    "email_agent_render_seconds", "Rendering one contact's subject and bodies", ("kind",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+IMAP_SCAN_SECONDS = Histogram(
+    "email_agent_imap_scan_seconds",
+    "One inbox scan: login to logout when polling (full, incremental), the fetch alone for IDLE (push)", ("mode",))
+IMAP_IDLE_LISTENERS = Gauge(
+    "email_agent_imap_idle_listeners", "Senders with an IMAP IDLE listener connected", collect=_idle_listeners)
+IMAP_FETCH_SECONDS = Histogram(
+    "email_agent_imap_fetch_seconds", "One UID FETCH command", ("item",))
+IMAP_MESSAGES_TOTAL = Counter(
+    "email_agent_imap_messages_fetched_total", "Messages fetched over IMAP", ("item",))
+REPLIES_TOTAL = Counter(
+    "email_agent_replies_total", "Contacts marked as replied")
+BOUNCES_TOTAL = Counter(
+    "email_agent_bounces_total", "Bounced recipients reported by delivery status notifications", ("kind",))
+EXCEL_WRITEBACK_SECONDS = Histogram(
+    "email_agent_excel_writeback_seconds", "One load-update-save of the contacts workbook")
+EXCEL_UPDATES_TOTAL = Counter(
+    "email_agent_excel_updates_total", "Contact updates written to workbooks")
+DB_COMMIT_SECONDS = Histogram(
+    "email_agent_db_commit_seconds", "Session commits, including the flush")
+JOB_SECONDS = Histogram(
+    "email_agent_job_seconds", "Queued job run time", ("kind",))
+JOBS_TOTAL = Counter(
+    "email_agent_jobs_total", "Finished job runs by outcome (done, postponed, retry, failed)", ("kind", "outcome"))
+JOB_QUEUE_DEPTH = Gauge(
+    "email_agent_job_queue_depth", "Jobs in the queue by status", ("status",), collect=_queue_depth)
+SCHEDULER_JOB_SECONDS = Histogram(
+    "email_agent_scheduler_job_seconds", "Periodic scheduler job run time", ("job",))
@@ -0,0 +1,104 @@
+"""
+migrations.py
+Lightweight in-place schema upgrades for existing agent.db files.
+
+Creates missing tables, adds columns and indexes that were introduced after
+a table was first created, then runs the one-off backfill for each newly
+added column or table, and drops indexes the models no longer declare. Only nullable columns without server defaults are
+added, which SQLite supports with a plain ALTER TABLE.
+"""
+import logging
+from datetime import timedelta
+
+from sqlalchemy import DateTime, Integer, bindparam, inspect, text
+
+logger = logging.getLogger(__name__)
+
+
+def _backfill_followup_due_at(conn) -> int:
+    """Due time of the follow-up still owed to every contact that was sent the first email."""
+    rows = conn.execute(text(
+        "SELECT contacts.id, contacts.email_sent_at, campaigns.followup_days FROM contacts "
+        "JOIN campaigns ON campaigns.id = contacts.campaign_id "
+        "WHERE contacts.status = 'sent' AND contacts.email_sent_at IS NOT NULL "
+        "AND campaigns.followup_body_html IS NOT NULL AND campaigns.followup_body_html != ''"
+    ).columns(id=Integer, email_sent_at=DateTime, followup_days=Integer)).all()
+    if rows:
+        conn.execute(
+            text("UPDATE contacts SET followup_due_at = :due WHERE id = :id").bindparams(
+                bindparam("due", type_=DateTime)),
+            [{"id": row.id, "due": row.email_sent_at + timedelta(days=row.followup_days or 3)} for row in rows],
+        )
+    return len(rows)
+
+
+# (table, column) → statement (or function of the connection returning a row
+# count) that fills the column for rows that predate it;
+# (table, None) → statement run once when the table itself is first created
+BACKFILLS = {
+    ("contacts", "email_normalized"):
+        "UPDATE contacts SET email_normalized = lower(trim(email)) WHERE email_normalized IS NULL",
+    ("sent_messages", None):
+        "INSERT INTO sent_messages (message_id, contact_id, campaign_id, kind, sent_at) "
+        "SELECT message_id, id, campaign_id, 'initial', email_sent_at FROM contacts "
+        "WHERE message_id IS NOT NULL",
+    ("contacts", "followup_due_at"): _backfill_followup_due_at,
+    ("sender_accounts", None):
+        "INSERT INTO sender_accounts (campaign_id, email, password_enc, position, status) "
+        "SELECT id, sender_email, sender_password_enc, 0, 'active' FROM campaigns "
+        "WHERE sender_email IS NOT NULL AND sender_password_enc IS NOT NULL",
+    ("contacts", "retry_count"): "UPDATE contacts SET retry_count = 0",
+    ("contacts", "sender_email"):
+        "UPDATE contacts SET sender_email = (SELECT lower(trim(campaigns.sender_email)) FROM campaigns "
+        "WHERE campaigns.id = contacts.campaign_id) WHERE email_sent_at IS NOT NULL",
+}
+
+
+# Indexes no longer declared on the models: dropped so they stop costing a write per update
+OBSOLETE_INDEXES = [
+    "ix_contacts_campaign_status_sent_at",  # superseded by ix_contacts_campaign_status_followup_due_at
+]
+
+
+def _run_backfill(conn, backfill) -> int:
+    if callable(backfill):
+        return backfill(conn)
+    return conn.execute(text(backfill)).rowcount
+
+
+def upgrade_schema(db):
+    """Create missing tables, columns and indexes declared on the models. Safe to run on every start."""
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    db.create_all()
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+                logger.info("Schema upgrade: added %s.%s", table.name, column.name)
+                backfill = BACKFILLS.get((table.name, column.name))
+                if backfill:
+                    logger.info("Schema upgrade: backfilled %s.%s (%d rows)",
+                                table.name, column.name, _run_backfill(conn, backfill))
+
+        if existing_tables:
+            # Only for databases that predate the table; a brand-new database has nothing to backfill
+            for table in db.metadata.sorted_tables:
+                backfill = BACKFILLS.get((table.name, None))
+                if table.name not in existing_tables and backfill:
+                    logger.info("Schema upgrade: backfilled new table %s (%d rows)",
+                                table.name, _run_backfill(conn, backfill))
+
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
@@ -12,8 +12,8 @@ class Campaign(db.Model):
     excel_path = db.Column(db.String(500))
     email_col = db.Column(db.String(100), default="Email")
     name_col = db.Column(db.String(100), default="Nombre")
-    sender_email = db.Column(db.String(200))
-    sender_password_enc = db.Column(db.Text)        # encrypted with Fernet
+    sender_email = db.Column(db.String(200))        # main sender, also the first of `senders`
+    sender_password_enc = db.Column(db.Text)        # legacy: passwords now live in sender_accounts
     subject = db.Column(db.Text)
     body_html = db.Column(db.Text)
     body_text = db.Column(db.Text)
@@ -28,6 +28,8 @@ class Campaign(db.Model):
     started_at = db.Column(db.DateTime)
 
     contacts = db.relationship("Contact", backref="campaign", lazy=True)
+    senders = db.relationship("SenderAccount", backref="campaign", lazy=True,
+                              order_by="SenderAccount.position")
 
     def to_dict(self):
         return {
@@ -42,23 +44,76 @@ class Campaign(db.Model):
         }
 
 
+class SenderAccount(db.Model):
+    """One account in a campaign's sender pool (see app/sender_pool.py)."""
+
+    __tablename__ = "sender_accounts"
+    __table_args__ = (db.Index("ix_sender_accounts_campaign_id", "campaign_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey("campaigns.id"), nullable=False)
+    email = db.Column(db.String(200), nullable=False)
+    password_enc = db.Column(db.Text, nullable=False)   # encrypted with Fernet
+    position = db.Column(db.Integer, nullable=False, default=0)   # 0 is the campaign's main sender
+    # active | auth_failed
+    status = db.Column(db.String(20), nullable=False, default="active")
+    last_error = db.Column(db.Text)
+
+    def to_dict(self):
+        return {"email": self.email, "status": self.status, "last_error": self.last_error}
+
+
+def insert_ignore(table, column: str):
+    """INSERT into `table` that silently skips rows conflicting on the unique `column`."""
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return table.insert().prefix_with("IGNORE")
+    return dialect_insert(table).on_conflict_do_nothing(index_elements=[column])
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form used to compare addresses across campaigns."""
+    return (email or "").strip().lower()
+
+
+def _default_email_normalized(context):
+    return normalize_email(context.get_current_parameters().get("email"))
+
+
 class Contact(db.Model):
     """One contact row from the uploaded Excel."""
 
     __tablename__ = "contacts"
+    __table_args__ = (
+        # Follow-ups due: (campaign_id, status='sent', followup_due_at <= now), oldest first;
+        # the leading columns also serve the send loop's and stats' (campaign_id, status) lookups
+        db.Index("ix_contacts_campaign_status_followup_due_at", "campaign_id", "status", "followup_due_at"),
+        db.Index("ix_contacts_message_id", "message_id"),
+        # Cross-campaign deduplication
+        db.Index("ix_contacts_email_normalized_status", "email_normalized", "status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey("campaigns.id"), nullable=False)
     email = db.Column(db.String(200), nullable=False)
+    email_normalized = db.Column(db.String(200), default=_default_email_normalized)   # lower(trim(email))
     name = db.Column(db.String(200))
     custom_fields = db.Column(db.JSON)   # all extra columns from Excel
     # pending | sent | replied | followup_sent | bounced
     status = db.Column(db.String(20), default="pending")
     send_error = db.Column(db.Text)      # error message if bounced
     message_id = db.Column(db.String(200))   # SMTP Message-ID for reply tracking
+    sender_email = db.Column(db.String(200))   # normalised account that sent the first email
     email_sent_at = db.Column(db.DateTime)
     replied_at = db.Column(db.DateTime)
     followup_sent_at = db.Column(db.DateTime)
+    followup_due_at = db.Column(db.DateTime)   # email_sent_at + followup_days, if the campaign has a follow-up
+    retry_count = db.Column(db.Integer, default=0)   # transient failures of the email now owed (initial or follow-up)
+    next_attempt_at = db.Column(db.DateTime)   # pending contact deferred by a transient failure: not before this
 
     def to_dict(self):
         return {
@@ -72,3 +127,80 @@ class Contact(db.Model):
             "replied_at": self.replied_at.isoformat() if self.replied_at else None,
             "followup_sent_at": self.followup_sent_at.isoformat() if self.followup_sent_at else None,
         }
+
+
+class SentMessage(db.Model):
+    """Message-ID of every email sent to a contact, initial or follow-up, for reply matching."""
+
+    __tablename__ = "sent_messages"
+    __table_args__ = (db.Index("ix_sent_messages_contact_id", "contact_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.String(200), nullable=False, unique=True)
+    contact_id = db.Column(db.Integer, db.ForeignKey("contacts.id"), nullable=False)
+    campaign_id = db.Column(db.Integer, db.ForeignKey("campaigns.id"), nullable=False)
+    # initial | followup
+    kind = db.Column(db.String(20), nullable=False, default="initial")
+    sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Suppression(db.Model):
+    """An address that must never be mailed again (unsubscribe, hard bounce, manual)."""
+
+    __tablename__ = "suppressions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    email_normalized = db.Column(db.String(200), nullable=False, unique=True)
+    # unsubscribe | hard_bounce | manual
+    reason = db.Column(db.String(20), nullable=False, default="manual")
+    detail = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "email": self.email_normalized,
+            "reason": self.reason,
+            "detail": self.detail,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class MailboxState(db.Model):
+    """Incremental IMAP scan position for one sender's mailbox."""
+
+    __tablename__ = "mailbox_states"
+    __table_args__ = (db.UniqueConstraint("sender_email", "mailbox"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    sender_email = db.Column(db.String(200), nullable=False)
+    mailbox = db.Column(db.String(200), nullable=False, default="INBOX")
+    uidvalidity = db.Column(db.BigInteger)     # mailbox UIDVALIDITY the cursor belongs to
+    last_uid = db.Column(db.BigInteger, default=0)   # highest UID already scanned
+    checked_at = db.Column(db.DateTime)
+
+
+class Job(db.Model):
+    """A unit of background work in the durable queue (see app/jobs.py)."""
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Claim query: oldest due job among queued ones / expired leases
+        db.Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)      # send_campaign | followups | excel_sync
+    payload = db.Column(db.JSON)
+    # Set while the job is queued or running, cleared once it finishes, so at
+    # most one active job exists per key (e.g. one send job per campaign)
+    dedupe_key = db.Column(db.String(200), unique=True)
+    # queued | running | done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)   # not claimable before
+    locked_by = db.Column(db.String(100))                 # worker holding the lease
+    lease_expires_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
@@ -3,20 +3,30 @@ routes.py
 HTTP endpoints for the Email Agent web app.
 """
 import logging
-import smtplib
+from collections import Counter
 from datetime import datetime
 
-from flask import Blueprint, render_template, request, jsonify, session
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, session
+from sqlalchemy import func, insert, or_
 
 from app import db
-from app.models import Campaign, Contact
-from app.excel_service import save_upload, read_columns, read_contacts, update_contact_status
-from app.email_service import send_email, render_template as render_tmpl, test_credentials
-from app.crypto import encrypt, decrypt
+from app.models import Campaign, Contact, SenderAccount, Suppression, normalize_email
+from app.excel_service import REJECTION_LABELS, save_upload, read_columns, iter_contact_chunks
+from app.email_service import test_credentials
+from app.templating import TemplateError, compile_template
+from app.events import bus, iter_sse, publish_campaign
+from app.jobs import enqueue_send, queue_counts
+from app.suppression import SUPPRESSION_REASONS, remove_excluded_contacts, suppress, unsuppress
+from app.crypto import encrypt, forget_campaign_passwords
+from app import metrics
 
 logger = logging.getLogger(__name__)
 main = Blueprint("main", __name__)
 
+TEMPLATE_FIELDS = ("subject", "body_html", "body_text",
+                   "followup_subject", "followup_body_html", "followup_body_text")
+CONTACT_STATUSES = ("pending", "sent", "replied", "followup_sent", "bounced")
+
 
 # ── Pages ──────────────────────────────────────────────────────────────────────
 
@@ -42,7 +52,7 @@ def dashboard():
 
 @main.route("/api/upload", methods=["POST"])
 def api_upload():
-    """Upload Excel file. Returns detected column headers."""
+    """Upload Excel/CSV file. Returns detected column headers."""
     if "file" not in request.files:
         return jsonify({"error": "No se ha enviado ningún archivo"}), 400
 
@@ -77,7 +87,11 @@ def api_test_credentials():
 
 @main.route("/api/configure", methods=["POST"])
 def api_configure():
-    """Save campaign configuration (credentials, templates, follow-up settings)."""
+    """
+    Save campaign configuration (credentials, templates, follow-up settings).
+    Optional "extra_senders": [{"sender_email", "app_password"}, ...] adds
+    accounts to the campaign's sender pool after the main one.
+    """
     data = request.get_json()
 
     required = ["sender_email", "app_password", "subject", "excel_path", "name_col", "email_col"]
@@ -85,8 +99,35 @@ def api_configure():
         if not data.get(field):
             return jsonify({"error": f"Campo requerido: {field}"}), 400
 
-    # Deactivate any existing campaign
-    Campaign.query.filter(Campaign.status.in_(["draft", "running", "paused"])).update({"status": "archived"})
+    senders = {normalize_email(data["sender_email"]): (data["sender_email"].strip(), data["app_password"])}
+    for extra in data.get("extra_senders") or []:
+        email = (extra.get("sender_email") or "").strip()
+        password = (extra.get("app_password") or "").strip()
+        if not email or not password:
+            return jsonify({"error": "Cada remitente adicional necesita email y App Password"}), 400
+        senders.setdefault(normalize_email(email), (email, password))
+
+    # Parse every template up front so syntax errors and unknown variables surface now
+    try:
+        templates = [compile_template(data.get(field) or "") for field in TEMPLATE_FIELDS]
+    except TemplateError as exc:
+        return jsonify({"error": str(exc)}), 400
+    try:
+        available = read_columns(data["excel_path"]) + ["nombre", data["name_col"]]
+    except Exception:
+        logger.warning("Could not read columns of %s to check template variables", data["excel_path"])
+        available = None
+    warnings = []
+    if available is not None:
+        unknown = []
+        for template in templates:
+            unknown += [name for name in template.unknown(available) if name not in unknown]
+        if unknown:
+            warnings.append("Variables sin columna en el Excel (se enviarán tal cual): "
+                            + ", ".join("{{" + name + "}}" for name in unknown))
+
+    # Replace any draft that was never launched; running campaigns keep going alongside the new one
+    Campaign.query.filter(Campaign.status == "draft").update({"status": "archived"})
     db.session.flush()
 
     campaign = Campaign(
@@ -94,8 +135,7 @@ def api_configure():
         excel_path=data["excel_path"],
         email_col=data["email_col"],
         name_col=data["name_col"],
-        sender_email=data["sender_email"],
-        sender_password_enc=encrypt(data["app_password"]),
+        sender_email=data["sender_email"].strip(),
         subject=data["subject"],
         body_html=data.get("body_html", ""),
         body_text=data.get("body_text", ""),
@@ -107,164 +147,93 @@ def api_configure():
         created_at=datetime.utcnow(),
     )
     db.session.add(campaign)
+    db.session.flush()
+    for position, (email, password) in enumerate(senders.values()):
+        db.session.add(SenderAccount(campaign_id=campaign.id, email=email, password_enc=encrypt(password),
+                                     position=position))
     db.session.commit()
-    return jsonify({"campaign_id": campaign.id})
+    return jsonify({"campaign_id": campaign.id, "warnings": warnings})
 
 
 @main.route("/api/launch", methods=["POST"])
 def api_launch():
-    """Load contacts from Excel and start sending emails."""
-    campaign = Campaign.query.filter_by(status="draft").order_by(Campaign.id.desc()).first()
+    """Load contacts from Excel and start sending emails. Body: {"campaign_id"} (default: latest draft)."""
+    data = request.get_json(silent=True) or {}
+    query = Campaign.query.filter_by(status="draft")
+    if data.get("campaign_id"):
+        query = query.filter_by(id=data["campaign_id"])
+    campaign = query.order_by(Campaign.id.desc()).first()
     if not campaign:
         return jsonify({"error": "No hay campaña configurada. Vuelve al paso 2."}), 400
 
+    # Delete previous contacts for this campaign
+    Contact.query.filter_by(campaign_id=campaign.id).delete()
+
+    # Stream the file in fixed-size chunks and bulk-insert every contact
+    chunk_size = current_app.config.get("IMPORT_CHUNK_SIZE", 1000)
+    engine = current_app.config.get("IMPORT_ENGINE", "python")
+    read = 0
+    rejected = Counter()
     try:
-        contacts_data = read_contacts(campaign.excel_path, campaign.name_col, campaign.email_col)
+        for chunk in iter_contact_chunks(campaign.excel_path, campaign.name_col, campaign.email_col, chunk_size,
+                                         rejected=rejected, engine=engine):
+            db.session.execute(insert(Contact), [
+                {
+                    "campaign_id": campaign.id,
+                    "email": c["email"],
+                    "email_normalized": c["email_normalized"],
+                    "name": c["name"],
+                    "custom_fields": c["custom_fields"],
+                    "status": "pending",
+                }
+                for c in chunk
+            ])
+            read += len(chunk)
+            logger.info("Import campaign %d: %d contacts loaded", campaign.id, read)
+        if rejected:
+            logger.info("Import campaign %d: rows skipped %s", campaign.id, dict(rejected))
     except Exception as exc:
+        db.session.rollback()
         logger.exception("Error reading Excel")
         return jsonify({"error": f"Error leyendo el Excel: {exc}"}), 500
 
-    if not contacts_data:
+    if not read:
+        db.session.rollback()
         return jsonify({"error": "No se encontraron contactos válidos en el Excel. Comprueba que las columnas Nombre y Email están correctamente mapeadas."}), 400
 
-    # Deduplication: find emails already sent in ANY previous campaign
-    already_sent = set(
-        row[0] for row in db.session.query(Contact.email).filter(
-            Contact.status.in_(["sent", "replied", "followup_sent"])
-        ).all()
-    )
-
-    new_contacts = [c for c in contacts_data if c["email"].lower() not in {e.lower() for e in already_sent}]
-    skipped = len(contacts_data) - len(new_contacts)
-
-    if not new_contacts:
-        return jsonify({"error": f"Todos los contactos del Excel ya recibieron un email en campañas anteriores ({skipped} omitidos)."}), 400
+    # Deduplication against ANY previous campaign and the suppression list, done in SQL
+    suppressed, already_sent = remove_excluded_contacts(campaign.id)
+    skipped = suppressed + already_sent
+    imported = read - skipped
+    if not imported:
+        db.session.rollback()
+        return jsonify({"error": f"Todos los contactos del Excel ya recibieron un email en campañas anteriores o están en la lista de exclusión ({skipped} omitidos)."}), 400
 
-    # Delete previous contacts for this campaign
-    Contact.query.filter_by(campaign_id=campaign.id).delete()
-
-    # Insert only NEW contacts
-    contacts_objs = [
-        Contact(
-            campaign_id=campaign.id,
-            email=c["email"],
-            name=c["name"],
-            custom_fields=c["custom_fields"],
-            status="pending",
-        )
-        for c in new_contacts
-    ]
-    db.session.add_all(contacts_objs)
     campaign.status = "running"
     campaign.started_at = datetime.utcnow()
+    # Queued in the same transaction: the campaign never ends up running without its send job
+    enqueue_send(campaign.id)
     db.session.commit()
+    publish_campaign(campaign)
 
-    msg = f"Campaña iniciada. Enviando emails a {len(new_contacts)} contactos."
-    if skipped:
-        msg += f" ({skipped} omitidos por ya haber recibido email anteriormente.)"
-
-    # Pass the current app instance to the thread (do NOT create a new one)
-    from flask import current_app
-    import threading
-    app = current_app._get_current_object()
-    thread = threading.Thread(target=_send_campaign_emails, args=[campaign.id, app], daemon=False)
-    thread.start()
-
-    return jsonify({"message": msg})
-
-
-def _send_campaign_emails(campaign_id: int, app):
-    """Background thread: send all pending emails for a campaign."""
-    with app.app_context():
-        campaign = db.session.get(Campaign, campaign_id)
-        if not campaign:
-            logger.error("Campaign %d not found in send thread", campaign_id)
-            return
-
-        try:
-            password = decrypt(campaign.sender_password_enc)
-        except Exception as exc:
-            logger.error("Decrypt error in send thread: %s", exc)
-            return
-
-        contacts = Contact.query.filter_by(campaign_id=campaign_id, status="pending").all()
-        logger.info("Starting email send: %d contacts for campaign %d", len(contacts), campaign_id)
-
-        auth_failed = False
-
-        for contact in contacts:
-            # Re-query campaign status to detect pause
-            db.session.expire(campaign)
-            if campaign.status == "paused":
-                logger.info("Campaign paused, stopping send loop.")
-                break
-
-            # Build template variables — support both "nombre" and the original column name
-            variables = {
-                "nombre": contact.name,
-                campaign.name_col: contact.name,   # e.g. {{Nombre}} also works
-                **(contact.custom_fields or {}),
-            }
-            subject  = render_tmpl(campaign.subject, variables)
-            body_html = render_tmpl(campaign.body_html or "", variables)
-            body_text = render_tmpl(campaign.body_text or "", variables)
-
-            now = datetime.utcnow()
-            try:
-                message_id = send_email(
-                    campaign.sender_email, password,
-                    contact.email, subject, body_html, body_text,
-                )
-                if message_id:
-                    contact.status = "sent"
-                    contact.message_id = message_id
-                    contact.email_sent_at = now
-                    contact.send_error = None
-                    logger.info("✓ Sent to %s", contact.email)
-                else:
-                    contact.status = "bounced"
-                    contact.send_error = "Email rechazado por el servidor"
-                    logger.warning("Bounced: %s", contact.email)
-            except smtplib.SMTPAuthenticationError as exc:
-                error_msg = "Error de autenticación Gmail. Comprueba el email y la App Password."
-                contact.status = "bounced"
-                contact.send_error = error_msg
-                logger.error("Auth failed for %s: %s", contact.email, exc)
-                # Auth failure affects all contacts — mark rest as bounced and stop
-                auth_failed = True
-                campaign.last_error = error_msg
-                campaign.status = "error"
-                db.session.commit()
-                for remaining in Contact.query.filter_by(campaign_id=campaign_id, status="pending").all():
-                    remaining.status = "bounced"
-                    remaining.send_error = error_msg
-                db.session.commit()
-                break
-            except Exception as exc:
-                contact.status = "bounced"
-                contact.send_error = str(exc)[:200]
-                logger.error("Send failed for %s: %s", contact.email, exc)
-
-            db.session.commit()
-
-            try:
-                update_contact_status(
-                    campaign.excel_path, contact.email, contact.status,
-                    email_col=campaign.email_col,
-                    sent_at=now if contact.status == "sent" else None,
-                )
-            except Exception as exc:
-                logger.warning("Excel update error for %s: %s", contact.email, exc)
-
-        if not auth_failed:
-            campaign.status = "running"
-            db.session.commit()
-        logger.info("Email send loop finished for campaign %d", campaign_id)
+    msg = f"Campaña iniciada. Enviando emails a {imported} contactos."
+    if already_sent:
+        msg += f" ({already_sent} omitidos por ya haber recibido email anteriormente.)"
+    if suppressed:
+        msg += f" ({suppressed} omitidos por estar en la lista de exclusión.)"
+    if rejected:
+        msg += f" ({sum(rejected.values())} filas descartadas: " + ", ".join(
+            f"{rejected[reason]} {label}" for reason, label in REJECTION_LABELS.items() if rejected[reason]) + ".)"
 
+    return jsonify({"message": msg, "campaign_id": campaign.id, "imported": imported, "skipped": skipped, "rejected": dict(rejected)})
+
+
+def _dashboard_campaign():
+    """Campaign shown on the dashboard: ?campaign_id=, else the latest active one, else the latest draft."""
+    campaign_id = request.args.get("campaign_id", type=int)
+    if campaign_id:
+        return db.session.get(Campaign, campaign_id)
 
-@main.route("/api/status", methods=["GET"])
-def api_status():
-    """Return current campaign status and all contacts."""
     campaign = Campaign.query.filter(
         Campaign.status.in_(["running", "paused", "completed"])
     ).order_by(Campaign.id.desc()).first()
@@ -272,50 +241,178 @@ def api_status():
     if not campaign:
         # Also check for draft (configured but not launched)
         campaign = Campaign.query.filter_by(status="draft").order_by(Campaign.id.desc()).first()
+    return campaign
+
+
+def _campaign_stats(campaign_id: int) -> dict:
+    """Contact counts per status, computed by the database in one GROUP BY."""
+    counts = dict(
+        db.session.query(Contact.status, func.count(Contact.id))
+        .filter(Contact.campaign_id == campaign_id)
+        .group_by(Contact.status)
+        .all()
+    )
+    stats = {status: counts.get(status, 0) for status in CONTACT_STATUSES}
+    stats["total"] = sum(counts.values())
+    return stats
+
+
+@main.route("/api/campaigns", methods=["GET"])
+def api_campaigns():
+    """Every campaign that is not archived, newest first, with its sender accounts, for the dashboard selector."""
+    campaigns = Campaign.query.filter(Campaign.status != "archived").order_by(Campaign.id.desc()).all()
+    return jsonify({"campaigns": [
+        dict(c.to_dict(), senders=[s.to_dict() for s in c.senders]) for c in campaigns
+    ]})
+
 
+@main.route("/api/status", methods=["GET"])
+def api_status():
+    """Return current campaign status and per-status contact counts."""
+    campaign = _dashboard_campaign()
     if not campaign:
-        return jsonify({"campaign": None, "contacts": []})
-
-    contacts = Contact.query.filter_by(campaign_id=campaign.id).all()
-    stats = {
-        "total": len(contacts),
-        "pending": sum(1 for c in contacts if c.status == "pending"),
-        "sent": sum(1 for c in contacts if c.status == "sent"),
-        "replied": sum(1 for c in contacts if c.status == "replied"),
-        "followup_sent": sum(1 for c in contacts if c.status == "followup_sent"),
-        "bounced": sum(1 for c in contacts if c.status == "bounced"),
-    }
+        return jsonify({"campaign": None, "stats": None})
 
     return jsonify({
         "campaign": campaign.to_dict(),
-        "stats": stats,
+        "stats": _campaign_stats(campaign.id),
+    })
+
+
+@main.route("/api/contacts", methods=["GET"])
+def api_contacts():
+    """
+    One page of the campaign's contacts, keyset-paginated by id.
+    Query args: campaign_id, status, q (email/name search), after (last id seen),
+    order (asc|desc), limit (max 500).
+    """
+    campaign = _dashboard_campaign()
+    if not campaign:
+        return jsonify({"contacts": [], "next_after": None})
+
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 500)
+    descending = request.args.get("order", "asc") == "desc"
+    after = request.args.get("after", type=int)
+    status = request.args.get("status")
+    q = (request.args.get("q") or "").strip()
+
+    query = Contact.query.filter(Contact.campaign_id == campaign.id)
+    if status in CONTACT_STATUSES:
+        query = query.filter(Contact.status == status)
+    if q:
+        pattern = f"%{q}%"
+        query = query.filter(or_(Contact.email.ilike(pattern), Contact.name.ilike(pattern)))
+    if after is not None:
+        query = query.filter(Contact.id < after if descending else Contact.id > after)
+    query = query.order_by(Contact.id.desc() if descending else Contact.id.asc())
+
+    # Fetch one extra row to know whether another page exists
+    contacts = query.limit(limit + 1).all()
+    has_more = len(contacts) > limit
+    contacts = contacts[:limit]
+    return jsonify({
         "contacts": [c.to_dict() for c in contacts],
+        "next_after": contacts[-1].id if has_more else None,
+    })
+
+
+@main.route("/api/events", methods=["GET"])
+def api_events():
+    """
+    Server-Sent Events stream of dashboard deltas: `contact`, `stats` and
+    `campaign` events, optionally limited to ?campaign_id=. A `resync` event
+    tells the client to reload from /api/status and /api/contacts.
+    """
+    campaign_id = request.args.get("campaign_id", type=int)
+    heartbeat = current_app.config.get("SSE_HEARTBEAT_SECONDS", 15)
+    return Response(iter_sse(bus.subscribe(campaign_id), heartbeat), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
     })
 
 
 @main.route("/api/pause", methods=["POST"])
 def api_pause():
-    """Pause or resume the active campaign."""
-    campaign = Campaign.query.filter(
-        Campaign.status.in_(["running", "paused"])
-    ).order_by(Campaign.id.desc()).first()
+    """Pause or resume a campaign: {"campaign_id"} (default: the latest active one)."""
+    campaign_id = (request.get_json(silent=True) or {}).get("campaign_id")
+    query = Campaign.query.filter(Campaign.status.in_(["running", "paused"]))
+    if campaign_id:
+        query = query.filter(Campaign.id == campaign_id)
+    campaign = query.order_by(Campaign.id.desc()).first()
 
     if not campaign:
         return jsonify({"error": "No hay campaña activa"}), 404
 
     campaign.status = "paused" if campaign.status == "running" else "running"
+    if campaign.status == "running":
+        # Resuming: queue the send job again to pick up the remaining contacts
+        enqueue_send(campaign.id)
     db.session.commit()
+    publish_campaign(campaign)
     return jsonify({"status": campaign.status})
 
 
 @main.route("/api/reset", methods=["POST"])
 def api_reset():
-    """Archive current campaign and return to step 1."""
-    Campaign.query.filter(Campaign.status != "archived").update({"status": "archived"})
+    """Archive one campaign ({"campaign_id"}) or, without it, every campaign."""
+    campaign_id = (request.get_json(silent=True) or {}).get("campaign_id")
+    query = Campaign.query.filter(Campaign.status != "archived")
+    if campaign_id:
+        query = query.filter(Campaign.id == campaign_id)
+    campaigns = query.all()
+    for campaign in campaigns:
+        campaign.status = "archived"
     db.session.commit()
+    for campaign in campaigns:
+        forget_campaign_passwords(campaign)
+        publish_campaign(campaign)
     return jsonify({"message": "Campaña archivada. Puedes iniciar una nueva."})
 
 
+@main.route("/api/suppressions", methods=["GET"])
+def api_suppressions():
+    """Size of the suppression list, per reason."""
+    counts = dict(
+        db.session.query(Suppression.reason, func.count(Suppression.id)).group_by(Suppression.reason).all()
+    )
+    return jsonify({"total": sum(counts.values()), "by_reason": counts})
+
+
+@main.route("/api/suppressions", methods=["POST"])
+def api_add_suppressions():
+    """Add addresses to the suppression list: {"emails": [...], "reason": "unsubscribe"}."""
+    data = request.get_json() or {}
+    emails = data.get("emails") or []
+    reason = data.get("reason", "manual")
+    if not isinstance(emails, list) or not emails:
+        return jsonify({"error": "Lista de emails requerida"}), 400
+    if reason not in SUPPRESSION_REASONS:
+        return jsonify({"error": f"Motivo no válido: {reason}"}), 400
+
+    added = suppress(emails, reason=reason, detail=data.get("detail"))
+    db.session.commit()
+    return jsonify({"added": added})
+
+
+@main.route("/api/suppressions", methods=["DELETE"])
+def api_remove_suppressions():
+    """Remove addresses from the suppression list: {"emails": [...]}."""
+    data = request.get_json() or {}
+    emails = data.get("emails") or []
+    if not isinstance(emails, list) or not emails:
+        return jsonify({"error": "Lista de emails requerida"}), 400
+
+    removed = unsuppress(emails)
+    db.session.commit()
+    return jsonify({"removed": removed})
+
+
+@main.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """This process's metrics in the Prometheus text format."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
 @main.route("/api/debug", methods=["GET"])
 def api_debug():
     """Debug endpoint: shows DB state, last campaign and contacts."""
@@ -331,5 +428,5 @@ def api_debug():
             "contacts_count": len(contacts),
             "contacts_preview": [{"email": x.email, "name": x.name, "status": x.status} for x in contacts[:5]],
         })
-    return jsonify(result)
+    return jsonify({"campaigns": result, "jobs": queue_counts()})
 
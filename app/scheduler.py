@@ -1,142 +1,536 @@
 """
 scheduler.py
 APScheduler jobs:
-  - check_replies_job: polls Gmail IMAP every 30 min for replies
-  - send_followups_job: daily job that sends follow-ups to non-responders
+  - check_replies_job: polls Gmail IMAP every 30 min for replies and
+    bounces for all active campaigns, one IMAP session per sender, all
+    senders scanned concurrently on the asyncio mail loop (aiomail.py).
+    Senders with a live IMAP IDLE listener (inbox_listener.py) are skipped
+  - sync_listeners_job: every minute, starts an IDLE listener for each
+    sender awaiting replies and stops those no longer needed
+  - enqueue_followups_job: every few minutes, queues a send_followups_job
+    (see app/jobs.py) for each campaign whose non-responders are due a
+    follow-up, so it shares the workers with campaign sends
 """
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import func, select, update
+
+from app.metrics import BOUNCES_TOTAL, RENDER_SECONDS, REPLIES_TOTAL, SCHEDULER_JOB_SECONDS, timed
 
 logger = logging.getLogger(__name__)
 scheduler = BackgroundScheduler(timezone="UTC")
 
+# Contacts whose replies are still being looked for
+AWAITING_REPLY = ("sent", "followup_sent")
+# Message-IDs / contact ids per IN (...) when matching replies
+MATCH_CHUNK = 500
+
 
+@timed(SCHEDULER_JOB_SECONDS, job="check_replies")
 def check_replies_job(app):
-    """Check Gmail inbox for replies to sent emails and update contact status."""
+    """
+    Check Gmail for replies and bounce notifications for every active
+    campaign. Campaigns sharing a sender are checked in one IMAP session
+    (they also share its mailbox cursor). The IMAP sessions of different
+    senders run concurrently on the mail loop, up to REPLY_CHECK_WORKERS
+    at a time; the database work before and after them stays on this thread.
+    Senders whose IDLE listener is connected are left to it.
+    """
     with app.app_context():
         from app import db
-        from app.models import Campaign, Contact
-        from app.email_service import check_replies
-        from app.excel_service import update_contact_status
-        from app.crypto import decrypt
+        from app.aiomail import run_sync
+        from app.inbox_listener import is_listening
 
-        campaign = Campaign.query.filter_by(status="running").first()
-        if not campaign:
+        checks = []
+        for sender, campaign_ids in reply_check_groups().items():
+            if is_listening(sender):
+                continue
+            check = InboxCheck.prepare(sender, campaign_ids)
+            if check:
+                checks.append(check)
+        if not checks:
             return
+        limit = max(1, app.config.get("REPLY_CHECK_WORKERS", 20))
+        scans = run_sync(_scan_inboxes(checks, limit))
+        for check, scan in zip(checks, scans):
+            if isinstance(scan, BaseException):
+                logger.error("check_replies_job error for %s: %s", check.sender_email, scan)
+                continue
+            try:
+                check.apply(app, scan)
+            except Exception:
+                logger.exception("Reply check failed for %s", check.sender_email)
+                db.session.rollback()
+
+
+def reply_check_groups(sender: Optional[str] = None) -> dict[str, list[int]]:
+    """
+    Running and paused campaigns by the normalised address of each of their
+    sender accounts, newest first (only `sender`'s, if given). Needs an app context.
+    """
+    from app import db
+    from app.models import Campaign, SenderAccount
+
+    groups: dict[str, list[int]] = {}
+    query = db.session.query(SenderAccount.email, SenderAccount.campaign_id).join(
+        Campaign, Campaign.id == SenderAccount.campaign_id,
+    ).filter(Campaign.status.in_(["running", "paused"]))
+    if sender is not None:
+        query = query.filter(func.lower(func.trim(SenderAccount.email)) == sender)
+    for email, campaign_id in query.order_by(SenderAccount.campaign_id.desc()):
+        groups.setdefault(email.strip().lower(), []).append(campaign_id)
+    return groups
+
+
+def awaiting_reply_senders() -> set[str]:
+    """
+    Normalised sender accounts of running and paused campaigns that sent
+    contacts now awaiting a reply. Needs an app context.
+    """
+    from app import db
+    from app.models import Campaign, Contact, SenderAccount
+
+    awaiting = db.session.query(Contact.id).filter(
+        Contact.campaign_id == SenderAccount.campaign_id, Contact.status.in_(AWAITING_REPLY),
+        Contact.sender_email == func.lower(func.trim(SenderAccount.email)),
+    ).exists()
+    senders = db.session.query(SenderAccount.email).join(
+        Campaign, Campaign.id == SenderAccount.campaign_id,
+    ).filter(Campaign.status.in_(["running", "paused"]), awaiting).distinct()
+    return {sender.strip().lower() for (sender,) in senders if sender.strip()}
 
-        contacts = Contact.query.filter_by(
-            campaign_id=campaign.id, status="sent"
+
+async def _scan_inboxes(checks: list["InboxCheck"], limit: int) -> list:
+    """Run every check's IMAP scan, at most `limit` at once; failures are returned, not raised."""
+    from app.email_service import scan_inbox_async
+
+    gate = asyncio.Semaphore(limit)
+
+    async def scan(check: InboxCheck):
+        async with gate:
+            return await scan_inbox_async(check.sender_email, check.password, cursor=check.cursor, since=check.since)
+
+    return await asyncio.gather(*(scan(check) for check in checks), return_exceptions=True)
+
+
+def _mark_replied(refs: list[str], campaign_ids: list[int], now: datetime) -> list[tuple]:
+    """
+    Match Message-IDs referenced by new mail against sent_messages (initial
+    emails and follow-ups) and flag those contacts as replied with bulk
+    UPDATEs. Returns (contact, previous_status) pairs. Caller commits.
+    """
+    from app import db
+    from app.models import Contact, SentMessage
+
+    contact_ids = set()
+    for i in range(0, len(refs), MATCH_CHUNK):
+        contact_ids.update(db.session.scalars(
+            select(SentMessage.contact_id).where(
+                SentMessage.message_id.in_(refs[i:i + MATCH_CHUNK]),
+                SentMessage.campaign_id.in_(campaign_ids),
+            )
+        ))
+
+    changes = []
+    contact_ids = list(contact_ids)
+    for i in range(0, len(contact_ids), MATCH_CHUNK):
+        contacts = Contact.query.filter(
+            Contact.id.in_(contact_ids[i:i + MATCH_CHUNK]), Contact.status.in_(AWAITING_REPLY)
         ).all()
         if not contacts:
-            return
+            continue
+        changes += [(contact, contact.status) for contact in contacts]
+        db.session.execute(
+            update(Contact).where(Contact.id.in_([c.id for c in contacts])).values(status="replied", replied_at=now)
+        )
+    return changes
 
-        message_ids = [c.message_id for c in contacts if c.message_id]
-        if not message_ids:
-            return
 
-        try:
-            password = decrypt(campaign.sender_password_enc)
-            replied_ids = check_replies(campaign.sender_email, password, message_ids)
-        except Exception as exc:
-            logger.error("check_replies_job error: %s", exc)
-            return
+def _apply_bounces(bounces: list, campaign_ids: list[int]) -> list[tuple]:
+    """
+    Record bounce notifications on the contacts they belong to, matched by
+    the bounced Message-ID or else by recipient address. Hard bounces mark
+    the contact bounced and suppress the address; soft ones only note the
+    error. Returns (contact, previous_status) pairs. Caller commits.
+    """
+    from app import db
+    from app.bounces import HARD, Bounce
+    from app.models import Contact, SentMessage, normalize_email
+    from app.suppression import suppress
+
+    by_message_id = {b.original_message_id: b for b in bounces if b.original_message_id}
+    by_email = {normalize_email(b.recipient): b for b in bounces}
+    matched: dict[int, Bounce] = {}
+
+    ids = list(by_message_id)
+    for i in range(0, len(ids), MATCH_CHUNK):
+        rows = db.session.execute(
+            select(SentMessage.message_id, SentMessage.contact_id).where(
+                SentMessage.message_id.in_(ids[i:i + MATCH_CHUNK]),
+                SentMessage.campaign_id.in_(campaign_ids),
+            )
+        )
+        for message_id, contact_id in rows:
+            matched[contact_id] = by_message_id[message_id]
+
+    contacts: dict[int, Contact] = {}
+    for column, values in ((Contact.id, list(matched)), (Contact.email_normalized, list(by_email))):
+        for i in range(0, len(values), MATCH_CHUNK):
+            for contact in Contact.query.filter(
+                Contact.campaign_id.in_(campaign_ids),
+                Contact.status.in_(AWAITING_REPLY),
+                column.in_(values[i:i + MATCH_CHUNK]),
+            ):
+                contacts[contact.id] = contact
+
+    changes, rows, hard = [], [], []
+    for contact in contacts.values():
+        bounce = matched.get(contact.id) or by_email[contact.email_normalized]
+        status = "bounced" if bounce.kind == HARD else contact.status
+        rows.append({"id": contact.id, "status": status, "send_error": bounce.describe()})
+        changes.append((contact, contact.status))
+        if bounce.kind == HARD:
+            hard.append(contact.email)
+
+    if rows:
+        db.session.execute(update(Contact), rows)
+        for contact in contacts.values():
+            db.session.expire(contact)
+        suppress(hard, reason="hard_bounce", detail="DSN")
+        logger.info("Bounces recorded: %d hard, %d soft", len(hard), len(rows) - len(hard))
+    return changes
+
+
+def _mailbox_state(sender: str):
+    """
+    INBOX cursor of a normalised sender address. Rows saved under the raw
+    address (any case or spacing) are found too; the one already keyed on
+    the normalised address wins. Needs an app context.
+    """
+    from app.models import MailboxState
+
+    return MailboxState.query.filter(
+        func.lower(func.trim(MailboxState.sender_email)) == sender, MailboxState.mailbox == "INBOX",
+    ).order_by((MailboxState.sender_email == sender).desc(), MailboxState.last_uid.desc()).first()
+
+
+class InboxCheck:
+    """
+    One sender account's reply check: prepare() works out its campaigns,
+    mailbox cursor and password (None when there is nothing to look for), the IMAP
+    scan runs elsewhere, and apply() records what it found. Only ids are
+    kept, so prepare() and apply() may run in different app contexts.
+    """
+
+    def __init__(self, campaign_ids: list[int], sender_email: str, password: str, cursor, since):
+        self.campaign_ids = campaign_ids
+        self.sender_email = sender_email
+        self.key = sender_email.strip().lower()     # MailboxState.sender_email
+        self.password = password
+        self.cursor = cursor
+        self.since = since
+
+    @classmethod
+    def prepare(cls, sender: str, campaign_ids: list[int]) -> Optional["InboxCheck"]:
+        """
+        `sender` (normalised) is an account of every campaign in
+        `campaign_ids`, newest first. Needs an app context.
+        """
+        from app import db
+        from app.models import Contact, SenderAccount, SentMessage
+        from app.email_service import MailboxCursor
+        from app.crypto import account_password
+
+        accounts = SenderAccount.query.filter(
+            SenderAccount.campaign_id.in_(campaign_ids), func.lower(func.trim(SenderAccount.email)) == sender,
+        ).order_by(SenderAccount.campaign_id.desc()).all()
+        if not accounts:
+            return None
+        sender_email = accounts[0].email
+
+        awaiting = db.session.query(Contact.id).filter(
+            Contact.campaign_id.in_(campaign_ids), Contact.status.in_(AWAITING_REPLY),
+            Contact.sender_email == sender,
+        ).first()
+        if not awaiting:
+            return None
+
+        for account in accounts:
+            try:
+                password = account_password(account)
+                break
+            except Exception as exc:
+                logger.warning("Decrypt failed for sender %s of campaign %d: %s",
+                               account.email, account.campaign_id, exc)
+        else:
+            return None
+
+        state = _mailbox_state(sender)
+        # Replies cannot predate the first send, so a full rescan never needs older mail
+        first_sent = db.session.query(func.min(SentMessage.sent_at)).filter(
+            SentMessage.campaign_id.in_(campaign_ids)
+        ).scalar()
+
+        return cls(
+            campaign_ids, sender_email, password,
+            MailboxCursor(state.uidvalidity, state.last_uid) if state else MailboxCursor(),
+            first_sent.date() if first_sent else None,
+        )
+
+    def apply(self, app, scan):
+        """
+        Advance the mailbox cursor and record the replies and bounces of
+        `scan`, then publish them. Needs an app context.
+        """
+        from app import db
+        from app.models import Campaign, MailboxState
+        from app.excel_service import campaign_writeback
+        from app.events import publish_contact_changes
+        from app.jobs import enqueue_excel_sync
+
+        campaign_ids = self.campaign_ids
+        state = _mailbox_state(self.key)
+        if state is None:
+            state = MailboxState(sender_email=self.key, mailbox="INBOX", last_uid=0)
+            db.session.add(state)
+        elif state.sender_email != self.key:
+            # Saved under the raw address before it was normalised
+            state.sender_email = self.key
+        # Never move the cursor back: a concurrent scan may have got further
+        if state.uidvalidity == self.cursor.uidvalidity and (state.last_uid or 0) > self.cursor.last_uid:
+            self.cursor.last_uid = state.last_uid
+        state.uidvalidity = self.cursor.uidvalidity
+        state.last_uid = self.cursor.last_uid
+        state.checked_at = datetime.utcnow()
 
         now = datetime.utcnow()
-        for contact in contacts:
-            if contact.message_id in replied_ids:
-                contact.status = "replied"
-                contact.replied_at = now
-                try:
-                    update_contact_status(
-                        campaign.excel_path,
-                        contact.email,
-                        "replied",
-                        email_col=_get_email_col(campaign),
-                        replied_at=now,
-                    )
-                except Exception as exc:
-                    logger.warning("Excel update failed for %s: %s", contact.email, exc)
+        changes: dict[int, list] = {}
+        bounced = _apply_bounces(scan.bounces, campaign_ids) if scan.bounces else []
+        replied = _mark_replied(list(scan.references), campaign_ids, now)
+        for contact, previous in bounced + replied:
+            changes.setdefault(contact.campaign_id, []).append((contact, previous))
 
         db.session.commit()
-        logger.info("Reply check done. %d replies found.", len(replied_ids))
+        REPLIES_TOTAL.inc(len(replied))
+        for bounce in scan.bounces:
+            BOUNCES_TOTAL.inc(kind=bounce.kind)
+        for campaign_id, changed in changes.items():
+            campaign = db.session.get(Campaign, campaign_id)
+            publish_contact_changes(campaign.id, changed)
+            writeback = campaign_writeback(campaign, app.config)
+            for contact, _ in changed:
+                writeback.queue(contact.email, contact.status, replied_at=contact.replied_at)
+            try:
+                writeback.flush()
+            except Exception as exc:
+                logger.warning("Excel update failed for %d replies: %s", len(writeback), exc)
+                enqueue_excel_sync(campaign.id)
+                db.session.commit()
+        logger.info("Reply check done for %s (%d campaigns). %d replies, %d bounces found.",
+                    self.sender_email, len(campaign_ids), len(replied), len(bounced))
 
 
-def send_followups_job(app):
-    """Send follow-up emails to contacts who haven't replied after N days."""
+def send_followups_job(app, campaign_id: Optional[int] = None):
+    """
+    Send a campaign's due follow-ups (followup_due_at <= now, still no
+    reply) in batches of FOLLOWUP_BATCH_SIZE, committing each batch before
+    taking the next, so a crash re-sends at most one batch. Each follow-up
+    goes out from the account that sent the contact's first email, paced by
+    that account's own bucket (FOLLOWUP_RATE_PER_SECOND) and counted against
+    its daily limit. Contacts of an account that is benched or disabled wait
+    for a later run. A send the server defers is retried up to
+    SEND_MAX_RETRIES times, backing off exponentially from
+    FOLLOWUP_RETRY_SECONDS; a permanent failure drops the follow-up.
+    Without `campaign_id`, every running campaign is processed in turn.
+    """
+    if campaign_id is None:
+        with app.app_context():
+            from app.models import Campaign
+            campaign_ids = [cid for (cid,) in Campaign.query.filter_by(status="running").with_entities(Campaign.id)]
+        for cid in campaign_ids:
+            send_followups_job(app, cid)
+        return
+
     with app.app_context():
         from app import db
-        from app.models import Campaign, Contact
-        from app.email_service import send_email, render_template
-        from app.excel_service import update_contact_status
-        from app.crypto import decrypt
+        from app.models import Campaign, Contact, SentMessage, normalize_email
+        from app.email_service import TRANSIENT, SMTPSession, classify_smtp_error, send_email
+        from app.send_engine import retry_delay
+        from app.templating import CampaignTemplates, contact_variables
+        from app.excel_service import campaign_writeback
+        from app.events import publish_contact_changes
+        from app.sender_pool import SenderPool
+        from app.suppression import suppress, suppressed_clause
+        from app.jobs import enqueue_excel_sync
 
-        campaign = Campaign.query.filter_by(status="running").first()
-        if not campaign or not campaign.followup_body_html:
+        campaign = db.session.get(Campaign, campaign_id)
+        if not campaign or campaign.status != "running" or not campaign.followup_body_html:
             return
 
-        cutoff = datetime.utcnow() - timedelta(days=campaign.followup_days)
-        contacts = Contact.query.filter(
-            Contact.campaign_id == campaign.id,
-            Contact.status == "sent",
-            Contact.email_sent_at <= cutoff,
-        ).all()
+        pool = SenderPool.load(campaign, app.config, purpose="followup")
+        if db.session.dirty:
+            # Passwords re-encrypted under the current SECRET_KEY
+            db.session.commit()
 
-        if not contacts:
-            return
+        sessions: dict[str, SMTPSession] = {}
+        writeback = campaign_writeback(campaign, app.config)
+        templates = CampaignTemplates(campaign, followup=True)
+        batch_size = max(1, int(app.config.get("FOLLOWUP_BATCH_SIZE", 20)))
+        retry_base = float(app.config.get("FOLLOWUP_RETRY_SECONDS", 3600))
+        max_retries = int(app.config.get("SEND_MAX_RETRIES", 5))
+        # Contacts sent before sender pools existed have no sender_email: they belong to the main sender
+        main_sender = normalize_email(campaign.sender_email)
+        # Senders whose follow-ups wait for a later run (benched, disabled or not in the pool)
+        waiting: set[str] = set()
+        sent = 0
+        try:
+            while True:
+                query = Contact.query.filter(
+                    Contact.campaign_id == campaign.id,
+                    Contact.status == "sent",
+                    Contact.followup_due_at <= datetime.utcnow(),
+                    ~suppressed_clause(),
+                )
+                if waiting:
+                    # NOT IN is NULL for a NULL sender_email: compare the main sender instead
+                    query = query.filter(db.func.coalesce(Contact.sender_email, main_sender).notin_(waiting))
+                batch = query.order_by(Contact.followup_due_at).limit(batch_size).all()
+                if not batch:
+                    break
+
+                changed = []
+                for contact in batch:
+                    sender_key = contact.sender_email or main_sender
+                    if sender_key in waiting:
+                        continue
+                    sender = pool.get(sender_key)
+                    if sender is None or not sender.available():
+                        waiting.add(sender_key)
+                        continue
+                    with timed(RENDER_SECONDS, kind="followup"):
+                        subject, body_html, body_text = templates.render(contact_variables(campaign, contact))
+                    smtp = sessions.get(sender.key)
+                    if smtp is None:
+                        smtp = sessions[sender.key] = SMTPSession(
+                            sender.email, sender.password,
+                            max_messages=app.config.get("SMTP_RECYCLE_AFTER", 100),
+                        )
+
+                    try:
+                        sender.budget.charge()
+                        sender.limiter.acquire(key=campaign.id)
+                        msg_id = send_email(
+                            sender.email,
+                            sender.password,
+                            contact.email,
+                            subject,
+                            body_html,
+                            body_text,
+                            reply_to_message_id=contact.message_id,
+                            session=smtp,
+                        )
+                    except Exception as exc:
+                        if pool.failover(sender, exc):
+                            # Quota, throttling or auth: this sender's follow-ups wait for a later run
+                            waiting.add(sender.key)
+                            continue
+                        contact.send_error = str(exc)[:200]
+                        if classify_smtp_error(exc) == TRANSIENT and (contact.retry_count or 0) < max_retries:
+                            contact.retry_count = (contact.retry_count or 0) + 1
+                            contact.followup_due_at = datetime.utcnow() + timedelta(
+                                seconds=retry_delay(contact.retry_count, retry_base))
+                            logger.warning("Follow-up to %s deferred (attempt %d of %d): %s",
+                                           contact.email, contact.retry_count, max_retries, exc)
+                        else:
+                            contact.followup_due_at = None
+                            logger.error("Follow-up send failed for %s, not retrying: %s", contact.email, exc)
+                        continue
+                    if msg_id:
+                        pool.succeeded(sender)
+                        sender.pacer.observe(smtp.last_latency)
+                        now = datetime.utcnow()
+                        contact.status = "followup_sent"
+                        contact.followup_sent_at = now
+                        # Replies to the follow-up quote its own Message-ID, not the original's
+                        db.session.add(SentMessage(message_id=msg_id, contact_id=contact.id,
+                                                   campaign_id=campaign.id, kind="followup", sent_at=now))
+                        sent += 1
+                    else:
+                        contact.status = "bounced"
+                        contact.send_error = "Email rechazado por el servidor"
+                        suppress([contact.email], reason="hard_bounce", detail=contact.send_error)
+                    changed.append((contact.email, contact.status, contact.followup_sent_at))
+
+                db.session.commit()
+                publish_contact_changes(campaign.id, [(c, "sent") for c in batch if c.status != "sent"])
+                for email, status, followup_sent_at in changed:
+                    writeback.queue(email, status, followup_sent_at=followup_sent_at)
+                # A pause or archive takes effect between batches (the commit expired the campaign)
+                if campaign.status != "running":
+                    break
+        finally:
+            for smtp in sessions.values():
+                smtp.close()
 
         try:
-            password = decrypt(campaign.sender_password_enc)
+            writeback.flush()
         except Exception as exc:
-            logger.error("Decrypt failed in send_followups_job: %s", exc)
-            return
+            logger.warning("Excel update failed for %d follow-ups: %s", len(writeback), exc)
+            enqueue_excel_sync(campaign.id)
+            db.session.commit()
+        if waiting:
+            logger.warning("Follow-ups of campaign %d from %s wait for a later run.",
+                           campaign.id, ", ".join(sorted(waiting)))
+        connects = sum(smtp.connects for smtp in sessions.values())
+        busy = sum(smtp.total_send_time for smtp in sessions.values())
+        logger.info("Follow-up job done for campaign %d. %d follow-ups sent (%d SMTP connections, avg %.0f ms/message).",
+                    campaign.id, sent, connects, busy / sent * 1000 if sent else 0)
 
-        now = datetime.utcnow()
-        for contact in contacts:
-            variables = {"nombre": contact.name, **(contact.custom_fields or {})}
-            subject = render_template(campaign.followup_subject or "", variables)
-            body_html = render_template(campaign.followup_body_html or "", variables)
-            body_text = render_template(campaign.followup_body_text or "", variables)
 
-            try:
-                send_email(
-                    campaign.sender_email,
-                    password,
-                    contact.email,
-                    subject,
-                    body_html,
-                    body_text,
-                    reply_to_message_id=contact.message_id,
-                )
-                contact.status = "followup_sent"
-                contact.followup_sent_at = now
-                try:
-                    update_contact_status(
-                        campaign.excel_path,
-                        contact.email,
-                        "followup_sent",
-                        email_col=_get_email_col(campaign),
-                        followup_sent_at=now,
-                    )
-                except Exception as exc:
-                    logger.warning("Excel update failed for %s: %s", contact.email, exc)
-            except Exception as exc:
-                logger.error("Follow-up send failed for %s: %s", contact.email, exc)
+@timed(SCHEDULER_JOB_SECONDS, job="enqueue_followups")
+def enqueue_followups_job(app):
+    """
+    Queue a follow-up job for every running campaign with follow-ups due,
+    found through the followup_due_at index. Runs every few minutes, so
+    follow-ups go out spread like the initial sends instead of in one daily
+    burst; a job already waiting or in progress absorbs a new one.
+    """
+    with app.app_context():
+        from app import db
+        from app.models import Campaign, Contact
+        from app.jobs import enqueue
 
+        due = db.session.query(Contact.id).filter(
+            Contact.campaign_id == Campaign.id,
+            Contact.status == "sent",
+            Contact.followup_due_at <= datetime.utcnow(),
+        ).exists()
+        campaigns = Campaign.query.filter(
+            Campaign.status == "running", Campaign.followup_body_html.isnot(None),
+            Campaign.followup_body_html != "", due,
+        ).with_entities(Campaign.id)
+        for (campaign_id,) in campaigns:
+            enqueue("followups", {"campaign_id": campaign_id}, dedupe_key=f"followups:{campaign_id}")
         db.session.commit()
-        logger.info("Follow-up job done. %d follow-ups sent.", len(contacts))
 
 
-def _get_email_col(campaign) -> str:
-    """Return the email column name stored in the campaign, defaulting to 'Email'."""
-    return getattr(campaign, "email_col", None) or "Email"
+@timed(SCHEDULER_JOB_SECONDS, job="sync_listeners")
+def sync_listeners_job(app):
+    """Keep one IMAP IDLE listener per sender with contacts awaiting a reply (see inbox_listener.py)."""
+    with app.app_context():
+        from app.inbox_listener import sync_listeners
+
+        sync_listeners(app, awaiting_reply_senders())
 
 
 def start_scheduler(app):
     """Initialize and start the background scheduler with the Flask app context."""
     interval_check = app.config.get("REPLY_CHECK_INTERVAL", 1800)
-    interval_followup = app.config.get("FOLLOWUP_CHECK_INTERVAL", 86400)
+    interval_followup = app.config.get("FOLLOWUP_CHECK_INTERVAL", 300)
 
     scheduler.add_job(
         func=check_replies_job,
@@ -148,7 +542,7 @@ def start_scheduler(app):
     )
 
     scheduler.add_job(
-        func=send_followups_job,
+        func=enqueue_followups_job,
         args=[app],
         trigger="interval",
         seconds=interval_followup,
@@ -156,7 +550,18 @@ def start_scheduler(app):
         replace_existing=True,
     )
 
+    if app.config.get("IMAP_IDLE_ENABLED", True):
+        scheduler.add_job(
+            func=sync_listeners_job,
+            args=[app],
+            trigger="interval",
+            seconds=app.config.get("IMAP_IDLE_SYNC_INTERVAL", 60),
+            next_run_time=datetime.now(timezone.utc),
+            id="sync_listeners",
+            replace_existing=True,
+        )
+
     if not scheduler.running:
         scheduler.start()
-        logger.info("Scheduler started (reply check every %ds, follow-up every %ds)",
+        logger.info("Scheduler started (reply check every %ds, due follow-ups every %ds)",
                     interval_check, interval_followup)
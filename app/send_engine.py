@@ -0,0 +1,581 @@
+"""
+send_engine.py
+Concurrent campaign sender: a pool of SMTP workers paced by a shared
+token bucket per sender account instead of a fixed sleep between messages.
+Each bucket's rate adapts (AIMD) to how fast the server answers and to its
+throttling replies. A message the server defers (4xx, dropped connection)
+is retried later with exponential backoff; only permanent refusals bounce.
+
+Only the network round trip runs on the worker threads. Rendering, DB writes
+and Excel updates stay on the thread that drives the campaign, so the
+SQLAlchemy session is never shared between threads. Contact results are
+committed in batches (SEND_COMMIT_EVERY contacts or SEND_COMMIT_SECONDS,
+whichever comes first) rather than one transaction per email; a crash
+loses at most one batch, whose contacts are still pending and are picked
+up again when the campaign resumes.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.email_service import TRANSIENT, SMTPSession, classify_smtp_error, send_email
+from app.metrics import RENDER_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+
+class DailyQuotaExceeded(Exception):
+    """Raised when a sender has used up its messages/day budget."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts of up to
+    `burst` tokens, and an optional hard cap of `daily_limit` tokens per
+    UTC day.
+
+    Callers pass a `key` (the campaign id) to acquire(); while several keys
+    are waiting, tokens go to the least recently served one, so campaigns
+    sharing a sender split its rate and daily budget evenly regardless of
+    how many threads each one has waiting.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, daily_limit: Optional[int] = None):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.daily_limit = daily_limit
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._day = datetime.utcnow().date()
+        self.used_today = 0
+        self._cond = threading.Condition()
+        self._waiting: dict = {}        # key → threads currently waiting
+        self._last_served: dict = {}    # key → serial of its last token
+        self._serial = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        today = datetime.utcnow().date()
+        if today != self._day:
+            self._day = today
+            self.used_today = 0
+
+    def _turn(self):
+        """Waiting key served least recently (never-served keys first)."""
+        return min(self._waiting, key=lambda k: self._last_served.get(k, -1))
+
+    def charge(self, count: int = 1):
+        """
+        Count messages paced by another bucket against this one's daily cap.
+        Raises DailyQuotaExceeded when the cap has been reached.
+        """
+        with self._cond:
+            self._refill()
+            if self.daily_limit is not None and self.used_today + count > self.daily_limit:
+                raise DailyQuotaExceeded(f"Límite diario de {self.daily_limit} emails alcanzado")
+            self.used_today += count
+
+    def set_rate(self, rate: float):
+        """Change the refill rate; waiting threads pick it up immediately."""
+        with self._cond:
+            self._refill()
+            self.rate = float(rate)
+            self._cond.notify_all()
+
+    def acquire(self, stop: Optional[threading.Event] = None, key=None) -> bool:
+        """
+        Block until a token is available for `key` and take it.
+        Returns False if `stop` was set while waiting.
+        Raises DailyQuotaExceeded when the daily cap has been reached.
+        """
+        with self._cond:
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+            taken = False
+            try:
+                while True:
+                    if stop is not None and stop.is_set():
+                        return False
+                    self._refill()
+                    if self.daily_limit is not None and self.used_today >= self.daily_limit:
+                        raise DailyQuotaExceeded(
+                            f"Límite diario de {self.daily_limit} emails alcanzado"
+                        )
+                    if self._tokens >= 1 and self._turn() == key:
+                        self._tokens -= 1
+                        self.used_today += 1
+                        self._serial += 1
+                        self._last_served[key] = self._serial
+                        taken = True
+                        return True
+                    if self._tokens >= 1 or self.rate <= 0:
+                        # Another key's turn: it takes the token and notifies us
+                        wait_for = 1.0
+                    else:
+                        wait_for = (1 - self._tokens) / self.rate
+                    self._cond.wait(timeout=min(wait_for, 1.0))
+            finally:
+                self._waiting[key] -= 1
+                if not self._waiting[key]:
+                    del self._waiting[key]
+                if taken or not self._waiting.get(key):
+                    # The turn may have passed to a key whose threads are asleep
+                    self._cond.notify_all()
+
+
+_limiters: dict[tuple, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(sender_email: str, config, purpose: str = "send") -> TokenBucket:
+    """
+    Return the process-wide token bucket for a sender, creating it on first use.
+    purpose="followup" gives follow-ups their own pace (FOLLOWUP_RATE_PER_SECOND,
+    no daily cap of its own: charge() the "send" bucket for that).
+    """
+    key = (sender_email.lower(), purpose)
+    with _limiters_lock:
+        bucket = _limiters.get(key)
+        if bucket is None:
+            if purpose == "followup":
+                bucket = TokenBucket(rate=config.get("FOLLOWUP_RATE_PER_SECOND", 0.5))
+            else:
+                bucket = TokenBucket(
+                    rate=config.get("SEND_RATE_PER_SECOND", 2.0),
+                    burst=config.get("SEND_BURST", 1),
+                    daily_limit=config.get("SEND_DAILY_LIMIT") or None,
+                )
+            _limiters[key] = bucket
+        return bucket
+
+
+# AIMD pacing: rate added after a good window, factor applied on congestion or throttling
+RATE_STEP = 0.1
+RATE_BACKOFF = 0.5
+
+
+def retry_delay(attempt: int, base: float, maximum: Optional[float] = None) -> float:
+    """
+    Seconds before the `attempt`-th retry: exponential backoff with "equal
+    jitter" (half fixed, half random), so messages deferred together do not
+    all come back at the same moment.
+    """
+    delay = base * 2 ** (max(1, attempt) - 1)
+    if maximum is not None:
+        delay = min(delay, maximum)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class AdaptiveRate:
+    """
+    AIMD pacing of one token bucket. Results are judged in windows of about
+    a second of sending (`rate` results): if most sends in a window took
+    longer than `target_latency`, the rate is multiplied by RATE_BACKOFF,
+    otherwise it grows by RATE_STEP. A throttling reply cuts it at once. The
+    rate stays within [minimum, maximum].
+    """
+
+    def __init__(self, bucket: TokenBucket, minimum: float, maximum: float, target_latency: float,
+                 name: str = ""):
+        self.bucket = bucket
+        self.name = name
+        self.minimum = min(float(minimum), bucket.rate)
+        self.maximum = max(float(maximum), bucket.rate)
+        self.target_latency = float(target_latency)
+        self._results = 0
+        self._slow = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def _set(self, rate: float):
+        rate = min(self.maximum, max(self.minimum, rate))
+        if rate != self.bucket.rate:
+            self.bucket.set_rate(rate)
+        self._results = self._slow = 0
+
+    def observe(self, latency: Optional[float]):
+        """Record a successful send and how long it took."""
+        with self._lock:
+            self._results += 1
+            if latency is not None and latency > self.target_latency:
+                self._slow += 1
+            if self._results < max(1.0, self.bucket.rate):
+                return
+            if self._slow * 2 > self._results:
+                self._set(self.bucket.rate * RATE_BACKOFF)
+            else:
+                self._set(self.bucket.rate + RATE_STEP)
+
+    def throttled(self):
+        """The server asked the account to slow down."""
+        with self._lock:
+            self._set(self.bucket.rate * RATE_BACKOFF)
+            logger.info("Send rate of %s lowered to %.2f msg/s", self.name, self.bucket.rate)
+
+
+_pacers: dict[tuple, AdaptiveRate] = {}
+
+
+def get_pacer(sender_email: str, config, purpose: str = "send") -> AdaptiveRate:
+    """
+    Return the process-wide AIMD controller of a sender's token bucket
+    (get_rate_limiter), creating it on first use. It starts at the
+    bucket's configured rate and moves between SEND_RATE_MIN_PER_SECOND and
+    SEND_RATE_MAX_PER_SECOND.
+    """
+    bucket = get_rate_limiter(sender_email, config, purpose)
+    key = (sender_email.lower(), purpose)
+    with _limiters_lock:
+        pacer = _pacers.get(key)
+        if pacer is None:
+            pacer = _pacers[key] = AdaptiveRate(
+                bucket,
+                minimum=config.get("SEND_RATE_MIN_PER_SECOND", 0.2),
+                maximum=config.get("SEND_RATE_MAX_PER_SECOND", 4.0),
+                target_latency=config.get("SEND_LATENCY_TARGET_SECONDS", 2.0),
+                name=f"{key[0]} ({purpose})",
+            )
+        return pacer
+
+
+def send_rates() -> dict:
+    """Current rate of every paced bucket, by (sender, purpose)."""
+    return {key: pacer.rate for key, pacer in list(_pacers.items())}
+
+
+class _Outcome:
+    """Result of one delivery attempt, handed back from a worker thread."""
+
+    __slots__ = ("contact_id", "sender", "message_id", "error", "sent_at", "latency", "skipped", "benched")
+
+    def __init__(self, contact_id: int, sender):
+        self.contact_id = contact_id
+        self.sender = sender            # sender_pool.PoolMember that made the attempt
+        self.message_id: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.sent_at: Optional[datetime] = None
+        self.latency: Optional[float] = None
+        self.skipped = False            # stopped before sending
+        self.benched = False            # the account was benched while this waited for a token
+
+
+class SendEngine:
+    """
+    Sends every pending contact of one campaign through `SEND_WORKERS`
+    threads, spread over the campaign's sender pool (sender_pool.py). Each
+    thread holds one SMTP session per account and each account is paced by
+    its own token bucket. A contact whose account fails it (auth, quota,
+    throttling) goes back in the queue for another account; one the server
+    defers waits until its next_attempt_at. Stops cleanly on pause, or once
+    no account can send; `retry_at` then says when to run again.
+    """
+
+    def __init__(self, app, campaign_id: int, lease_lost: Optional[threading.Event] = None):
+        self.app = app
+        self.campaign_id = campaign_id
+        self.workers = max(1, int(app.config.get("SEND_WORKERS", 4)))
+        self._stop = threading.Event()
+        # Set when the job running this engine loses its lease: another worker may be sending
+        self._lease_lost = lease_lost or threading.Event()
+        self._local = threading.local()
+        self._sessions: list[SMTPSession] = []
+        self._sessions_lock = threading.Lock()
+        self.retry_at: Optional[datetime] = None
+        self.retry_reason = ""
+
+    # ── Worker side ───────────────────────────────────────────────────────────
+
+    def _session(self, sender) -> SMTPSession:
+        sessions = getattr(self._local, "sessions", None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        smtp = sessions.get(sender.key)
+        if smtp is None:
+            smtp = sessions[sender.key] = SMTPSession(
+                sender.email, sender.password,
+                max_messages=self.app.config.get("SMTP_RECYCLE_AFTER", 100),
+            )
+            with self._sessions_lock:
+                self._sessions.append(smtp)
+        return smtp
+
+    def _deliver(self, sender, contact_id: int, recipient: str,
+                 subject: str, body_html: str, body_text: str) -> _Outcome:
+        outcome = _Outcome(contact_id, sender)
+        try:
+            if not sender.limiter.acquire(self._stop, key=self.campaign_id) or self._lease_lost.is_set():
+                outcome.skipped = True
+                return outcome
+            if not sender.available():
+                outcome.benched = True
+                return outcome
+            smtp = self._session(sender)
+            outcome.sent_at = datetime.utcnow()
+            outcome.message_id = send_email(
+                sender.email, sender.password, recipient, subject, body_html, body_text,
+                session=smtp,
+            )
+            outcome.latency = smtp.last_latency
+        except BaseException as exc:
+            outcome.error = exc
+        return outcome
+
+    # ── Coordinator side ──────────────────────────────────────────────────────
+
+    def _schedule_deferred(self, Contact):
+        """Bring `retry_at` forward to the first deferred contact's next attempt, if that is sooner."""
+        from app import db
+
+        next_attempt = db.session.query(db.func.min(Contact.next_attempt_at)).filter(
+            Contact.campaign_id == self.campaign_id,
+            Contact.status == "pending",
+            Contact.next_attempt_at > datetime.utcnow(),
+        ).scalar()
+        if next_attempt is not None and (self.retry_at is None or next_attempt < self.retry_at):
+            self.retry_at = next_attempt
+            self.retry_reason = "Reintentos pendientes"
+
+    def run(self):
+        from sqlalchemy import or_
+
+        from app import db
+        from app.templating import CampaignTemplates, contact_variables
+        from app.events import publish_campaign, publish_contact_changes
+        from app.excel_service import campaign_writeback
+        from app.jobs import enqueue_excel_sync
+        from app.models import Campaign, Contact, SentMessage
+        from app.sender_pool import AUTH_ERROR, NO_SENDER_ERROR, SenderPool
+        from app.suppression import suppress, suppressed_clause
+
+        with self.app.app_context():
+            # This loop is the only writer of the contacts it loads; keeping them loaded across
+            # batch commits avoids one SELECT per contact (the campaign is expired explicitly)
+            db.session().expire_on_commit = False
+            campaign = db.session.get(Campaign, self.campaign_id)
+            if not campaign:
+                logger.error("Campaign %d not found in send engine", self.campaign_id)
+                return
+
+            pool = SenderPool.load(campaign, self.app.config)
+            if db.session.dirty:
+                # Passwords re-encrypted under the current key; save them before the pause checks expire the rows
+                db.session.commit()
+            if not pool:
+                # Every account failed auth or its password does not decrypt: stop the campaign
+                # (contacts stay pending) instead of leaving it "running" for the job to retry forever
+                logger.error("Campaign %d has no sender account to send from", self.campaign_id)
+                campaign.status = "error"
+                campaign.last_error = NO_SENDER_ERROR
+                db.session.commit()
+                publish_campaign(campaign)
+                return
+
+            contacts = Contact.query.filter(
+                Contact.campaign_id == self.campaign_id,
+                Contact.status == "pending",
+                or_(Contact.next_attempt_at.is_(None), Contact.next_attempt_at <= datetime.utcnow()),
+                ~suppressed_clause(),
+            ).all()
+            logger.info("Starting email send: %d contacts for campaign %d (%d workers, %d senders)",
+                        len(contacts), self.campaign_id, self.workers, len(pool))
+
+            templates = CampaignTemplates(campaign)
+            if contacts:
+                unknown = templates.unknown(contact_variables(campaign, contacts[0]))
+                if unknown:
+                    logger.warning("Campaign %d templates use unknown variables: %s",
+                                   self.campaign_id, ", ".join(unknown))
+
+            writeback = campaign_writeback(campaign, self.app.config)
+            by_id = {c.id: c for c in contacts}
+            queue = deque(contacts)
+            auth_failed = False
+            in_flight = set()
+            commit_every = max(1, int(self.app.config.get("SEND_COMMIT_EVERY", 25)))
+            commit_seconds = float(self.app.config.get("SEND_COMMIT_SECONDS", 2.0))
+            max_retries = int(self.app.config.get("SEND_MAX_RETRIES", 5))
+            retry_base = float(self.app.config.get("SEND_RETRY_BASE_SECONDS", 60))
+            retry_max = float(self.app.config.get("SEND_RETRY_MAX_SECONDS", 3600))
+            uncommitted = []  # (contact, sent_at) handled since the last commit
+            last_commit = time.monotonic()
+
+            def commit_batch():
+                """Commit handled contacts in one transaction, then publish them and queue their Excel rows."""
+                nonlocal last_commit
+                last_commit = time.monotonic()
+                if not uncommitted:
+                    return
+                db.session.commit()
+                publish_contact_changes(campaign.id, [(contact, "pending") for contact, _ in uncommitted])
+                for contact, sent_at in uncommitted:
+                    writeback.queue(
+                        contact.email, contact.status,
+                        sent_at=sent_at if contact.status == "sent" else None,
+                    )
+                uncommitted.clear()
+
+            def handle(outcome: _Outcome):
+                nonlocal auth_failed
+                contact = by_id[outcome.contact_id]
+                exc = outcome.error
+                if outcome.skipped or (auth_failed and (exc is not None or outcome.benched)):
+                    # Once every account failed auth, unsent contacts are bounced below; deliveries
+                    # that were in flight still fall through and are recorded
+                    return
+                if outcome.benched or (exc is not None and pool.failover(outcome.sender, exc)):
+                    # The account, not the contact, failed: another account sends it
+                    queue.appendleft(contact)
+                    if not pool.usable():
+                        # Every account failed authentication: stop and mark the rest as bounced
+                        auth_failed = True
+                        self._stop.set()
+                        campaign.last_error = AUTH_ERROR
+                        campaign.status = "error"
+                        commit_batch()
+                        db.session.commit()
+                        publish_campaign(campaign)
+                    return
+                if exc is not None and classify_smtp_error(exc) == TRANSIENT \
+                        and (contact.retry_count or 0) < max_retries:
+                    # Deferred by the server: still pending, sent again once next_attempt_at has passed
+                    contact.retry_count = (contact.retry_count or 0) + 1
+                    contact.next_attempt_at = datetime.utcnow() + timedelta(
+                        seconds=retry_delay(contact.retry_count, retry_base, retry_max))
+                    contact.send_error = str(exc)[:200]
+                    logger.warning("Send to %s deferred (attempt %d of %d), retrying at %s UTC: %s",
+                                   contact.email, contact.retry_count, max_retries,
+                                   contact.next_attempt_at.strftime("%H:%M:%S"), exc)
+                elif exc is not None:
+                    contact.status = "bounced"
+                    contact.send_error = str(exc)[:200]
+                    logger.error("Send failed for %s: %s", contact.email, exc)
+                elif outcome.message_id:
+                    pool.succeeded(outcome.sender)
+                    outcome.sender.pacer.observe(outcome.latency)
+                    contact.status = "sent"
+                    contact.message_id = outcome.message_id
+                    contact.sender_email = outcome.sender.key
+                    contact.email_sent_at = outcome.sent_at
+                    contact.send_error = None
+                    contact.retry_count = 0
+                    contact.next_attempt_at = None
+                    if campaign.followup_body_html:
+                        contact.followup_due_at = outcome.sent_at + timedelta(days=campaign.followup_days or 3)
+                    db.session.add(SentMessage(message_id=outcome.message_id, contact_id=contact.id,
+                                               campaign_id=campaign.id, kind="initial", sent_at=outcome.sent_at))
+                    logger.info("✓ Sent to %s from %s (%.0f ms)", contact.email, outcome.sender.email,
+                                (outcome.latency or 0) * 1000)
+                else:
+                    contact.status = "bounced"
+                    contact.send_error = "Email rechazado por el servidor"
+                    logger.warning("Bounced: %s", contact.email)
+                    # The server refused the recipient outright: never mail it again
+                    suppress([contact.email], reason="hard_bounce", detail=contact.send_error)
+
+                uncommitted.append((contact, outcome.sent_at))
+                if len(uncommitted) >= commit_every or time.monotonic() - last_commit >= commit_seconds:
+                    commit_batch()
+
+            def drain(return_when):
+                nonlocal in_flight
+                done, in_flight = wait(in_flight, return_when=return_when)
+                for future in done:
+                    handle(future.result())
+
+            started = time.monotonic()
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="send") as pool_threads:
+                    while queue or in_flight:
+                        if not queue or self._stop.is_set():
+                            if not in_flight:
+                                break
+                            drain(FIRST_COMPLETED)
+                            continue
+                        # Re-query campaign status to detect pause (or archiving). No autoflush:
+                        # the batch's contact updates stay in memory until commit_batch, so no
+                        # write transaction is held open between commits.
+                        db.session.expire(campaign)
+                        with db.session.no_autoflush:
+                            status = campaign.status
+                        if status != "running":
+                            logger.info("Campaign %d %s, stopping send loop.", self.campaign_id, status)
+                            self._stop.set()
+                            continue
+                        if self._lease_lost.is_set():
+                            # Another worker may have claimed the job; it sends what is still pending
+                            logger.warning("Campaign %d: job lease lost, stopping send loop.", self.campaign_id)
+                            self._stop.set()
+                            continue
+
+                        sender = pool.pick()
+                        if sender is None:
+                            if in_flight:
+                                # Accounts may be failed over meanwhile; wait for a result first
+                                drain(FIRST_COMPLETED)
+                                continue
+                            benched = pool.next_available()
+                            if benched is not None:
+                                self.retry_at = benched.health.benched_until
+                                self.retry_reason = benched.health.reason or ""
+                                logger.warning("No sender of campaign %d can send until %s UTC; %d contacts wait.",
+                                               self.campaign_id, self.retry_at, len(queue))
+                            self._stop.set()
+                            continue
+
+                        contact = queue.popleft()
+                        with timed(RENDER_SECONDS, kind="initial"):
+                            subject, body_html, body_text = templates.render(contact_variables(campaign, contact))
+                        in_flight.add(pool_threads.submit(
+                            self._deliver, sender, contact.id, contact.email, subject, body_html, body_text,
+                        ))
+                        # Keep a small backlog per worker so a pause takes effect quickly
+                        while len(in_flight) >= self.workers * 2:
+                            drain(FIRST_COMPLETED)
+            finally:
+                # Record what was already delivered even if the loop failed, so it is not resent
+                commit_batch()
+
+            try:
+                writeback.flush()
+            except Exception as exc:
+                logger.warning("Excel update error, %d changes not written: %s", len(writeback), exc)
+                enqueue_excel_sync(campaign.id)
+                db.session.commit()
+
+            with self._sessions_lock:
+                sessions, self._sessions = self._sessions, []
+            for smtp in sessions:
+                smtp.close()
+
+            if auth_failed:
+                error_msg = campaign.last_error
+                remaining = Contact.query.filter_by(campaign_id=self.campaign_id, status="pending").all()
+                for contact in remaining:
+                    contact.status = "bounced"
+                    contact.send_error = error_msg
+                db.session.commit()
+                publish_contact_changes(campaign.id, [(contact, "pending") for contact in remaining])
+            else:
+                # Accounts disabled by an auth failure are saved here if no batch commit did
+                db.session.commit()
+                db.session.expire(campaign)
+                publish_campaign(campaign)
+                if campaign.status == "running":
+                    self._schedule_deferred(Contact)
+
+            sent = sum(s.messages_sent for s in sessions)
+            elapsed = time.monotonic() - started
+            logger.info(
+                "Email send loop finished for campaign %d: %d messages in %.1fs (%.2f msg/s) over %d SMTP connections",
+                self.campaign_id, sent, elapsed, sent / elapsed if elapsed else 0,
+                sum(s.connects for s in sessions),
+            )
@@ -0,0 +1,224 @@
+"""
+sender_pool.py
+The sender accounts a campaign sends from. Contacts are spread over the
+campaign's accounts in turn; each account keeps its own token bucket and
+daily budget (send_engine.get_pacer) and its own health. An
+authentication failure disables the account for that campaign, a
+throttling reply (421, 454) benches it for a cooldown that doubles while
+the server keeps refusing, and a used-up daily quota benches it until the
+next UTC day. Whatever a benched or disabled account could not send goes
+to the rest of the pool.
+
+A contact stays with the account that sent its first email
+(Contact.sender_email): its follow-up goes out from that account and its
+replies are looked for in that account's inbox.
+"""
+import logging
+import smtplib
+import threading
+from datetime import datetime, time, timedelta
+from typing import Optional
+
+from app.email_service import is_quota_exhausted, is_throttling
+from app.metrics import SENDER_FAILOVERS_TOTAL
+from app.send_engine import AdaptiveRate, DailyQuotaExceeded, TokenBucket, get_pacer, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Seconds an account is benched after a throttling reply, doubling up to the maximum
+COOLDOWN_MIN_SECONDS = 60
+COOLDOWN_MAX_SECONDS = 3600
+
+AUTH_ERROR = "Error de autenticación Gmail. Comprueba el email y la App Password."
+NO_SENDER_ERROR = "Ninguna cuenta remitente activa. Comprueba el email y la App Password de los remitentes."
+
+
+class SenderHealth:
+    """
+    Whether one sender address may send right now. Process-wide and shared
+    by every campaign using the address, like its token bucket.
+    """
+
+    def __init__(self):
+        self.failures = 0                   # throttling replies since the last successful send
+        self.benched_until: Optional[datetime] = None   # UTC
+        self.reason: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        benched_until = self.benched_until
+        return benched_until is None or datetime.utcnow() >= benched_until
+
+    def bench(self, until: datetime, reason: str):
+        with self._lock:
+            if self.benched_until is None or until > self.benched_until:
+                self.benched_until = until
+                self.reason = reason
+
+    def throttled(self) -> Optional[datetime]:
+        """
+        Bench after a throttling reply, for longer each time in a row.
+        Returns the end of the cooldown, or None if already benched (other
+        messages in flight on the account get the same reply).
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            if self.benched_until is not None and self.benched_until > now:
+                return None
+            self.failures += 1
+            seconds = min(COOLDOWN_MAX_SECONDS, COOLDOWN_MIN_SECONDS * 2 ** (self.failures - 1))
+            self.benched_until = now + timedelta(seconds=seconds)
+            self.reason = "Envíos limitados por el servidor"
+            return self.benched_until
+
+    def recovered(self):
+        with self._lock:
+            self.failures = 0
+
+
+_health: dict[str, SenderHealth] = {}
+_health_lock = threading.Lock()
+
+
+def sender_health(sender_email: str) -> SenderHealth:
+    """Return the process-wide health of a sender address, creating it on first use."""
+    key = sender_email.strip().lower()
+    with _health_lock:
+        health = _health.get(key)
+        if health is None:
+            health = _health[key] = SenderHealth()
+        return health
+
+
+def _next_utc_midnight() -> datetime:
+    return datetime.combine(datetime.utcnow().date() + timedelta(days=1), time.min)
+
+
+class PoolMember:
+    """One usable account of a pool: its decrypted password, token buckets and health."""
+
+    def __init__(self, account_id: int, email: str, password: str,
+                 pacer: AdaptiveRate, budget: TokenBucket):
+        self.account_id = account_id
+        self.email = email.strip()
+        self.key = self.email.lower()       # as stored in Contact.sender_email
+        self.password = password
+        self.pacer = pacer                  # adjusts the rate of `limiter` from latency and throttling
+        self.limiter = pacer.bucket         # paces this purpose's messages
+        self.budget = budget                # the account's daily cap (the "send" bucket)
+        self.health = sender_health(self.email)
+        self.disabled = False               # authentication failed during this run
+
+    def available(self) -> bool:
+        return not self.disabled and self.health.available()
+
+
+class SenderPool:
+    """
+    A campaign's active accounts whose password decrypts, in position
+    order. pick() hands them out in turn, skipping benched and disabled
+    ones; failover() records what a failed send says about its account.
+    Used from one thread, except that workers may read available().
+    """
+
+    def __init__(self, campaign_id: int, members: list[PoolMember]):
+        self.campaign_id = campaign_id
+        self.members = members
+        self._by_key = {member.key: member for member in members}
+        self._next = 0
+
+    @classmethod
+    def load(cls, campaign, config, purpose: str = "send") -> "SenderPool":
+        """
+        Build the pool of `campaign`. A password still encrypted under a
+        fallback key is re-encrypted on its account; the caller commits.
+        Needs an app context.
+        """
+        from app.crypto import account_password
+
+        members = []
+        for account in campaign.senders:
+            if account.status != "active":
+                continue
+            try:
+                password = account_password(account)
+            except Exception as exc:
+                logger.error("Decrypt failed for sender %s of campaign %d: %s", account.email, campaign.id, exc)
+                continue
+            members.append(PoolMember(
+                account.id, account.email, password,
+                pacer=get_pacer(account.email, config, purpose=purpose),
+                budget=get_rate_limiter(account.email, config),
+            ))
+        return cls(campaign.id, members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def get(self, sender_email: Optional[str]) -> Optional[PoolMember]:
+        """The member for a (normalised) address, if it is in the pool and not disabled."""
+        member = self._by_key.get(sender_email or "")
+        return member if member is not None and not member.disabled else None
+
+    def usable(self) -> bool:
+        """Whether any account can still send, now or once its cooldown ends."""
+        return any(not member.disabled for member in self.members)
+
+    def pick(self) -> Optional[PoolMember]:
+        """Next available account in turn; None while every account is benched or disabled."""
+        count = len(self.members)
+        for offset in range(count):
+            member = self.members[(self._next + offset) % count]
+            if member.available():
+                self._next = (self._next + offset + 1) % count
+                return member
+        return None
+
+    def next_available(self) -> Optional[PoolMember]:
+        """The benched account that comes back first; None if no account can send again."""
+        benched = [m for m in self.members if not m.disabled and m.health.benched_until is not None]
+        return min(benched, key=lambda m: m.health.benched_until, default=None)
+
+    def failover(self, member: PoolMember, exc: BaseException) -> Optional[str]:
+        """
+        If `exc` is about the account rather than the message (auth failure,
+        daily quota, throttling), take the account out of rotation and return
+        why; the message should go to another account. Otherwise None. An
+        auth failure is also saved on the account row; the caller commits.
+        """
+        # Checked first: a 421/454 at AUTH pauses the account, it does not disable it
+        if is_throttling(exc):
+            reason = "throttled"
+            until = member.health.throttled()
+            if until is not None:
+                member.pacer.throttled()
+                logger.warning("Sender %s throttled (%s); benched until %s UTC", member.email, exc,
+                               until.strftime("%H:%M:%S"))
+        elif isinstance(exc, smtplib.SMTPAuthenticationError):
+            reason = "auth"
+            if not member.disabled:
+                self.disable(member, AUTH_ERROR)
+                logger.error("Sender %s of campaign %d disabled, authentication failed: %s",
+                             member.email, self.campaign_id, exc)
+        elif isinstance(exc, DailyQuotaExceeded) or is_quota_exhausted(exc):
+            reason = "quota"
+            member.health.bench(_next_utc_midnight(), "Límite diario alcanzado")
+            logger.warning("Daily quota reached for %s; its messages go to the other senders.", member.email)
+        else:
+            return None
+        SENDER_FAILOVERS_TOTAL.inc(reason=reason)
+        return reason
+
+    def succeeded(self, member: PoolMember):
+        if member.health.failures:
+            member.health.recovered()
+
+    def disable(self, member: PoolMember, error: str):
+        from app import db
+        from app.models import SenderAccount
+
+        member.disabled = True
+        account = db.session.get(SenderAccount, member.account_id)
+        if account is not None:
+            account.status = "auth_failed"
+            account.last_error = error
@@ -0,0 +1,87 @@
+"""
+suppression.py
+Persistent suppression list: addresses excluded from every future send,
+fed by unsubscribes, hard bounces and manual additions. All checks are
+set-based SQL (EXISTS / anti-join on email_normalized), never Python loops
+over the history.
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, exists
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import Contact, Suppression, insert_ignore, normalize_email
+
+# Statuses that count as "already contacted" for cross-campaign deduplication
+CONTACTED_STATUSES = ("sent", "replied", "followup_sent")
+
+SUPPRESSION_REASONS = ("unsubscribe", "hard_bounce", "manual")
+
+
+def suppress(emails: Iterable[str], reason: str = "manual", detail: Optional[str] = None,
+             chunk_size: int = 1000) -> int:
+    """Add addresses to the suppression list (idempotent). Returns rows inserted. Caller commits."""
+    now = datetime.utcnow()
+    statement = insert_ignore(Suppression.__table__, "email_normalized")
+    added = 0
+    seen = set()
+    chunk = []
+
+    def flush():
+        nonlocal added
+        if chunk:
+            added += db.session.connection().execute(statement, chunk).rowcount or 0
+            chunk.clear()
+
+    for email in emails:
+        key = normalize_email(email)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        chunk.append({"email_normalized": key, "reason": reason, "detail": detail, "created_at": now})
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return added
+
+
+def unsuppress(emails: Iterable[str]) -> int:
+    """Remove addresses from the suppression list. Caller commits."""
+    keys = list({normalize_email(e) for e in emails if e})
+    removed = 0
+    for i in range(0, len(keys), 1000):
+        removed += db.session.execute(
+            delete(Suppression).where(Suppression.email_normalized.in_(keys[i:i + 1000]))
+        ).rowcount or 0
+    return removed
+
+
+def suppressed_clause():
+    """WHERE clause true for Contact rows whose address is on the suppression list."""
+    return exists().where(Suppression.email_normalized == Contact.email_normalized)
+
+
+def remove_excluded_contacts(campaign_id: int) -> tuple[int, int]:
+    """
+    Delete this campaign's freshly imported contacts that are suppressed or
+    were already contacted by another campaign, using one anti-join each.
+    Returns (suppressed, already_contacted) counts. Caller commits.
+    """
+    suppressed = db.session.execute(
+        delete(Contact).where(Contact.campaign_id == campaign_id, suppressed_clause())
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+
+    history = aliased(Contact)
+    contacted_before = exists().where(
+        history.email_normalized == Contact.email_normalized,
+        history.status.in_(CONTACTED_STATUSES),
+        history.campaign_id != campaign_id,
+    )
+    duplicates = db.session.execute(
+        delete(Contact).where(Contact.campaign_id == campaign_id, contacted_before)
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+    return suppressed, duplicates
@@ -0,0 +1,181 @@
+"""
+templating.py
+Compiles {{placeholder}} email templates once and renders them with a
+single join per contact.
+
+Syntax:
+    {{Nombre}}                    value of the column (or variable) "Nombre"
+    {{ empresa | upper }}         filters: upper, lower, title, capitalize, strip
+    {{Cargo|default:Director/a}}  text used when the value is missing or empty
+
+Lookups try the exact name first, then ignore case and spaces, so
+{{nombre}}, {{Nombre}} and {{ NOMBRE }} all resolve the "Nombre" column and
+{{FechaNacimiento}} resolves "Fecha Nacimiento". A placeholder that matches
+no variable at all is left in the output untouched.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable
+
+_PLACEHOLDER_RE = re.compile(r"\{\{([^{}]+)\}\}")
+
+FILTERS = {
+    "upper": str.upper,
+    "lower": str.lower,
+    "title": str.title,
+    "capitalize": str.capitalize,
+    "strip": str.strip,
+}
+
+
+class TemplateError(ValueError):
+    """Raised for malformed placeholders, e.g. an unknown filter."""
+
+
+def _lookup_key(name: str) -> str:
+    return name.replace(" ", "").lower()
+
+
+class _Placeholder:
+    __slots__ = ("raw", "name", "key", "filters", "default")
+
+    def __init__(self, raw: str, name: str, filters: list, default):
+        self.raw = raw
+        self.name = name
+        self.key = _lookup_key(name)
+        self.filters = filters
+        self.default = default
+
+
+class _Variables:
+    """Variable lookup for one render: exact match, then a lazily built case/space-insensitive index."""
+
+    __slots__ = ("values", "_folded")
+
+    def __init__(self, values: dict):
+        self.values = values
+        self._folded = None
+
+    def get(self, placeholder: _Placeholder):
+        if placeholder.name in self.values:
+            return True, self.values[placeholder.name]
+        if self._folded is None:
+            self._folded = {}
+            for name, value in self.values.items():
+                self._folded.setdefault(_lookup_key(str(name)), value)
+        if placeholder.key in self._folded:
+            return True, self._folded[placeholder.key]
+        return False, None
+
+
+class CompiledTemplate:
+    """A template parsed into literal text and placeholder segments."""
+
+    __slots__ = ("source", "_segments", "placeholders")
+
+    def __init__(self, source: str):
+        self.source = source or ""
+        self._segments: list = []
+        names = []
+        pos = 0
+        for match in _PLACEHOLDER_RE.finditer(self.source):
+            if match.start() > pos:
+                self._segments.append(self.source[pos:match.start()])
+            placeholder = self._parse(match.group(0), match.group(1))
+            self._segments.append(placeholder)
+            if placeholder.name not in names:
+                names.append(placeholder.name)
+            pos = match.end()
+        if pos < len(self.source):
+            self._segments.append(self.source[pos:])
+        self.placeholders = tuple(names)
+
+    @staticmethod
+    def _parse(raw: str, body: str) -> _Placeholder:
+        parts = [p.strip() for p in body.split("|")]
+        name, filters, default = parts[0], [], None
+        if not name:
+            raise TemplateError(f"Variable vacía en {raw}")
+        for part in parts[1:]:
+            filter_name, _, arg = part.partition(":")
+            filter_name = filter_name.strip().lower()
+            if filter_name == "default":
+                default = arg.strip()
+            elif filter_name in FILTERS:
+                filters.append(FILTERS[filter_name])
+            else:
+                raise TemplateError(f"Filtro desconocido '{filter_name}' en {raw}")
+        return _Placeholder(raw, name, filters, default)
+
+    def render(self, variables: dict) -> str:
+        lookup = _Variables(variables)
+        out = []
+        for segment in self._segments:
+            if segment.__class__ is str:
+                out.append(segment)
+                continue
+            found, value = lookup.get(segment)
+            if not found and segment.default is None:
+                out.append(segment.raw)
+                continue
+            text = "" if value is None else str(value)
+            if not text and segment.default is not None:
+                text = segment.default
+            for apply in segment.filters:
+                text = apply(text)
+            out.append(text)
+        return "".join(out)
+
+    def unknown(self, available: Iterable[str]) -> list[str]:
+        """Placeholders without a default that none of the `available` names would resolve."""
+        names = set(available)
+        keys = {_lookup_key(str(n)) for n in names}
+        missing = []
+        for segment in self._segments:
+            if segment.__class__ is str or segment.default is not None:
+                continue
+            if segment.name not in names and segment.key not in keys and segment.name not in missing:
+                missing.append(segment.name)
+        return missing
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str) -> CompiledTemplate:
+    """Parse a template once; repeated calls with the same text reuse the result."""
+    return CompiledTemplate(source)
+
+
+class CampaignTemplates:
+    """The compiled subject/HTML/text of a campaign's initial email or its follow-up."""
+
+    def __init__(self, campaign, followup: bool = False):
+        prefix = "followup_" if followup else ""
+        self.subject = compile_template(getattr(campaign, f"{prefix}subject") or "")
+        self.body_html = compile_template(getattr(campaign, f"{prefix}body_html") or "")
+        self.body_text = compile_template(getattr(campaign, f"{prefix}body_text") or "")
+
+    def render(self, variables: dict) -> tuple[str, str, str]:
+        """Return (subject, body_html, body_text) for one contact."""
+        return (
+            self.subject.render(variables),
+            self.body_html.render(variables),
+            self.body_text.render(variables),
+        )
+
+    def unknown(self, available: Iterable[str]) -> list[str]:
+        available = list(available)
+        missing = []
+        for template in (self.subject, self.body_html, self.body_text):
+            for name in template.unknown(available):
+                if name not in missing:
+                    missing.append(name)
+        return missing
+
+
+def contact_variables(campaign, contact) -> dict:
+    """Template variables for a contact: every sheet column plus "nombre"."""
+    return {
+        "nombre": contact.name,
+        campaign.name_col or "Nombre": contact.name,   # e.g. {{Nombre}} also works
+        **(contact.custom_fields or {}),
+    }
@@ -0,0 +1,212 @@
+"""
+bench_campaign.py
+End-to-end throughput of a campaign against local mail servers (see
+mailstub.py), on a throwaway database and workbook:
+
+  import          POST /api/launch: read the Excel and insert the contacts
+  send            SendEngine run, unthrottled, through the SMTP sink
+  write-back      excel_sync job: rewrite every contact's row in the workbook
+  reply check     check_replies_job over an INBOX with one message per contact
+                  (10% replies, 2% bounces), then again with nothing new
+  /api/status     request latency on the finished campaign
+
+    python benchmarks/bench_campaign.py                       # 1k, 10k and 100k contacts
+    python benchmarks/bench_campaign.py --sizes 1000 --json before.json
+    python benchmarks/bench_campaign.py --sizes 1000 --compare before.json
+
+With --compare, exits with status 1 if any metric is more than --tolerance
+worse than the baseline file.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mailstub import FakeIMAP, SMTPSink  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.email_service import configure_servers  # noqa: E402
+from app.jobs import HANDLERS  # noqa: E402
+from app.models import Contact, SentMessage  # noqa: E402
+from app.scheduler import check_replies_job  # noqa: E402
+from app.send_engine import SendEngine  # noqa: E402
+from config import Config  # noqa: E402
+
+SENDER = "ventas@example.com"
+STATUS_REQUESTS = 200
+
+# name → (unit, higher is better)
+METRICS = {
+    "import_s": ("s", False),
+    "send_msgs_per_s": ("msg/s", True),
+    "writeback_s": ("s", False),
+    "reply_check_s": ("s", False),
+    "reply_check_incremental_s": ("s", False),
+    "status_p50_ms": ("ms", False),
+    "status_p95_ms": ("ms", False),
+}
+
+
+def _workbook(path: str, n: int):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Nombre", "Email", "Empresa"])
+    for i in range(n):
+        ws.append([f"Contacto {i}", f"contacto{i}@example.org", f"Empresa {i % 50}"])
+    wb.save(path)
+
+
+def _inbox(sent: list[tuple[str, str]]) -> list[bytes]:
+    """One message per contact: a reply, a bounce notification or unrelated mail."""
+    messages = []
+    for i, (email, message_id) in enumerate(sent):
+        if i % 10 == 0:
+            messages.append((
+                f"From: {email}\r\nTo: {SENDER}\r\nSubject: Re: Propuesta\r\n"
+                f"In-Reply-To: {message_id}\r\nReferences: {message_id}\r\n\r\nMe interesa.\r\n"
+            ).encode())
+        elif i % 50 == 1:
+            messages.append((
+                "From: Mail Delivery Subsystem <mailer-daemon@googlemail.com>\r\n"
+                f"To: {SENDER}\r\nSubject: Delivery Status Notification (Failure)\r\n"
+                'MIME-Version: 1.0\r\nContent-Type: multipart/report; report-type=delivery-status; boundary="b"\r\n'
+                "\r\n--b\r\nContent-Type: text/plain\r\n\r\nAddress not found.\r\n"
+                "--b\r\nContent-Type: message/delivery-status\r\n\r\nReporting-MTA: dns; googlemail.com\r\n\r\n"
+                f"Final-Recipient: rfc822; {email}\r\nAction: failed\r\nStatus: 5.1.1\r\n"
+                "Diagnostic-Code: smtp; 550 5.1.1 The email account does not exist\r\n"
+                f"\r\n--b\r\nContent-Type: text/rfc822-headers\r\n\r\nMessage-ID: {message_id}\r\n\r\n--b--\r\n"
+            ).encode())
+        else:
+            messages.append((
+                f"From: newsletter{i % 97}@news.example.net\r\nTo: {SENDER}\r\n"
+                f"Subject: Boletín {i}\r\nMessage-ID: <news{i}@news.example.net>\r\n\r\nNovedades.\r\n"
+            ).encode())
+    return messages
+
+
+def run(n: int, workers: int) -> dict:
+    folder = tempfile.mkdtemp(prefix="bench_campaign_")
+    smtp = SMTPSink.start()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(folder, "bench.db")
+        UPLOAD_FOLDER = folder
+        SMTP_HOST, SMTP_PORT, SMTP_SECURITY = "127.0.0.1", smtp.port, "none"
+        IMAP_HOST, IMAP_SSL = "127.0.0.1", False
+        SEND_WORKERS = workers
+        SEND_RATE_PER_SECOND = 1e9
+        SEND_DAILY_LIMIT = 0
+        # Unthrottled sends would otherwise rewrite the workbook every 50 messages;
+        # the time-based flush still applies, and writeback_s measures a full rewrite
+        EXCEL_FLUSH_EVERY = n
+
+    app = create_app(BenchConfig)
+    client = app.test_client()
+    excel_path = os.path.join(folder, "contactos.xlsx")
+    _workbook(excel_path, n)
+    results = {}
+
+    campaign_id = client.post("/api/configure", json={
+        "sender_email": SENDER, "app_password": "abcd efgh ijkl mnop",
+        "excel_path": excel_path, "name_col": "Nombre", "email_col": "Email",
+        "subject": "Propuesta para {{Empresa}}",
+        "body_html": "<p>Hola {{nombre}},</p><p>¿Hablamos sobre {{Empresa}}?</p>",
+        "body_text": "Hola {{nombre}},\n\n¿Hablamos sobre {{Empresa}}?",
+    }).get_json()["campaign_id"]
+
+    start = time.perf_counter()
+    response = client.post("/api/launch", json={"campaign_id": campaign_id})
+    results["import_s"] = time.perf_counter() - start
+    if response.status_code != 200:
+        raise SystemExit(f"Launch failed: {response.get_json()}")
+
+    start = time.perf_counter()
+    SendEngine(app, campaign_id).run()
+    results["send_msgs_per_s"] = smtp.messages / (time.perf_counter() - start)
+    if smtp.messages != n:
+        raise SystemExit(f"Only {smtp.messages} of {n} messages reached the SMTP sink")
+
+    start = time.perf_counter()
+    HANDLERS["excel_sync"](app, {"campaign_id": campaign_id})
+    results["writeback_s"] = time.perf_counter() - start
+
+    with app.app_context():
+        sent = db.session.query(Contact.email, SentMessage.message_id).join(
+            SentMessage, SentMessage.contact_id == Contact.id).order_by(Contact.id).all()
+    imap = FakeIMAP.start(_inbox(sent))
+    app.config["IMAP_PORT"] = imap.port
+    configure_servers(app.config)
+    for metric in ("reply_check_s", "reply_check_incremental_s"):
+        start = time.perf_counter()
+        check_replies_job(app)
+        results[metric] = time.perf_counter() - start
+    with app.app_context():
+        replied = Contact.query.filter_by(campaign_id=campaign_id, status="replied").count()
+    if replied != len(range(0, n, 10)):
+        raise SystemExit(f"Reply check matched {replied} replies, expected {len(range(0, n, 10))}")
+
+    timings = []
+    for _ in range(STATUS_REQUESTS):
+        start = time.perf_counter()
+        client.get(f"/api/status?campaign_id={campaign_id}")
+        timings.append((time.perf_counter() - start) * 1000)
+    results["status_p50_ms"] = statistics.median(timings)
+    results["status_p95_ms"] = statistics.quantiles(timings, n=20)[-1]
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    smtp.stop()
+    imap.stop()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Metrics more than `tolerance` (a fraction) worse than the baseline."""
+    regressions = []
+    for size, metrics in results.items():
+        for name, value in metrics.items():
+            old = baseline.get(size, {}).get(name)
+            if not old:
+                continue
+            higher_is_better = METRICS[name][1]
+            change = (old - value) / old if higher_is_better else (value - old) / old
+            if change > tolerance:
+                regressions.append(f"{size} contacts, {name}: {old:.4g} → {value:.4g} ({change:.0%} worse)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--workers", type=int, default=Config.SEND_WORKERS, help="SMTP send workers")
+    parser.add_argument("--json", metavar="PATH", help="write the results to a JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON file from a previous --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (default 0.25 = 25%%)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run(size, args.workers)
+        print(f"\n{size:,} contacts")
+        for name, (unit, _) in METRICS.items():
+            print(f"  {name:<28}{results[str(size)][name]:>12,.3f} {unit}")
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,98 @@
+"""
+bench_import.py
+Compares reading and validating a contact list row by row (engine
+"python") against the pandas column-wise reader (engine "pandas"), on a
+generated sheet with blank rows, rows without an email, invalid addresses,
+repeated addresses, dates and numeric custom fields. Checks that both
+engines return the same contacts and rejection counts. .xlsx files go
+through python-calamine when it is installed, openpyxl otherwise; pandas is
+imported before timing, as it is once per app process.
+
+    python benchmarks/bench_import.py                        # 200k rows, .xlsx and .csv
+    python benchmarks/bench_import.py --rows 50000 --formats csv
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import openpyxl
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.excel_service import _pandas, iter_contact_chunks  # noqa: E402
+
+HEADERS = ["Nombre", "Email", "Empresa", "Código postal", "Alta", "Pedidos"]
+
+
+def _rows(n: int):
+    start = datetime(2024, 1, 1)
+    for i in range(n):
+        if i % 97 == 0:
+            email = f"CONTACTO{i - 1}@Example.org "      # repeats the previous row's address
+        elif i % 89 == 0:
+            email = f"contacto{i}.example.org"          # no @
+        elif i % 83 == 0:
+            email = None
+        else:
+            email = f"contacto{i}@example.org"
+        if i % 101 == 0:
+            yield [None] * len(HEADERS)
+            continue
+        yield [
+            f" Contacto {i} ", email, f"Empresa {i % 50}", f"{i % 52:02d}001",
+            start + timedelta(days=i % 365, minutes=30 * (i % 2)), i % 7,
+        ]
+
+
+def _write(path: str, n: int):
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(HEADERS)
+            for row in _rows(n):
+                writer.writerow(["" if v is None else v.strftime("%d/%m/%Y") if isinstance(v, datetime) else v
+                                 for v in row])
+        return
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(HEADERS)
+    for row in _rows(n):
+        ws.append(row)
+    wb.save(path)
+
+
+def _read(path: str, engine: str):
+    rejected = Counter()
+    contacts = [c for chunk in iter_contact_chunks(path, "Nombre", "Email", 1000, rejected, engine) for c in chunk]
+    return contacts, rejected
+
+
+def run(rows: int, formats: list[str]):
+    if _pandas() is None:
+        raise SystemExit("pandas is not installed (pip install -r requirements.txt)")
+    folder = tempfile.mkdtemp()
+    print(f"{'file':<8}{'engine':<9}{'rows/s':>12}{'seconds':>10}  rejected")
+    for fmt in formats:
+        path = os.path.join(folder, f"contactos.{fmt}")
+        _write(path, rows)
+        results = {}
+        for engine in ("python", "pandas"):
+            start = time.perf_counter()
+            results[engine] = _read(path, engine)
+            elapsed = time.perf_counter() - start
+            print(f"{fmt:<8}{engine:<9}{rows / elapsed:>12,.0f}{elapsed:>10.2f}  {dict(results[engine][1])}")
+        if results["python"] != results["pandas"]:
+            raise SystemExit(f"The pandas reader returned different contacts for the .{fmt} file")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--formats", nargs="+", default=["xlsx", "csv"], choices=["xlsx", "csv"])
+    args = parser.parse_args()
+    run(args.rows, args.formats)
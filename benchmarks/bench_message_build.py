@@ -0,0 +1,85 @@
+"""
+bench_message_build.py
+Compares building each message with email.mime objects + as_string() (the
+old send path) against MessageBuilder, and checks both parse to the same
+content.
+
+    python benchmarks/bench_message_build.py              # 20k messages
+    python benchmarks/bench_message_build.py --count 100000
+"""
+import argparse
+import email
+import os
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.email_service import MessageBuilder  # noqa: E402
+
+SENDER = "ventas@example.com"
+BODY_HTML = (
+    "<p>Hola {name},</p><p>Te escribo porque en {company} podríamos ayudaros a "
+    "reducir el tiempo de gestión de pedidos. ¿Tienes 15 minutos esta semana?</p>"
+    "<p>Un saludo,<br>Ana</p>"
+) * 3
+BODY_TEXT = (
+    "Hola {name},\n\nTe escribo porque en {company} podríamos ayudaros a reducir el "
+    "tiempo de gestión de pedidos. ¿Tienes 15 minutos esta semana?\n\nUn saludo,\nAna\n"
+) * 3
+
+
+def _messages(count: int):
+    for i in range(count):
+        name, company = f"Contacto {i}", f"Empresa {i % 50}"
+        yield (
+            f"contacto{i}@example.org",
+            f"Propuesta para {company}",
+            BODY_HTML.format(name=name, company=company),
+            BODY_TEXT.format(name=name, company=company),
+        )
+
+
+def build_legacy(recipient, subject, body_html, body_text):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = SENDER
+    msg["To"] = recipient
+    msg["Date"] = formatdate(localtime=True)
+    msg["Message-ID"] = make_msgid(domain="example.com")
+    msg.attach(MIMEText(body_text, "plain", "utf-8"))
+    msg.attach(MIMEText(body_html, "html", "utf-8"))
+    return msg.as_string().encode("utf-8")
+
+
+def _parts(raw: bytes):
+    msg = email.message_from_bytes(raw)
+    subject = str(email.header.make_header(email.header.decode_header(msg["Subject"])))
+    bodies = [p.get_payload(decode=True).decode("utf-8") for p in msg.walk() if not p.is_multipart()]
+    return msg["To"], subject, bodies
+
+
+def run(count: int):
+    builder = MessageBuilder(SENDER)
+    build_new = lambda *args: builder.build(*args)[1]  # noqa: E731
+
+    sample = next(_messages(1))
+    if _parts(build_legacy(*sample)) != _parts(build_new(*sample)):
+        raise SystemExit("MessageBuilder output differs from the email.mime output")
+
+    print(f"{'builder':<16}{'messages/s':>12}{'µs/message':>12}")
+    for label, build in (("email.mime", build_legacy), ("MessageBuilder", build_new)):
+        start = time.perf_counter()
+        for args in _messages(count):
+            build(*args)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<16}{count / elapsed:>12,.0f}{elapsed / count * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20_000)
+    run(parser.parse_args().count)
@@ -0,0 +1,119 @@
+"""
+bench_queries.py
+Times the hot contact queries against a throwaway SQLite database, with the
+model indexes and again with them dropped.
+
+    python benchmarks/bench_queries.py                 # 100k and 1M contacts
+    python benchmarks/bench_queries.py --sizes 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import text  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import Contact  # noqa: E402
+from config import Config  # noqa: E402
+
+CAMPAIGNS = 20
+STATUSES = ["pending", "sent", "sent", "sent", "replied", "followup_sent", "bounced"]
+REPEAT = 5
+
+
+def _populate(n: int):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    conn = db.session.connection()
+    conn.execute(text("INSERT INTO campaigns (id, name, status) VALUES " + ", ".join(
+        f"({i}, 'bench {i}', 'running')" for i in range(1, CAMPAIGNS + 1))))
+    batch = []
+    for i in range(n):
+        email = f"user{i}@example{i % 997}.com"
+        batch.append({
+            "campaign_id": rng.randint(1, CAMPAIGNS),
+            "email": email,
+            "email_normalized": email,
+            "status": rng.choice(STATUSES),
+            "message_id": f"<{i}.bench@example.com>",
+            "email_sent_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 10)),
+        })
+        if len(batch) == 10000:
+            conn.execute(Contact.__table__.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(Contact.__table__.insert(), batch)
+    db.session.commit()
+
+
+def _queries(n: int):
+    rng = random.Random(7)
+    cutoff = datetime.utcnow() - timedelta(days=3)
+    ids = ", ".join(f"'<{rng.randrange(n)}.bench@example.com>'" for _ in range(1000))
+    emails = ", ".join(f"'user{rng.randrange(n * 2)}@example{rng.randrange(997)}.com'" for _ in range(1000))
+    return {
+        "stats GROUP BY status": (
+            "SELECT status, count(id) FROM contacts WHERE campaign_id = 7 GROUP BY status", {}),
+        "pending for send loop": (
+            "SELECT id FROM contacts WHERE campaign_id = 7 AND status = 'pending'", {}),
+        "follow-ups due": (
+            "SELECT id FROM contacts WHERE campaign_id = 7 AND status = 'sent' AND email_sent_at <= :cutoff",
+            {"cutoff": cutoff}),
+        "reply match (1000 ids)": (
+            f"SELECT id FROM contacts WHERE message_id IN ({ids})", {}),
+        "dedup (1000 emails)": (
+            f"SELECT email_normalized FROM contacts WHERE email_normalized IN ({emails}) "
+            "AND status IN ('sent', 'replied', 'followup_sent')", {}),
+    }
+
+
+def _time_queries(queries: dict) -> dict:
+    conn = db.session.connection()
+    results = {}
+    for name, (sql, params) in queries.items():
+        best = float("inf")
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            conn.execute(text(sql), params).fetchall()
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+    return results
+
+
+def run(n: int):
+    folder = tempfile.mkdtemp(prefix="bench_queries_")
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(folder, "bench.db")
+        UPLOAD_FOLDER = folder
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        start = time.perf_counter()
+        _populate(n)
+        print(f"\n{n:,} contacts loaded in {time.perf_counter() - start:.1f}s")
+        queries = _queries(n)
+        indexed = _time_queries(queries)
+        for index in Contact.__table__.indexes:
+            db.session.execute(text(f"DROP INDEX {index.name}"))
+        db.session.commit()
+        plain = _time_queries(queries)
+        print(f"{'query':<28}{'indexed':>12}{'no index':>12}{'speed-up':>10}")
+        for name in queries:
+            print(f"{name:<28}{indexed[name] * 1000:>10.2f}ms{plain[name] * 1000:>10.2f}ms"
+                  f"{plain[name] / indexed[name]:>9.0f}x")
+        db.session.remove()
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    for size in parser.parse_args().sizes:
+        run(size)
@@ -0,0 +1,214 @@
+"""
+mailstub.py
+In-process stand-ins for the mail servers, for benchmarks: an SMTP sink
+that accepts and counts every message, and a read-only IMAP server
+serving a seeded INBOX, with IDLE. Both speak just enough of the protocol
+for the app's send, reply-check and reply-listener paths; no TLS, any
+login is accepted.
+
+    smtp = SMTPSink.start()                 # smtp.port, smtp.messages
+    imap = FakeIMAP.start(messages)         # messages: list of raw bytes
+    imap.deliver(raw)                       # new mail, announced to IDLE clients
+"""
+import re
+import select
+import socket
+import socketserver
+import threading
+from email.parser import BytesHeaderParser
+
+_UID_FETCH_RE = re.compile(r"UID FETCH (\S+) \((.*)\)$", re.IGNORECASE)
+_HEADER_FIELDS_RE = re.compile(r"HEADER\.FIELDS \(([^)]*)\)", re.IGNORECASE)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    # Room for many sessions connecting at once
+    request_queue_size = 1024
+
+    def get_request(self):
+        # Each reply is its own small write: without TCP_NODELAY, Nagle holds the
+        # second of several pipelined replies until the client's delayed ACK
+        conn, address = super().get_request()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, address
+
+    @classmethod
+    def start(cls, *args):
+        server = cls(*args)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ── SMTP ──────────────────────────────────────────────────────────────────────
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply("220 smtp-sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250-smtp-sink\r\n250-PIPELINING\r\n250-8BITMIME\r\n250 AUTH PLAIN LOGIN\r\n")
+            elif command == b"AUTH":
+                self._reply("235 2.7.0 Authentication successful")
+            elif command == b"DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    size += len(data_line)
+                with server.lock:
+                    server.messages += 1
+                    server.bytes += size
+                self._reply("250 2.0.0 queued")
+            elif command == b"QUIT":
+                self._reply("221 2.0.0 bye")
+                return
+            elif command in (b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                self._reply("250 2.0.0 ok")
+            else:
+                self._reply("502 5.5.2 command not implemented")
+
+
+class SMTPSink(_Server):
+    """Accepts every message and only counts them."""
+
+    def __init__(self, address=("127.0.0.1", 0)):
+        super().__init__(address, _SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.bytes = 0
+
+
+# ── IMAP ──────────────────────────────────────────────────────────────────────
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    def _send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode() + b"\r\n")
+
+    def handle(self):
+        self._send("* OK fake-imap ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode().strip().partition(" ")
+            command = rest.split(" ", 1)[0].upper()
+            if command == "CAPABILITY":
+                self._send("* CAPABILITY IMAP4rev1 IDLE")
+            elif command in ("SELECT", "EXAMINE"):
+                mailbox = self.server
+                self._send(f"* {len(mailbox.uids)} EXISTS")
+                self._send(f"* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid")
+                self._send(f"* OK [UIDNEXT {mailbox.uidnext}] Predicted next UID")
+                self._send(f"{tag} OK [READ-ONLY] {command} completed")
+                continue
+            elif command == "UID":
+                self._uid(tag, rest)
+                continue
+            elif command == "IDLE":
+                self._idle(tag)
+                continue
+            elif command == "LOGOUT":
+                self._send("* BYE logging out")
+                self._send(f"{tag} OK LOGOUT completed")
+                return
+            self._send(f"{tag} OK {command} completed")
+
+    def _idle(self, tag: str):
+        mailbox = self.server
+        self._send("+ idling")
+        known = len(mailbox.uids)
+        while not select.select([self.connection], [], [], 0.005)[0]:
+            if len(mailbox.uids) != known:
+                known = len(mailbox.uids)
+                self._send(f"* {known} EXISTS")
+        self.rfile.readline()  # DONE
+        self._send(f"{tag} OK IDLE terminated")
+
+    def _uid(self, tag: str, rest: str):
+        mailbox = self.server
+        if rest.upper().startswith("UID SEARCH"):
+            # SINCE is ignored: every seeded message counts as recent
+            self._send("* SEARCH " + " ".join(map(str, mailbox.uids)))
+            self._send(f"{tag} OK SEARCH completed")
+            return
+        match = _UID_FETCH_RE.match(rest)
+        if not match:
+            self._send(f"{tag} BAD unsupported UID command")
+            return
+        fields = _HEADER_FIELDS_RE.search(match.group(2))
+        item = f"BODY[HEADER.FIELDS ({fields.group(1)})]" if fields else "BODY[]"
+        names = fields.group(1).split() if fields else None
+        out = []
+        for uid in mailbox.select_uids(match.group(1)):
+            data = mailbox.headers(uid, names) if names else mailbox.raw[uid]
+            out.append(f"* {uid} FETCH (UID {uid} {item} {{{len(data)}}}\r\n".encode() + data + b")\r\n")
+        out.append(f"{tag} OK FETCH completed\r\n".encode())
+        self.wfile.write(b"".join(out))
+
+
+class FakeIMAP(_Server):
+    """Serves `messages` (raw RFC 5322 bytes) as INBOX with UIDs 1..n."""
+
+    def __init__(self, messages, address=("127.0.0.1", 0), uidvalidity: int = 1):
+        super().__init__(address, _IMAPHandler)
+        self.uidvalidity = uidvalidity
+        self.raw = {uid: raw for uid, raw in enumerate(messages, start=1)}
+        self.uids = list(self.raw)
+        self.lock = threading.Lock()
+        self._parsed = {}
+
+    @property
+    def uidnext(self) -> int:
+        return (self.uids[-1] if self.uids else 0) + 1
+
+    def deliver(self, raw: bytes) -> int:
+        """Add a message to INBOX; returns its UID."""
+        with self.lock:
+            uid = self.uidnext
+            self.raw[uid] = raw
+            self.uids.append(uid)
+        return uid
+
+    def select_uids(self, uid_set: str) -> list[int]:
+        """UIDs matched by an IMAP sequence set such as '1,5,7:*'."""
+        last = self.uids[-1] if self.uids else 0
+        wanted = []
+        for part in uid_set.split(","):
+            if ":" in part:
+                low, high = (last if n == "*" else int(n) for n in part.split(":"))
+                low, high = min(low, high), max(low, high)
+                matched = [u for u in self.uids if low <= u <= high]
+                # n:* always matches the newest message
+                wanted.extend(matched or self.uids[-1:])
+            elif int(part) in self.raw:
+                wanted.append(int(part))
+        return wanted
+
+    def headers(self, uid: int, names: list[str]) -> bytes:
+        parsed = self._parsed.get(uid)
+        if parsed is None:
+            parsed = self._parsed[uid] = BytesHeaderParser().parsebytes(self.raw[uid])
+        lines = [f"{name}: {parsed[name]}\r\n" for name in names if parsed[name] is not None]
+        return ("".join(lines) + "\r\n").encode()
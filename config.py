@@ -8,12 +8,85 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-change-in-production")
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(BASE_DIR, "instance", "agent.db") + "?check_same_thread=False"
+    # Previous SECRET_KEYs (comma-separated) that still decrypt stored passwords after a rotation
+    SECRET_KEY_FALLBACKS = [k for k in os.environ.get("SECRET_KEY_FALLBACKS", "").split(",") if k]
+    # Seconds a decrypted app password stays cached in memory; 0 disables the cache
+    CREDENTIAL_CACHE_SECONDS = float(os.environ.get("CREDENTIAL_CACHE_SECONDS", 900))
+    # SQLite file by default; set DATABASE_URL (e.g. postgresql://...) to use a server database
+    SQLALCHEMY_DATABASE_URI = (
+        os.environ.get("DATABASE_URL") or "sqlite:///" + os.path.join(BASE_DIR, "instance", "agent.db")
+    ).replace("postgres://", "postgresql://", 1)
+    # Pooled connections, and seconds a write waits for a lock before failing
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+    DB_BUSY_TIMEOUT = float(os.environ.get("DB_BUSY_TIMEOUT", 30))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+    # Contacts are imported in streaming chunks, so large lists are fine
+    MAX_CONTENT_LENGTH = int(os.environ.get("MAX_UPLOAD_MB", 200)) * 1024 * 1024
+    # Contacts per bulk INSERT when importing a list
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000))
+    # Contact import: "python" (default) streams row by row with bounded memory; "pandas"
+    # validates whole columns at once (much faster for Excel with python-calamine) but loads
+    # the whole sheet into memory; "auto" uses pandas for Excel files when it is installed
+    IMPORT_ENGINE = os.environ.get("IMPORT_ENGINE", "python")
     SCHEDULER_API_ENABLED = True
+    # Run the periodic jobs (reply checks, due follow-ups) and IMAP IDLE listeners in this
+    # process; with several `run.py --worker` processes, leave it on in exactly one
+    SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "true").lower() not in ("0", "false", "no")
     # Seconds between IMAP reply checks (default: 30 min)
     REPLY_CHECK_INTERVAL = int(os.environ.get("REPLY_CHECK_INTERVAL", 1800))
-    # Seconds between daily follow-up checks (default: 24h)
-    FOLLOWUP_CHECK_INTERVAL = int(os.environ.get("FOLLOWUP_CHECK_INTERVAL", 86400))
+    # Sender inboxes scanned at the same time (IMAP sessions on the mail event loop)
+    REPLY_CHECK_WORKERS = int(os.environ.get("REPLY_CHECK_WORKERS", 20))
+    # Push reply detection: an IMAP IDLE connection per sender, re-issued every
+    # IMAP_IDLE_SECONDS; listeners are started/stopped every IMAP_IDLE_SYNC_INTERVAL
+    IMAP_IDLE_ENABLED = os.environ.get("IMAP_IDLE_ENABLED", "true").lower() not in ("0", "false", "no")
+    IMAP_IDLE_SECONDS = int(os.environ.get("IMAP_IDLE_SECONDS", 600))
+    IMAP_IDLE_SYNC_INTERVAL = int(os.environ.get("IMAP_IDLE_SYNC_INTERVAL", 60))
+    # Seconds between checks for due follow-ups (default: 5 min)
+    FOLLOWUP_CHECK_INTERVAL = int(os.environ.get("FOLLOWUP_CHECK_INTERVAL", 300))
+    # Follow-ups committed per batch, their own pace per sender, and first retry delay after a deferred send
+    FOLLOWUP_BATCH_SIZE = int(os.environ.get("FOLLOWUP_BATCH_SIZE", 20))
+    FOLLOWUP_RATE_PER_SECOND = float(os.environ.get("FOLLOWUP_RATE_PER_SECOND", 0.5))
+    FOLLOWUP_RETRY_SECONDS = int(os.environ.get("FOLLOWUP_RETRY_SECONDS", 3600))
+    # Port for /metrics in `run.py --worker` processes (the web app serves it itself); 0 disables
+    METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+    # Mail servers (Gmail by default). SMTP_SECURITY: starttls, ssl or none
+    SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT = int(os.environ.get("SMTP_PORT", 587))
+    SMTP_SECURITY = os.environ.get("SMTP_SECURITY", "starttls")
+    IMAP_HOST = os.environ.get("IMAP_HOST", "imap.gmail.com")
+    IMAP_PORT = int(os.environ.get("IMAP_PORT", 993))
+    IMAP_SSL = os.environ.get("IMAP_SSL", "true").lower() not in ("0", "false", "no")
+    # Messages sent over one SMTP connection before it is recycled
+    SMTP_RECYCLE_AFTER = int(os.environ.get("SMTP_RECYCLE_AFTER", 100))
+    # Concurrent SMTP workers per campaign send
+    SEND_WORKERS = int(os.environ.get("SEND_WORKERS", 4))
+    # Token-bucket pacing shared by everything sending from one account
+    SEND_RATE_PER_SECOND = float(os.environ.get("SEND_RATE_PER_SECOND", 2.0))
+    SEND_BURST = int(os.environ.get("SEND_BURST", 1))
+    # Adaptive pacing: the rate rises while the server answers within the target latency
+    # and halves on slow answers or throttling (421, 454), staying within these bounds
+    SEND_RATE_MIN_PER_SECOND = float(os.environ.get("SEND_RATE_MIN_PER_SECOND", 0.2))
+    SEND_RATE_MAX_PER_SECOND = float(os.environ.get("SEND_RATE_MAX_PER_SECOND", 4.0))
+    SEND_LATENCY_TARGET_SECONDS = float(os.environ.get("SEND_LATENCY_TARGET_SECONDS", 2.0))
+    # Deferred sends (4xx replies, dropped connections): retries per email, and backoff
+    # delays doubling from the base up to the maximum, with jitter
+    SEND_MAX_RETRIES = int(os.environ.get("SEND_MAX_RETRIES", 5))
+    SEND_RETRY_BASE_SECONDS = float(os.environ.get("SEND_RETRY_BASE_SECONDS", 60))
+    SEND_RETRY_MAX_SECONDS = float(os.environ.get("SEND_RETRY_MAX_SECONDS", 3600))
+    # Messages per sender per UTC day (Gmail ~500, Workspace ~2000); 0 disables the cap
+    SEND_DAILY_LIMIT = int(os.environ.get("SEND_DAILY_LIMIT", 2000))
+    # Send loop commits contact results every N contacts or T seconds, whichever comes first
+    SEND_COMMIT_EVERY = int(os.environ.get("SEND_COMMIT_EVERY", 25))
+    SEND_COMMIT_SECONDS = float(os.environ.get("SEND_COMMIT_SECONDS", 2.0))
+    # Excel write-back: contacts per workbook save, and max seconds a change may wait
+    EXCEL_FLUSH_EVERY = int(os.environ.get("EXCEL_FLUSH_EVERY", 50))
+    EXCEL_FLUSH_SECONDS = float(os.environ.get("EXCEL_FLUSH_SECONDS", 10))
+    # Seconds between keep-alive comments on the dashboard event stream
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+    # Background job queue: worker threads per process, lease length (a crashed
+    # worker's job is picked up again once it expires) and idle poll interval
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+    JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 60))
+    JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 2.0))
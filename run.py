@@ -1,5 +1,10 @@
+import argparse
 import logging
+import threading
+
 from app import create_app
+from app.jobs import start_workers
+from app.metrics import start_http_server
 from app.scheduler import start_scheduler
 
 logging.basicConfig(
@@ -11,6 +16,35 @@ logging.basicConfig(
 app = create_app()
 
 if __name__ == "__main__":
-    start_scheduler(app)
-    print("🚀 Email Agent en http://localhost:5000  (Ctrl+C para parar)")
-    app.run(debug=False, port=5000, use_reloader=False)
+    parser = argparse.ArgumentParser(description="Email Agent")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--web", action="store_true",
+                      help="solo el servidor web; los envíos los hace un proceso --worker aparte")
+    mode.add_argument("--worker", action="store_true",
+                      help="solo tareas en segundo plano (envíos, follow-ups, respuestas), sin servidor web")
+    parser.add_argument("--no-scheduler", action="store_true",
+                        help="no lanza las comprobaciones periódicas ni las conexiones IDLE; para "
+                             "procesos --worker adicionales (por defecto SCHEDULER_ENABLED)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="hilos de trabajo (por defecto JOB_WORKERS)")
+    parser.add_argument("--metrics-port", type=int, default=app.config.get("METRICS_PORT", 0),
+                        help="con --worker, publica /metrics en este puerto (por defecto METRICS_PORT)")
+    args = parser.parse_args()
+
+    if not args.web:
+        # Only one process may run the reply checks and IDLE listeners; the others just take jobs
+        if app.config.get("SCHEDULER_ENABLED", True) and not args.no_scheduler:
+            start_scheduler(app)
+        start_workers(app, args.workers)
+
+    if args.worker:
+        if args.metrics_port:
+            start_http_server(app, args.metrics_port)
+        print("⚙️  Email Agent worker en marcha  (Ctrl+C para parar)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    else:
+        print("🚀 Email Agent en http://localhost:5000  (Ctrl+C para parar)")
+        app.run(debug=False, port=5000, use_reloader=False)
@@ -147,6 +147,13 @@ if (configForm) {
             email_col:  localStorage.getItem("email_col") || "Email",
         };
         fd.forEach((v, k) => payload[k] = v);
+        // "email app password" per line → [{sender_email, app_password}]
+        payload.extra_senders = (payload.extra_senders || "").split("\n")
+            .map(line => line.trim()).filter(Boolean)
+            .map(line => {
+                const [email, ...password] = line.split(/\s+/);
+                return { sender_email: email, app_password: password.join("") };
+            });
 
         try {
             let res  = await fetch("/api/configure", {
@@ -155,13 +162,17 @@ if (configForm) {
             });
             let data = await res.json();
             if (!res.ok) { showAlert(data.error, "danger"); return; }
+            (data.warnings || []).forEach(w => showAlert(w, "warning"));
 
-            res  = await fetch("/api/launch", { method: "POST" });
+            res  = await fetch("/api/launch", {
+                method: "POST", headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ campaign_id: data.campaign_id }),
+            });
             data = await res.json();
             if (!res.ok) { showAlert(data.error, "danger"); return; }
 
             showAlert(data.message, "success");
-            setTimeout(() => window.location.href = "/dashboard", 1500);
+            setTimeout(() => window.location.href = "/dashboard?campaign_id=" + data.campaign_id, 1500);
         } catch (err) {
             showAlert("Error: " + err.message, "danger");
         } finally {
@@ -173,10 +184,115 @@ if (configForm) {
 
 // ── Step 3: Dashboard ─────────────────────────────────────────────────────────
 let dashboardInterval = null;
+const CONTACTS_PAGE_SIZE = 100;
+// Keyset pagination state: id of the last row shown, null when there is no next page
+let contactsNextAfter = null;
+let contactsPagesLoaded = 0;
+
+function contactRow(c) {
+    return `
+                <tr data-contact-id="${c.id}">
+                    <td class="fw-500">${esc(c.name)}</td>
+                    <td style="color:var(--oto-muted)">${esc(c.email)}</td>
+                    <td>${statusBadge(c.status)}</td>
+                    <td style="color:var(--oto-muted)">${c.email_sent_at    ? fmt(c.email_sent_at)    : "—"}</td>
+                    <td style="color:var(--oto-muted)">${c.replied_at       ? fmt(c.replied_at)       : "—"}</td>
+                    <td style="color:var(--oto-muted)">${c.followup_sent_at ? fmt(c.followup_sent_at) : "—"}</td>
+                    <td style="color:#991b1b;font-size:0.78rem">${c.send_error ? esc(c.send_error) : ""}</td>
+                </tr>`;
+}
+
+async function loadContacts(append = false) {
+    const params = new URLSearchParams({ limit: CONTACTS_PAGE_SIZE });
+    if (currentCampaignId) params.set("campaign_id", currentCampaignId);
+    const status = document.getElementById("contactsStatus")?.value;
+    const q      = document.getElementById("contactsSearch")?.value.trim();
+    if (status) params.set("status", status);
+    if (q) params.set("q", q);
+    if (append && contactsNextAfter !== null) params.set("after", contactsNextAfter);
+
+    const res  = await fetch("/api/contacts?" + params);
+    const data = await res.json();
+    const tbody = document.getElementById("contactsTable");
+
+    if (!append && (!data.contacts || !data.contacts.length)) {
+        tbody.innerHTML = '<tr><td colspan="7" class="text-center py-4 text-muted">Sin contactos cargados.</td></tr>';
+    } else if (append) {
+        tbody.insertAdjacentHTML("beforeend", data.contacts.map(contactRow).join(""));
+    } else {
+        tbody.innerHTML = data.contacts.map(contactRow).join("");
+    }
+    contactsNextAfter   = data.next_after;
+    contactsPagesLoaded = append ? contactsPagesLoaded + 1 : 1;
+    document.getElementById("contactsMoreRow")?.classList.toggle("d-none", contactsNextAfter === null);
+}
+
+// Last stats received, kept so SSE deltas can be applied locally
+let currentStats = null;
+// Campaign shown; null lets the server pick the latest active one
+let currentCampaignId = Number(new URLSearchParams(window.location.search).get("campaign_id")) || null;
+
+function campaignParams() {
+    return currentCampaignId ? "?campaign_id=" + currentCampaignId : "";
+}
+
+async function loadCampaigns() {
+    const select = document.getElementById("campaignSelect");
+    if (!select) return;
+    try {
+        const res  = await fetch("/api/campaigns");
+        const data = await res.json();
+        select.innerHTML = data.campaigns.map(c =>
+            `<option value="${c.id}"${c.id === currentCampaignId ? " selected" : ""}>${esc(c.name)} — ${esc(STATUS_LABELS[c.status] || c.status)}</option>`
+        ).join("");
+        select.classList.toggle("d-none", data.campaigns.length < 2);
+    } catch (err) {
+        console.error("Campaign list error:", err);
+    }
+}
+
+function renderStats(s) {
+    currentStats = s || {};
+    document.getElementById("statTotal").textContent   = currentStats.total   ?? "—";
+    document.getElementById("statSent").textContent    = (currentStats.sent || 0) + (currentStats.followup_sent || 0);
+    document.getElementById("statReplied").textContent = currentStats.replied ?? "—";
+    document.getElementById("statPending").textContent = currentStats.sent    ?? "—";
+}
+
+function renderCampaign(campaign) {
+    currentCampaignId = campaign.id;
+    const select = document.getElementById("campaignSelect");
+    if (select) select.value = campaign.id;
+
+    // Title & status
+    const titleEl = document.getElementById("campaignTitle");
+    if (titleEl) titleEl.textContent = campaign.name;
+    const statusEl = document.getElementById("campaignStatus");
+    if (statusEl) statusEl.innerHTML = statusBadge(campaign.status);
+
+    // Error banner
+    const errBanner = document.getElementById("errorBanner");
+    if (errBanner) {
+        if (campaign.status === "error" && campaign.last_error) {
+            document.getElementById("errorMsg").textContent = campaign.last_error;
+            errBanner.classList.remove("d-none");
+        } else {
+            errBanner.classList.add("d-none");
+        }
+    }
+
+    // Pause button
+    const btnPause = document.getElementById("btnPause");
+    if (btnPause) {
+        btnPause.innerHTML = campaign.status === "running"
+            ? '<i class="bi bi-pause-circle me-1"></i>Pausar'
+            : '<i class="bi bi-play-circle me-1"></i>Reanudar';
+    }
+}
 
 async function loadDashboard() {
     try {
-        const res  = await fetch("/api/status");
+        const res  = await fetch("/api/status" + campaignParams());
         const data = await res.json();
 
         if (!data.campaign) {
@@ -185,62 +301,63 @@ async function loadDashboard() {
             return;
         }
 
-        // Stats
-        const s = data.stats || {};
-        document.getElementById("statTotal").textContent   = s.total   ?? "—";
-        document.getElementById("statSent").textContent    = (s.sent || 0) + (s.followup_sent || 0);
-        document.getElementById("statReplied").textContent = s.replied ?? "—";
-        document.getElementById("statPending").textContent = s.sent    ?? "—";
-
-        // Title & status
-        const titleEl = document.getElementById("campaignTitle");
-        if (titleEl) titleEl.textContent = data.campaign.name;
-        const statusEl = document.getElementById("campaignStatus");
-        if (statusEl) statusEl.innerHTML = statusBadge(data.campaign.status);
-
-        // Error banner
-        const errBanner = document.getElementById("errorBanner");
-        if (errBanner) {
-            if (data.campaign.status === "error" && data.campaign.last_error) {
-                document.getElementById("errorMsg").textContent = data.campaign.last_error;
-                errBanner.classList.remove("d-none");
-            } else {
-                errBanner.classList.add("d-none");
-            }
-        }
+        renderStats(data.stats);
+        renderCampaign(data.campaign);
 
-        // Pause button
-        const btnPause = document.getElementById("btnPause");
-        if (btnPause) {
-            btnPause.innerHTML = data.campaign.status === "running"
-                ? '<i class="bi bi-pause-circle me-1"></i>Pausar'
-                : '<i class="bi bi-play-circle me-1"></i>Reanudar';
-        }
-
-        // Table
-        const tbody = document.getElementById("contactsTable");
-        if (!data.contacts || !data.contacts.length) {
-            tbody.innerHTML = '<tr><td colspan="7" class="text-center py-4 text-muted">Sin contactos cargados.</td></tr>';
-        } else {
-            tbody.innerHTML = data.contacts.map(c => `
-                <tr>
-                    <td class="fw-500">${esc(c.name)}</td>
-                    <td style="color:var(--oto-muted)">${esc(c.email)}</td>
-                    <td>${statusBadge(c.status)}</td>
-                    <td style="color:var(--oto-muted)">${c.email_sent_at    ? fmt(c.email_sent_at)    : "—"}</td>
-                    <td style="color:var(--oto-muted)">${c.replied_at       ? fmt(c.replied_at)       : "—"}</td>
-                    <td style="color:var(--oto-muted)">${c.followup_sent_at ? fmt(c.followup_sent_at) : "—"}</td>
-                    <td style="color:#991b1b;font-size:0.78rem">${c.send_error ? esc(c.send_error) : ""}</td>
-                </tr>`).join("");
-        }
+        // Table — only refresh the first page; don't throw away pages the user loaded
+        if (contactsPagesLoaded <= 1) await loadContacts();
     } catch (err) {
         console.error("Dashboard refresh error:", err);
     }
 }
 
+// Live updates: the server pushes deltas, so polling is only a slow safety net
+function connectEvents() {
+    if (!window.EventSource) return false;
+    const source = new EventSource("/api/events");
+
+    source.addEventListener("contact", (e) => {
+        const data = JSON.parse(e.data);
+        if (data.campaign_id !== currentCampaignId) return;
+        const row = document.querySelector(`tr[data-contact-id="${data.contact.id}"]`);
+        if (!row) return;
+        const filter = document.getElementById("contactsStatus")?.value;
+        if (filter && filter !== data.contact.status) row.remove();
+        else row.outerHTML = contactRow(data.contact);
+    });
+
+    source.addEventListener("stats", (e) => {
+        const data = JSON.parse(e.data);
+        if (data.campaign_id !== currentCampaignId || !currentStats) return;
+        const next = { ...currentStats };
+        for (const [status, n] of Object.entries(data.delta)) next[status] = (next[status] || 0) + n;
+        renderStats(next);
+    });
+
+    source.addEventListener("campaign", (e) => {
+        const data = JSON.parse(e.data);
+        loadCampaigns();
+        if (data.campaign_id !== currentCampaignId) return;
+        if (data.campaign.status === "archived") {
+            // The campaign shown was archived: fall back to the latest active one
+            currentCampaignId = null;
+            contactsPagesLoaded = 0;
+            loadDashboard();
+        } else {
+            renderCampaign(data.campaign);
+        }
+    });
+
+    source.addEventListener("resync", () => loadDashboard());
+    // After a dropped connection the browser reconnects; catch up on anything missed
+    source.addEventListener("open", () => { if (currentStats) loadDashboard(); });
+    return true;
+}
+
 if (document.getElementById("contactsTable")) {
-    loadDashboard();
-    dashboardInterval = setInterval(loadDashboard, 30000);
+    loadDashboard().then(loadCampaigns);
+    const live = connectEvents();
+    dashboardInterval = setInterval(loadDashboard, live ? 300000 : 30000);
 
     // Live clock — updates every second
     const clockEl = document.getElementById("lastUpdated");
@@ -250,20 +367,54 @@ if (document.getElementById("contactsTable")) {
         }, 1000);
     }
 
+    const btnMore = document.getElementById("btnMoreContacts");
+    if (btnMore) btnMore.addEventListener("click", () => loadContacts(true));
+
+    const statusFilter = document.getElementById("contactsStatus");
+    if (statusFilter) statusFilter.addEventListener("change", () => loadContacts());
+
+    const search = document.getElementById("contactsSearch");
+    if (search) {
+        let searchTimer = null;
+        search.addEventListener("input", () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadContacts(), 300);
+        });
+    }
+
     const btnPause = document.getElementById("btnPause");
     if (btnPause) {
         btnPause.addEventListener("click", async () => {
-            await fetch("/api/pause", { method: "POST" });
+            await fetch("/api/pause", {
+                method: "POST", headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ campaign_id: currentCampaignId }),
+            });
+            loadDashboard();
+        });
+    }
+
+    const campaignSelect = document.getElementById("campaignSelect");
+    if (campaignSelect) {
+        campaignSelect.addEventListener("change", () => {
+            currentCampaignId = Number(campaignSelect.value);
+            contactsPagesLoaded = 0;
+            window.history.replaceState(null, "", "/dashboard" + campaignParams());
             loadDashboard();
         });
     }
 
-    const btnReset = document.getElementById("btnReset");
-    if (btnReset) {
-        btnReset.addEventListener("click", async () => {
-            if (!confirm("¿Archivar la campaña actual y empezar de nuevo?")) return;
-            await fetch("/api/reset", { method: "POST" });
-            window.location.href = "/";
+    const btnArchive = document.getElementById("btnArchive");
+    if (btnArchive) {
+        btnArchive.addEventListener("click", async () => {
+            if (!confirm("¿Archivar esta campaña? Dejará de enviar y de buscar respuestas.")) return;
+            await fetch("/api/reset", {
+                method: "POST", headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ campaign_id: currentCampaignId }),
+            });
+            currentCampaignId = null;
+            contactsPagesLoaded = 0;
+            window.history.replaceState(null, "", "/dashboard");
+            loadDashboard().then(loadCampaigns);
         });
     }
 }